@@ -0,0 +1,382 @@
+"""
+性能基准
+对物品检测、画面探针、死亡检测和模拟器上的单局循环等运行微基准；基准在多个独立进程中运行，
+每个进程内每项重复多轮取中位数。结果连同机器信息保存为基线文件，之后的结果与基线比较，
+变慢超过进程间波动且与基线没有重叠时以非零状态退出，可以在修改 ItemDetector 或主循环后运行
+
+用法:
+    python benchmark.py --save                  # 运行并保存为基线 benchmark_baseline.json
+    python benchmark.py                         # 与基线比较，回退时退出码为1
+    python benchmark.py --filter detect --processes 8 --threshold 0.05
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import unicodedata
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+BASELINE_VERSION = 2
+
+# 基准函数: setup(config_path) -> (每次迭代调用的函数, 清理函数或None)
+Benchmark = Callable[[str], Tuple[Callable[[], Any], Optional[Callable[[], None]]]]
+BENCHMARKS: Dict[str, Benchmark] = {}
+
+
+def benchmark(name: str) -> Callable[[Benchmark], Benchmark]:
+    """注册一个基准"""
+    def decorator(func: Benchmark) -> Benchmark:
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+def _synthetic_scan_frame(width: int = 800, height: int = 500, items: int = 8, seed: int = 7) -> np.ndarray:
+    """带若干物品名称色块和噪声的合成画面（固定种子，每次相同）"""
+    from item_detector import ItemDetector
+
+    rng = np.random.default_rng(seed)
+    img = rng.integers(0, 40, size=(height, width, 3), dtype=np.uint8)
+    colors = [ItemDetector.ITEM_COLORS[t] for t in ('unique', 'rune', 'set')]
+    for i in range(items):
+        color = colors[i % len(colors)]
+        bgr = ((color['lower'] + color['upper']) // 2).astype(np.uint8)
+        x = int(rng.integers(20, width - 120))
+        y = int(rng.integers(20, height - 30))
+        # 模拟文字：横向排列的小色块
+        for j in range(8):
+            img[y:y + 12, x + j * 11:x + j * 11 + 8] = bgr
+    return img
+
+
+@benchmark('detect_scan_area')
+def bench_detect_scan_area(config_path: str):
+    from item_detector import ItemDetector
+    detector = ItemDetector()
+    img = _synthetic_scan_frame()
+    return (lambda: detector.detect_items_by_color(img, ['unique', 'rune', 'set'])), None
+
+
+@benchmark('detect_full_frame')
+def bench_detect_full_frame(config_path: str):
+    from item_detector import ItemDetector
+    detector = ItemDetector()
+    img = _synthetic_scan_frame(1920, 1080, items=20)
+    return (lambda: detector.detect_items_by_color(img, ['unique', 'rune'])), None
+
+
+@benchmark('remove_duplicates')
+def bench_remove_duplicates(config_path: str):
+    from item_detector import ItemDetector
+    detector = ItemDetector()
+    rng = np.random.default_rng(3)
+    positions = [(int(x), int(y), 'unique') for x, y in rng.integers(0, 800, size=(200, 2))]
+    return (lambda: detector._remove_duplicates(positions, 20)), None
+
+
+@benchmark('probe_classify')
+def bench_probe_classify(config_path: str):
+    from config_validator import ConfigValidator
+    from simulator import SimulatedGame, STATE_COLORS, train_simulator_probes
+
+    config = ConfigValidator().load_and_validate_config(config_path)
+    game = SimulatedGame(config)
+    classifier = train_simulator_probes(game)
+    frames = [game.render_state(state, noise=6) for state in STATE_COLORS]
+    counter = iter(range(1 << 62))
+    return (lambda: classifier.classify_frame(frames[next(counter) % len(frames)])), None
+
+
+@benchmark('kill_red_ratio')
+def bench_kill_red_ratio(config_path: str):
+    from kill_detector import PindleDeathDetector
+
+    img = _synthetic_scan_frame(200, 30, items=0)
+    img[5:25, 10:150] = (0, 0, 200)
+    detector = PindleDeathDetector(lambda region: img, {'region': 'health_bar',
+                                                        'health_bar_area': [0, 0, 200, 30]})
+    return detector.get_red_ratio, None
+
+
+@benchmark('sim_run_loop')
+def bench_sim_run_loop(config_path: str):
+    """模拟器上完整的一局（虚拟时钟，不含日志输出）"""
+    from clock import VirtualClock, set_clock
+    from logger_config import LoggerConfig
+    from simulator import SimulationOptions, create_simulated_bot
+
+    previous_clock = set_clock(VirtualClock())
+    logging.disable(logging.INFO)
+    bot, _ = create_simulated_bot(config_path, SimulationOptions(seed=1))
+    bot.tuner = None
+
+    def cleanup():
+        bot.watchdog.stop()
+        bot.performance_monitor.stop_monitoring()
+        LoggerConfig.stop_queue_logging()
+        logging.disable(logging.NOTSET)
+        set_clock(previous_clock)
+
+    return bot.run_single_game, cleanup
+
+
+def _calibrate(func: Callable[[], Any], min_round_time: float) -> int:
+    """每轮迭代次数：使一轮至少持续 min_round_time 秒"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_round_time or number >= 1 << 20:
+            return number
+        number *= max(2, min(10, int(min_round_time / max(elapsed, 1e-9)) + 1))
+
+
+def run_benchmark(name: str, config_path: str, rounds: int, min_round_time: float) -> Dict[str, Any]:
+    """运行一项基准：预热并校准迭代次数，然后记录每轮的单次平均耗时"""
+    func, cleanup = BENCHMARKS[name](config_path)
+    try:
+        number = _calibrate(func, min_round_time)
+        samples = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            samples.append((time.perf_counter() - start) / number)
+    finally:
+        if cleanup is not None:
+            cleanup()
+
+    values = np.array(samples)
+    median = float(np.median(values))
+    return {
+        'median': median,
+        'mad': float(np.median(np.abs(values - median))),
+        'min': float(values.min()),
+        'number': number,
+        'samples': samples,
+    }
+
+
+def machine_info() -> Dict[str, Any]:
+    """机器和依赖版本信息，不同机器上的结果不可直接比较"""
+    import cv2
+    return {
+        'hostname': platform.node(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+    }
+
+
+def _relative_range(values: List[float]) -> float:
+    """(最大 - 最小) / 中位数"""
+    median = float(np.median(values))
+    return (max(values) - min(values)) / median if median > 0 else 0.0
+
+
+def summarize_processes(runs: List[float]) -> Dict[str, Any]:
+    """汇总各进程的中位数耗时"""
+    return {
+        'median': float(np.median(runs)),
+        'min': float(min(runs)),
+        'max': float(max(runs)),
+        'spread': _relative_range(runs),
+        'runs': list(runs),
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """逐项比较
+
+    基线和本次结果都来自多个独立进程（每个进程一个中位数）。同一进程内各轮之间的差异
+    远小于进程之间的差异（CPU频率、缓存和内存布局不同），因此容差取 threshold 与
+    两次结果中进程间相对极差的较大值；中位数变慢超过容差，且本次最快的进程也慢于
+    基线最慢的进程时才判为回退。
+    """
+    rows = []
+    for name in sorted(set(baseline) | set(current)):
+        base, cur = baseline.get(name), current.get(name)
+        if base is None or cur is None:
+            rows.append({'name': name, 'base': base and base['median'], 'current': cur and cur['median'],
+                         'delta': None, 'tolerance': None, 'status': '新增' if base is None else '未运行'})
+            continue
+        delta = cur['median'] / base['median'] - 1 if base['median'] > 0 else 0.0
+        tolerance = max(threshold, base['spread'], cur['spread'])
+        if delta > tolerance and cur['min'] > base['max']:
+            status = '回退'
+        elif delta < -tolerance and cur['max'] < base['min']:
+            status = '变快'
+        else:
+            status = '持平'
+        rows.append({'name': name, 'base': base['median'], 'current': cur['median'],
+                     'delta': delta, 'tolerance': tolerance, 'status': status})
+    return rows
+
+
+def _format_time(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return '-'
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f}µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds:.3f}s"
+
+
+def _pad(text: str, width: int, left: bool = False) -> str:
+    """按显示宽度对齐（中文字符占两列）"""
+    display = sum(2 if unicodedata.east_asian_width(char) in 'WF' else 1 for char in text)
+    padding = ' ' * max(width - display, 0)
+    return text + padding if left else padding + text
+
+
+def format_table(rows: List[Dict[str, Any]]) -> str:
+    name_width = max([len(row['name']) for row in rows] + [4])
+    widths = (10, 10, 8, 6)
+
+    def line(name: str, cells: List[str], status: str) -> str:
+        return "  ".join([_pad(name, name_width, left=True)]
+                         + [_pad(cell, width) for cell, width in zip(cells, widths)] + [status])
+
+    lines = [line('基准', ['基线', '当前', '变化', '容差'], '状态'),
+             "-" * (name_width + sum(widths) + 2 * (len(widths) + 1) + 4)]
+    for row in rows:
+        delta = f"{row['delta'] * 100:+.1f}%" if row['delta'] is not None else '-'
+        tolerance = f"{row['tolerance'] * 100:.0f}%" if row['tolerance'] is not None else '-'
+        lines.append(line(row['name'], [_format_time(row['base']), _format_time(row['current']),
+                                        delta, tolerance], row['status']))
+    return "\n".join(lines)
+
+
+def run_worker(names: List[str], config_path: str, rounds: int, min_round_time: float,
+               output: str) -> int:
+    """子进程：依次运行各项基准，把每项的结果写入 output"""
+    results, failed = {}, {}
+    for name in names:
+        try:
+            results[name] = run_benchmark(name, config_path, rounds, min_round_time)
+        except Exception as e:
+            failed[name] = str(e)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'results': results, 'failed': failed}, f)
+    return 0
+
+
+def run_processes(names: List[str], args: argparse.Namespace) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """在 args.processes 个独立进程中运行基准，返回 ({基准: 汇总}, {基准: 错误})"""
+    runs: Dict[str, List[float]] = {name: [] for name in names}
+    failed: Dict[str, str] = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for index in range(args.processes):
+            print(f"进程 {index + 1}/{args.processes} ...", flush=True)
+            output = os.path.join(tmp_dir, f"worker_{index}.json")
+            command = [sys.executable, os.path.abspath(__file__), '--worker-output', output,
+                       '--config', args.config, '--rounds', str(args.rounds),
+                       '--min-round-time', str(args.min_round_time), '--only', ','.join(names)]
+            completed = subprocess.run(command, stdout=subprocess.DEVNULL)
+            if completed.returncode != 0 or not os.path.exists(output):
+                failed.update({name: f"进程退出码 {completed.returncode}" for name in names})
+                continue
+            with open(output, 'r', encoding='utf-8') as f:
+                worker = json.load(f)
+            for name, result in worker['results'].items():
+                runs[name].append(result['median'])
+            failed.update(worker['failed'])
+
+    results = {name: summarize_processes(values) for name, values in runs.items()
+               if values and name not in failed}
+    return results, failed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="性能基准与回退检查")
+    parser.add_argument('--config', default='config.json', help='配置文件（模拟器基准使用）')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基线文件')
+    parser.add_argument('--save', action='store_true', help='把本次结果保存为基线')
+    parser.add_argument('--filter', default=None, help='只运行名称包含该字符串的基准')
+    parser.add_argument('--processes', type=int, default=5, help='独立进程数（每个进程运行全部基准）')
+    parser.add_argument('--rounds', type=int, default=7, help='每个进程中每项基准的轮数')
+    parser.add_argument('--min-round-time', type=float, default=0.05, help='每轮最短时长（秒）')
+    parser.add_argument('--threshold', type=float, default=0.10, help='判定回退的最小相对变慢比例')
+    parser.add_argument('--output', default=None, help='另外把本次结果写入该文件')
+    parser.add_argument('--worker-output', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--only', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker_output:
+        names = [name for name in args.only.split(',') if name in BENCHMARKS]
+        return run_worker(names, args.config, args.rounds, args.min_round_time, args.worker_output)
+
+    names = [name for name in BENCHMARKS if not args.filter or args.filter in name]
+    if not names:
+        parser.error(f"没有匹配的基准: {args.filter}")
+
+    results, failed = run_processes(names, args)
+    for name, error in failed.items():
+        print(f"  {name} 运行失败: {error}")
+    document = {
+        'version': BASELINE_VERSION,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'machine': machine_info(),
+        'processes': args.processes,
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(document, f, ensure_ascii=False, indent=2)
+
+    if args.save:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(document, f, ensure_ascii=False, indent=2)
+        print(format_table(compare({}, results, args.threshold)))
+        print(f"\n基线已保存到 {args.baseline}")
+        return 1 if failed else 0
+
+    if not os.path.exists(args.baseline):
+        print(format_table(compare({}, results, args.threshold)))
+        print(f"\n未找到基线文件 {args.baseline}，使用 --save 保存")
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('version') != BASELINE_VERSION:
+        print(f"基线文件版本不兼容 ({baseline.get('version')})，请用 --save 重新保存")
+        return 1
+    if baseline.get('machine') != document['machine']:
+        print(f"⚠️ 基线来自不同的机器或依赖版本 ({baseline.get('created_at')})，比较结果仅供参考")
+    if failed:
+        print("⚠️ 部分基准运行失败")
+
+    baseline_results = baseline.get('results', {})
+    if args.filter:
+        baseline_results = {name: value for name, value in baseline_results.items() if args.filter in name}
+    rows = compare(baseline_results, results, args.threshold)
+    print(format_table(rows))
+
+    regressions = [row['name'] for row in rows if row['status'] == '回退']
+    if regressions or failed:
+        if regressions:
+            print(f"\n❌ 性能回退: {', '.join(regressions)} (最小阈值 {args.threshold * 100:.0f}%)")
+        return 1
+    print("\n✅ 没有性能回退")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+时钟抽象
+所有等待和计时都通过全局时钟进行，默认使用真实时间；
+测试时可以换成虚拟时钟，sleep 立即返回并推进虚拟时间，
+这样数百局的模拟只需要几秒CPU时间，且动作顺序保持不变
+"""
+import threading
+import time
+
+
+class Clock:
+    """真实时钟"""
+
+    def time(self) -> float:
+        """当前时间戳（秒）"""
+        return time.time()
+
+    def monotonic(self) -> float:
+        """单调时间（秒），用于计算间隔"""
+        return time.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        """等待指定时间"""
+        if seconds > 0:
+            time.sleep(seconds)
+
+    @property
+    def is_virtual(self) -> bool:
+        return False
+
+
+class VirtualClock(Clock):
+    """虚拟时钟
+
+    sleep 不真正等待，只把虚拟时间向前推进。
+    适用于单线程的运行循环（模拟器、测试），多个线程同时 sleep 会各自推进时间。
+    """
+
+    def __init__(self, start: float = None):
+        self._start = time.time() if start is None else start
+        self._elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def time(self) -> float:
+        return self._start + self._elapsed
+
+    def monotonic(self) -> float:
+        return self._elapsed
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            self.advance(seconds)
+
+    def advance(self, seconds: float) -> None:
+        """手动推进虚拟时间"""
+        with self._lock:
+            self._elapsed += seconds
+
+    @property
+    def elapsed(self) -> float:
+        """自创建以来经过的虚拟时间（秒）"""
+        return self._elapsed
+
+    @property
+    def is_virtual(self) -> bool:
+        return True
+
+
+# 全局时钟实例
+_clock: Clock = Clock()
+
+
+def get_clock() -> Clock:
+    """获取全局时钟"""
+    return _clock
+
+
+def set_clock(clock: Clock) -> Clock:
+    """替换全局时钟（需在创建机器人之前调用），返回原来的时钟"""
+    global _clock
+    previous = _clock
+    _clock = clock
+    return previous
@@ -0,0 +1,200 @@
+"""
+结构化事件日志
+每局的关键事件（开始、阶段结束、检测到物品、拾取、错误、结束）作为带字段的记录写入 JSONL 文件，
+每行一个JSON对象，便于离线分析。记录经日志队列交给后台线程，JSON序列化只在写出时进行，
+机器人线程只创建记录本身。
+
+读取会话事件并按局汇总:
+    python event_log.py logs/events_*.jsonl
+    python event_log.py logs/events_*.jsonl --csv runs.csv
+"""
+import argparse
+import csv
+import glob
+import json
+import logging
+import os
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from clock import get_clock
+from logger_config import LoggerConfig
+
+
+EVENT_TYPES = ('run_start', 'phase_end', 'item_detected', 'item_picked', 'error', 'run_end')
+
+
+class JsonlFormatter(logging.Formatter):
+    """把事件记录格式化为一行JSON（在监听线程中调用）"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        event = {'time': round(getattr(record, 'event_time', record.created), 3), 'event': record.msg}
+        event.update(getattr(record, 'fields', {}))
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+
+class EventLog:
+    """结构化事件日志
+
+    使用独立的日志记录器（不传播到控制台），文件处理器挂在队列监听线程上。
+    """
+
+    def __init__(self, path: str, session: Optional[str] = None,
+                 queue_size: int = 10000, overflow: str = 'block'):
+        """
+        Args:
+            path: JSONL 文件路径
+            session: 会话名称，写入每个事件
+            queue_size: 日志队列容量
+            overflow: 队列满时的处理方式（事件都是INFO级别，drop_debug 也不会丢弃）
+        """
+        self.path = path
+        self.session = session
+        self.written = 0
+        self.logger = logging.getLogger(f"events.{session or 'default'}")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.close()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = logging.FileHandler(path, encoding='utf-8')
+        handler.setFormatter(JsonlFormatter())
+        self.logger.addHandler(handler)
+        LoggerConfig.attach_queue(self.logger, queue_size, overflow)
+
+    def emit(self, event: str, **fields: Any) -> None:
+        """记录一个事件，字段值需可JSON序列化（其他类型按str写出）
+
+        Example:
+            events.emit('item_picked', run=12, item_type='rune', x=640, y=360)
+        """
+        if self.session is not None:
+            fields['session'] = self.session
+        self.logger.info(event, extra={'fields': fields, 'event_time': get_clock().time()})
+        self.written += 1
+
+    def close(self) -> None:
+        """写出剩余事件并关闭文件"""
+        LoggerConfig.stop_queue_logging(self.logger.name)
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+            handler.close()
+
+
+def read_events(paths: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """逐行读取一个或多个事件文件，跳过无法解析的行（如崩溃时写了一半的最后一行）"""
+    logger = logging.getLogger(__name__)
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"跳过无法解析的行: {path}:{line_number}")
+
+
+def iter_runs(events: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """把事件流按局汇总，每局结束（或下一局开始）时产出一行
+
+    每行包含 session, run, game_name, success, duration, detected, picked, errors 和 phases {阶段: 秒}。
+    """
+    current: Dict[tuple, Dict[str, Any]] = {}
+
+    def new_row(session, run, event):
+        return {'session': session, 'run': run, 'started_at': event.get('time'), 'game_name': None,
+                'success': None, 'duration': None, 'detected': 0, 'picked': 0,
+                'picked_types': {}, 'errors': [], 'phases': {}}
+
+    for event in events:
+        session = event.get('session')
+        run = event.get('run')
+        if run is None:
+            continue
+        key = (session, run)
+        kind = event.get('event')
+
+        if kind == 'run_start':
+            # 同一会话上一局没有结束事件（例如崩溃）时也输出
+            for other in [k for k in current if k[0] == session]:
+                yield current.pop(other)
+        row = current.get(key)
+        if row is None:
+            row = current[key] = new_row(session, run, event)
+
+        if kind == 'phase_end':
+            row['phases'][event['phase']] = event.get('duration')
+        elif kind == 'item_detected':
+            row['detected'] += event.get('count', 0)
+        elif kind == 'item_picked':
+            row['picked'] += 1
+            item_type = event.get('item_type')
+            row['picked_types'][item_type] = row['picked_types'].get(item_type, 0) + 1
+        elif kind == 'error':
+            row['errors'].append(event.get('kind') or event.get('message'))
+        elif kind == 'run_end':
+            row.update(success=event.get('success'), duration=event.get('duration'),
+                       game_name=event.get('game_name'))
+            yield current.pop(key)
+
+    yield from current.values()
+
+
+def format_run_table(rows: List[Dict[str, Any]]) -> str:
+    """按局输出的文本表格"""
+    lines = [f"{'会话':<10} {'局':>4} {'成功':>4} {'耗时':>7} {'检测':>4} {'拾取':>4}  最慢阶段 / 错误",
+             "-" * 72]
+    for row in rows:
+        success = '-' if row['success'] is None else ('是' if row['success'] else '否')
+        duration = f"{row['duration']:.2f}s" if row['duration'] is not None else '-'
+        phases = {name: value for name, value in row['phases'].items() if value is not None}
+        slowest = max(phases.items(), key=lambda item: item[1]) if phases else None
+        note = f"{slowest[0]} {slowest[1]:.2f}s" if slowest else ''
+        if row['errors']:
+            note += f" | {', '.join(str(error) for error in row['errors'])}"
+        lines.append(f"{str(row['session']):<12} {row['run']:>5} {success:>5} {duration:>9} "
+                     f"{row['detected']:>6} {row['picked']:>6}  {note}")
+    return "\n".join(lines)
+
+
+def write_run_csv(rows: List[Dict[str, Any]], path: str) -> None:
+    """写出CSV，每个阶段一列"""
+    phases = sorted({name for row in rows for name in row['phases']})
+    columns = ['session', 'run', 'game_name', 'success', 'duration', 'detected', 'picked', 'errors']
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns + [f"phase_{name}" for name in phases])
+        for row in rows:
+            writer.writerow([row[column] if column != 'errors' else ';'.join(map(str, row['errors']))
+                             for column in columns] + [row['phases'].get(name) for name in phases])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="按局汇总结构化事件日志")
+    parser.add_argument('files', nargs='+', help='事件文件（JSONL，可使用通配符）')
+    parser.add_argument('--csv', default=None, help='把汇总写入CSV文件')
+    args = parser.parse_args(argv)
+
+    paths = sorted({path for pattern in args.files for path in (glob.glob(pattern) or [pattern])})
+    rows = list(iter_runs(read_events(paths)))
+    if not rows:
+        print("没有找到事件")
+        return 1
+    print(format_run_table(rows))
+
+    finished = [row for row in rows if row['success'] is not None]
+    successful = sum(1 for row in finished if row['success'])
+    print(f"\n共 {len(rows)} 局, 成功 {successful}/{len(finished)}, "
+          f"拾取 {sum(row['picked'] for row in rows)} 件")
+    if args.csv:
+        write_run_csv(rows, args.csv)
+        print(f"已写入 {args.csv}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
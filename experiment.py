@@ -0,0 +1,317 @@
+"""
+配置A/B实验
+把两个或多个配置变体逐局交替运行（真实游戏或模拟器），或在录制帧上离线回放比较检测变体，
+输出每小时次数、失败率、每小时掉落的置信区间和显著性检验，结果保存为JSON便于跟踪趋势
+
+变体格式: 名称[:配置路径=JSON值,...]，在 --config 基础配置上覆盖
+用法:
+    python experiment.py --variant baseline --variant fast:sorceress.teleport_delay=0.12 --runs 50
+    python experiment.py --simulate --variant a --variant b:bot.delay_between_runs=0.6 --runs 300
+    python experiment.py --replay recorded_frames --variant a --variant b:pickup.min_detection_area=40
+"""
+import argparse
+import copy
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import stats_math
+
+
+def split_assignments(text: str) -> List[str]:
+    """按顶层逗号拆分赋值列表，JSON列表、对象和字符串中的逗号不拆分
+
+    Example:
+        split_assignments('a=1,b=[[1,2],[3,4]]')  ->  ['a=1', 'b=[[1,2],[3,4]]']
+    """
+    parts, current = [], []
+    depth = 0
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '[{':
+            depth += 1
+        elif char in ']}':
+            depth = max(depth - 1, 0)
+        elif char == ',' and depth == 0:
+            parts.append(''.join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    parts.append(''.join(current).strip())
+    return parts
+
+
+class Variant:
+    """一个配置变体"""
+
+    def __init__(self, name: str, overrides: Dict[str, Any], base_config: Dict[str, Any]):
+        self.name = name
+        self.overrides = overrides
+        self.config = copy.deepcopy(base_config)
+        for path, value in overrides.items():
+            node = self.config
+            keys = path.split('.')
+            for key in keys[:-1]:
+                node = node.setdefault(key, {})
+            node[keys[-1]] = value
+
+        # 实验期间关闭自动调优，避免干扰比较
+        self.config.setdefault('tuner', {})['enabled'] = False
+        self.records: List[Dict[str, Any]] = []
+
+    @classmethod
+    def parse(cls, spec: str, base_config: Dict[str, Any]) -> 'Variant':
+        name, _, assignments = spec.partition(':')
+        overrides = {}
+        for assignment in filter(None, split_assignments(assignments)):
+            path, _, raw = assignment.partition('=')
+            try:
+                overrides[path.strip()] = json.loads(raw)
+            except json.JSONDecodeError:
+                overrides[path.strip()] = raw
+        return cls(name.strip(), overrides, base_config)
+
+
+def summarize_runs(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """汇总一个变体的运行结果"""
+    durations = [r['duration'] for r in records]
+    runs = len(records)
+    failures = sum(1 for r in records if not r['success'])
+    drops = sum(sum(r.get('items', {}).values()) for r in records)
+    hours = sum(durations) / 3600
+
+    mean_duration, _ = stats_math.mean_and_stdev(durations)
+    low, high = stats_math.mean_interval(durations)
+    fail_low, fail_high = stats_math.wilson_interval(failures, runs)
+    drop_low, drop_high = stats_math.poisson_interval(drops, hours)
+
+    return {
+        'runs': runs,
+        'mean_duration': mean_duration,
+        'runs_per_hour': 3600 / mean_duration if mean_duration > 0 else 0.0,
+        # 每小时次数是均值的倒数，区间端点互换
+        'runs_per_hour_ci': [3600 / high if high > 0 else 0.0, 3600 / low if low > 0 else 0.0],
+        'failure_rate': failures / runs if runs else 0.0,
+        'failure_rate_ci': [fail_low, fail_high],
+        'failures': failures,
+        'drops': drops,
+        'drops_per_hour': drops / hours if hours > 0 else 0.0,
+        'drops_per_hour_ci': [drop_low, drop_high],
+        'hours': hours,
+    }
+
+
+def compare_runs(baseline: List[Dict[str, Any]], variant: List[Dict[str, Any]],
+                 alpha: float = 0.05) -> Dict[str, Any]:
+    """变体相对基线的显著性检验"""
+    base = summarize_runs(baseline)
+    other = summarize_runs(variant)
+    duration = stats_math.welch_t_test([r['duration'] for r in baseline], [r['duration'] for r in variant])
+    failure = stats_math.two_proportion_test(base['failures'], base['runs'], other['failures'], other['runs'])
+    drops = stats_math.poisson_rate_test(base['drops'], base['hours'], other['drops'], other['hours'])
+    return {
+        'duration_diff': duration['diff'],
+        'duration_p': duration['p'],
+        'failure_rate_diff': failure['diff'],
+        'failure_rate_p': failure['p'],
+        'drops_per_hour_diff': drops['diff'],
+        'drops_per_hour_p': drops['p'],
+        'faster': duration['p'] < alpha and duration['diff'] < 0,
+        'more_failures': failure['p'] < alpha and failure['diff'] > 0,
+    }
+
+
+def run_interleaved(variants: List[Variant], runs: int, simulate: bool = False,
+                    seed: Optional[int] = None) -> None:
+    """逐局交替运行各变体，每轮随机打乱顺序以消除先后顺序带来的偏差"""
+    from game_bot import D2PindleBot
+
+    rng = random.Random(seed)
+    bots = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for variant in variants:
+                config_path = os.path.join(tmp_dir, f"{variant.name}.json")
+                with open(config_path, 'w', encoding='utf-8') as f:
+                    json.dump(variant.config, f, ensure_ascii=False)
+
+                if simulate:
+                    from simulator import SimulationOptions, create_simulated_bot
+                    bot, _ = create_simulated_bot(config_path, SimulationOptions(seed=seed))
+                else:
+                    bot = D2PindleBot(config_path, session_name=f"exp_{variant.name}", persist=False)
+                bots[variant.name] = bot
+                if not simulate and not bot.initialize():
+                    raise RuntimeError("初始化失败，无法开始实验")
+
+                bot.statistics.add_listener(variant.records.append)
+
+        order = list(variants)
+        for _ in range(runs):
+            rng.shuffle(order)
+            for variant in order:
+                bots[variant.name].run_single_game()
+    finally:
+        # 停止看门狗、性能监控等后台线程并保存调优状态，中途出错时也要停止已创建的实例
+        for name, bot in bots.items():
+            try:
+                bot.stop()
+            except Exception as e:
+                logging.getLogger(__name__).error(f"停止实验实例 {name} 失败: {e}")
+
+
+def run_replay(variants: List[Variant], frames_dir: str, repeat: int = 3) -> Dict[str, Dict[str, Any]]:
+    """在录制帧上逐帧交替运行检测变体，比较检测数量和耗时"""
+    import cv2
+    from item_detector import ItemDetector
+
+    frames = []
+    for filename in sorted(os.listdir(frames_dir)):
+        if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')):
+            img = cv2.imread(os.path.join(frames_dir, filename), cv2.IMREAD_COLOR)
+            if img is not None:
+                frames.append(img)
+    if not frames:
+        raise ValueError(f"未找到录制帧: {frames_dir}")
+
+    detector = ItemDetector()
+    latencies: Dict[str, List[float]] = {v.name: [] for v in variants}
+    detections: Dict[str, List[int]] = {v.name: [] for v in variants}
+
+    for img in frames:
+        for variant in variants:
+            pickup = variant.config.get('pickup', {})
+            kwargs = {
+                'item_types': pickup.get('item_types', ['unique']),
+                'min_area': pickup.get('min_detection_area', 30),
+                'max_area': pickup.get('max_detection_area', 5000),
+            }
+            start = time.perf_counter()
+            for _ in range(repeat):
+                items = detector.detect_items_by_color(img, **kwargs)
+            latencies[variant.name].append((time.perf_counter() - start) / repeat * 1000)
+            detections[variant.name].append(len(items))
+
+    results = {}
+    baseline = variants[0].name
+    for variant in variants:
+        mean_ms, _ = stats_math.mean_and_stdev(latencies[variant.name])
+        results[variant.name] = {
+            'frames': len(frames),
+            'latency_ms': mean_ms,
+            'latency_ms_ci': list(stats_math.mean_interval(latencies[variant.name])),
+            'detections_per_frame': sum(detections[variant.name]) / len(frames),
+        }
+        if variant.name != baseline:
+            test = stats_math.welch_t_test(latencies[baseline], latencies[variant.name])
+            results[variant.name]['latency_diff_ms'] = test['diff']
+            results[variant.name]['latency_p'] = test['p']
+            results[variant.name]['detection_agreement'] = sum(
+                a == b for a, b in zip(detections[baseline], detections[variant.name])
+            ) / len(frames)
+    return results
+
+
+def format_report(result: Dict[str, Any]) -> str:
+    """生成文本报告"""
+    lines = [f"实验结果 ({result['mode']})", "=" * 60]
+    for name, summary in result['variants'].items():
+        lines.append(f"[{name}] {json.dumps(result['overrides'][name], ensure_ascii=False)}")
+        if result['mode'] == 'replay':
+            lines.append(f"  检测耗时: {summary['latency_ms']:.2f}ms "
+                         f"[{summary['latency_ms_ci'][0]:.2f}, {summary['latency_ms_ci'][1]:.2f}] | "
+                         f"每帧检测数: {summary['detections_per_frame']:.2f}")
+            if 'latency_p' in summary:
+                lines.append(f"  相对基线: {summary['latency_diff_ms']:+.2f}ms (p={summary['latency_p']:.3f}) | "
+                             f"检测一致率: {summary['detection_agreement'] * 100:.1f}%")
+            continue
+
+        lines.append(f"  局数: {summary['runs']} | 每小时次数: {summary['runs_per_hour']:.1f} "
+                     f"[{summary['runs_per_hour_ci'][0]:.1f}, {summary['runs_per_hour_ci'][1]:.1f}]")
+        lines.append(f"  失败率: {summary['failure_rate'] * 100:.1f}% "
+                     f"[{summary['failure_rate_ci'][0] * 100:.1f}%, {summary['failure_rate_ci'][1] * 100:.1f}%] | "
+                     f"每小时掉落: {summary['drops_per_hour']:.1f} "
+                     f"[{summary['drops_per_hour_ci'][0]:.1f}, {summary['drops_per_hour_ci'][1]:.1f}]")
+        comparison = result['comparisons'].get(name)
+        if comparison:
+            verdict = "显著更快" if comparison['faster'] else "无显著差异"
+            if comparison['more_failures']:
+                verdict += "，但失败率显著升高"
+            lines.append(f"  相对基线: 单局 {comparison['duration_diff']:+.2f}秒 (p={comparison['duration_p']:.3f}) | "
+                         f"失败率 p={comparison['failure_rate_p']:.3f} | "
+                         f"掉落 p={comparison['drops_per_hour_p']:.3f} -> {verdict}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="配置A/B实验")
+    parser.add_argument('--config', default='config.json', help='基础配置文件')
+    parser.add_argument('--variant', action='append', required=True,
+                        help='变体: 名称[:路径=值,...]，第一个为基线（可重复）')
+    parser.add_argument('--runs', type=int, default=30, help='每个变体运行局数')
+    parser.add_argument('--simulate', action='store_true', help='在模拟器上运行（虚拟时钟）')
+    parser.add_argument('--replay', default=None, help='录制帧目录，只比较检测变体')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子')
+    parser.add_argument('--out', default=None, help='结果JSON路径（默认 experiments/ 下按时间命名）')
+    args = parser.parse_args(argv)
+
+    if len(args.variant) < 2:
+        parser.error("至少需要两个变体")
+
+    from config_validator import ConfigValidator
+    base_config = ConfigValidator().load_and_validate_config(args.config)
+    variants = [Variant.parse(spec, base_config) for spec in args.variant]
+
+    result: Dict[str, Any] = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'base_config': args.config,
+        'overrides': {v.name: v.overrides for v in variants},
+        'comparisons': {},
+    }
+
+    if args.replay:
+        result['mode'] = 'replay'
+        result['variants'] = run_replay(variants, args.replay)
+    else:
+        if args.simulate:
+            from clock import VirtualClock, set_clock
+            set_clock(VirtualClock())
+        result['mode'] = 'simulate' if args.simulate else 'live'
+        try:
+            run_interleaved(variants, args.runs, simulate=args.simulate, seed=args.seed)
+        except KeyboardInterrupt:
+            logging.getLogger("D2PindleBot").info("实验被中断，使用已完成的局数生成报告")
+
+        result['variants'] = {v.name: summarize_runs(v.records) for v in variants}
+        for variant in variants[1:]:
+            result['comparisons'][variant.name] = compare_runs(variants[0].records, variant.records)
+
+    print(format_report(result))
+
+    out_path = args.out or os.path.join('experiments', f"experiment_{datetime.now():%Y%m%d_%H%M%S}.json")
+    out_dir = os.path.dirname(out_path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"\n结果已保存到: {out_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
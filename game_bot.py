@@ -1,35 +1,108 @@
 import json
-import time
+import os
 import logging
 import random
-from typing import Dict, Any, List
-from window_controller import WindowController
-from input_controller import InputController
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional
+from clock import get_clock, set_clock
 from item_detector import ItemDetector
+from kill_detector import PindleDeathDetector
+from phase_watchdog import PhaseWatchdog, RunAborted, WatchdogClock
+from run_store import RunStore
+from stats_journal import StatsJournal
+from screen_classifier import ProbeClassifier, ScreenStateWatcher
 from item_filter import ItemFilter
 from statistics import Statistics
 from utils import random_delay, sleep_random, random_offset
 from config_validator import ConfigValidator
 from logger_config import LoggerConfig
 from performance_monitor import get_global_monitor, monitor_performance
+from timing_tuner import TimingTuner
+from metrics_server import MetricsCollector, MetricsServer
+from tracing import get_tracer
+from event_log import EventLog
 
 
 class D2PindleBot:
-    def __init__(self, config_path: str = 'config.json'):
-        # 设置日志
-        self.logger = LoggerConfig.get_session_logger()
-        self.performance_monitor = get_global_monitor()
-
+    def __init__(self, config_path: str = 'config.json', session_name: Optional[str] = None,
+                 window_controller=None, input_controller=None, item_detector=None,
+                 persist: bool = True, stats_file: str = 'run_statistics.txt',
+                 tuner_state_file: Optional[str] = None):
+        """
+        Args:
+            config_path: 配置文件路径
+            session_name: 会话名称（多实例运行时区分日志文件）
+            window_controller: 窗口控制后端，默认 WindowController
+            input_controller: 输入控制后端，默认 InputController
+            item_detector: 截图和物品检测后端，默认 ItemDetector
+            persist: 是否持久化统计（统计日志、运行历史、统计文件和延迟直方图），模拟和实验时关闭
+            stats_file: 停止时写出的统计文件
+            tuner_state_file: 调优参数文件，默认使用配置中的 tuner.state_file
+        """
         # 加载和验证配置
         config_validator = ConfigValidator()
         self.config = config_validator.load_and_validate_config(config_path)
 
-        # 初始化组件
-        self.window_controller = WindowController(self.config['game']['window_title'])
-        self.input_controller = InputController()
-        self.item_detector = ItemDetector()
+        # 设置日志（默认经队列由后台线程写出，主循环不等待控制台和文件写入）
+        self.logger = LoggerConfig.get_session_logger(session_name=session_name,
+                                                      logging_config=self.config.get('logging', {}))
+        self.session_name = session_name
+        self.persist = persist
+        self.stats_file = stats_file
+        self.performance_monitor = get_global_monitor()
+        self.base_clock = get_clock()
+
+        # 阶段看门狗：每局运行期间全局时钟换成带检查点的时钟，超时后任何等待都会中止本局
+        self.watchdog = PhaseWatchdog(self.config.get('watchdog', {}), clock=self.base_clock)
+        self.clock = WatchdogClock(self.base_clock, self.watchdog)
+
+        # 初始化组件（可注入其他后端，例如 simulator.py 中的模拟游戏）
+        if window_controller is None:
+            from window_controller import WindowController
+            window_controller = WindowController(self.config['game']['window_title'])
+        if input_controller is None:
+            from input_controller import InputController
+            input_controller = InputController()
+        self.window_controller = window_controller
+        self.input_controller = input_controller
+        self.item_detector = item_detector or ItemDetector()
         self.item_filter = ItemFilter(self.config)
         self.statistics = Statistics()
+        self.kill_detector = PindleDeathDetector(
+            self.item_detector.capture_screen,
+            self.config.get('sorceress', {}).get('kill_detection', {}),
+            spawn_area=self.config['coordinates']['in_game']['pindle_spawn_area']
+        )
+
+        self.screen_watcher = self._create_screen_watcher()
+
+        # 统计日志：崩溃后从快照和日志恢复统计
+        self.journal = None
+        journal_config = self.config.get('stats_journal', {})
+        if persist and journal_config.get('enabled', True):
+            journal_dir = journal_config.get('directory', 'stats_journal')
+            if session_name:
+                # 多实例运行时每个实例使用自己的日志目录
+                journal_dir = os.path.join(journal_dir, session_name)
+            self.journal = StatsJournal(
+                journal_dir,
+                fsync_interval=journal_config.get('fsync_interval', 1.0),
+                compact_every=journal_config.get('compact_every', 500)
+            )
+            self.journal.recover(self.statistics, resume=journal_config.get('resume_after_crash', True))
+
+        # 运行历史持久化（每局记录由后台线程批量写入SQLite）
+        self.run_store = None
+        store_config = self.config.get('run_store', {})
+        if persist and store_config.get('enabled', True):
+            self.run_store = RunStore(
+                store_config.get('path', 'run_history.db'),
+                session_name=session_name,
+                batch_size=store_config.get('batch_size', 20),
+                flush_interval=store_config.get('flush_interval', 2.0)
+            )
+            self.statistics.add_listener(self._store_run)
 
         # 运行状态
         self.run_count = 0
@@ -42,20 +115,142 @@ class D2PindleBot:
         self.game_name_rotation = self.config.get('bot', {}).get('game_name_rotation', {})
         self.current_name_index = 0
 
+        # 延迟参数自适应调优（可选）
+        self.tuner = None
+        tuner_config = self.config.get('tuner', {})
+        if tuner_state_file:
+            tuner_config = dict(tuner_config, state_file=tuner_state_file)
+        if tuner_config.get('enabled', False):
+            self.tuner = TimingTuner(self.config, tuner_config)
+            self.tuner.apply(self.config)
+            self.logger.info(self.tuner.get_summary())
+
         # 打印拾取策略
         pickup_summary = self.item_filter.get_pickup_summary()
-        self.logger.info(f"拾取策略: 符文={pickup_summary['runes']}, "
-                        f"暗金={pickup_summary['uniques']}")
+        self.logger.info("拾取策略: 符文=%s, 暗金=%s", pickup_summary['runes'], pickup_summary['uniques'])
 
-        # 启动性能监控
+        # 启动性能监控（可选同时采样游戏进程）
+        game_config = self.config.get('game', {})
+        if game_config.get('monitor_process', False):
+            self.performance_monitor.set_game_process(game_config.get('process_name', 'D2R.exe'))
         self.performance_monitor.start_monitoring(interval=2.0)
+        self.watchdog.start()
+
+        # 采样分析（可选），停止时输出火焰图用的 collapsed 文件
+        self.profiler_config = self.config.get('profiler', {})
+        if self.profiler_config.get('enabled', False):
+            self.performance_monitor.start_profiling(
+                interval=self.profiler_config.get('interval', 0.01),
+                max_depth=self.profiler_config.get('max_depth', 64),
+                threads=self.profiler_config.get('threads') or None
+            )
+
+        # 内存诊断（可选），每隔若干局对比 tracemalloc 快照
+        memory_config = self.config.get('memory_diagnostics', {})
+        if memory_config.get('enabled', False):
+            self.start_memory_diagnostics(memory_config)
+
+        # 本机指标接口（Prometheus格式，可选）
+        self.metrics_server = None
+        metrics_config = self.config.get('metrics', {})
+        if metrics_config.get('enabled', False):
+            collector = MetricsCollector(self.statistics, self.performance_monitor)
+            self.metrics_server = MetricsServer(collector, metrics_config.get('host', '127.0.0.1'),
+                                                metrics_config.get('port', 9464))
+            self.metrics_server.start()
+
+        # 各操作的延迟直方图，停止时保存以便比较不同会话
+        latency_config = self.config.get('latency_histograms', {})
+        self.latency_dir = latency_config.get('output_dir', 'latency') \
+            if persist and latency_config.get('enabled', True) else None
+
+        # 结构化事件日志（JSONL），可用 event_log.py 按局汇总
+        self.events: Optional[EventLog] = None
+        self.current_run = 0
+        event_config = self.config.get('event_log', {})
+        if persist and event_config.get('enabled', True):
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            prefix = f"events_{session_name}_" if session_name else "events_"
+            self.events = EventLog(os.path.join(event_config.get('output_dir', 'logs'), f"{prefix}{timestamp}.jsonl"),
+                                   session=session_name)
+
+        # 分层追踪（可选），停止时导出Chrome trace
+        self.tracer = get_tracer()
+        self.tracing_config = self.config.get('tracing', {})
+        if self.tracing_config.get('enabled', False):
+            self.tracer.enable(max_events=self.tracing_config.get('max_events', 200000))
+
+    def _create_screen_watcher(self) -> Optional[ScreenStateWatcher]:
+        """加载画面状态探针，文件不存在或训练分辨率与屏幕不符时返回None（使用固定等待）"""
+        screen_config = self.config.get('screen_state', {})
+        probe_file = screen_config.get('probe_file', 'screen_probes.json')
+        if not screen_config.get('enabled', True) or not os.path.exists(probe_file):
+            return None
+
+        try:
+            classifier = ProbeClassifier.load(probe_file)
+            # 探针是屏幕坐标，分辨率不同时每次判断都会出错
+            screen_size = self.item_detector.get_screen_size()
+            if screen_size is not None and tuple(screen_size) != classifier.resolution:
+                self.logger.warning("画面状态探针按 %dx%d 训练，当前屏幕为 %dx%d，使用固定等待",
+                                    *classifier.resolution, *screen_size)
+                return None
+            self.logger.info("已加载画面状态探针: %s (%d个)", probe_file, classifier.probe_count)
+            return ScreenStateWatcher(
+                classifier,
+                self.item_detector.read_pixels,
+                poll_interval=screen_config.get('poll_interval', 0.01)
+            )
+        except Exception as e:
+            self.logger.warning("加载画面状态探针失败: %s，使用固定等待", e)
+            return None
+
+    def start_memory_diagnostics(self, memory_config: Dict[str, Any]) -> None:
+        """开始内存诊断，每局结束时检查是否到达快照间隔"""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.performance_monitor.start_memory_diagnostics(
+            every_runs=memory_config.get('every_runs', 50),
+            frames=memory_config.get('frames', 1),
+            top=memory_config.get('top', 15),
+            output_dir=memory_config.get('output_dir', 'memory'),
+            prefix=f"memory_{self.session_name or 'default'}_{timestamp}"
+        )
+        self.statistics.add_listener(self._check_memory)
+
+    def _check_memory(self, record: Dict[str, Any]) -> None:
+        """统计监听器：到达间隔时拍内存快照"""
+        memory = self.performance_monitor.memory
+        if memory is not None:
+            memory.on_run(self.statistics.total_runs)
+
+    def _store_run(self, record: Dict[str, Any]) -> None:
+        """统计监听器：把本局记录交给运行历史存储"""
+        if self.run_store is not None:
+            self.run_store.add(record)
+
+    def _event(self, event: str, **fields: Any) -> None:
+        """写入结构化事件（附带当前局号）"""
+        if self.events is not None:
+            self.events.emit(event, run=self.current_run, **fields)
+
+    @contextmanager
+    def _phase(self, name: str) -> Iterator[None]:
+        """执行一个阶段：记录耗时、追踪时间段并启用看门狗截止时间"""
+        start = self.base_clock.monotonic()
+        ok = False
+        try:
+            with self.tracer.span(name, 'phase'), self.statistics.phase(name), self.watchdog.watch(name):
+                yield
+            ok = True
+        finally:
+            self._event('phase_end', phase=name, duration=round(self.base_clock.monotonic() - start, 4), ok=ok)
 
     @monitor_performance("initialize")
     def initialize(self) -> bool:
         self.logger.info("正在初始化机器人...")
         try:
             if not self.window_controller.find_window():
-                self.logger.error(f"未找到游戏窗口: {self.config['game']['window_title']}")
+                self.logger.error("未找到游戏窗口: %s", self.config['game']['window_title'])
                 return False
 
             if not self.window_controller.activate_window():
@@ -65,7 +260,7 @@ class D2PindleBot:
             self.logger.info("机器人初始化成功")
             return True
         except Exception as e:
-            self.logger.error(f"初始化失败: {e}")
+            self.logger.error("初始化失败: %s", e)
             return False
     
     def get_current_game_name(self) -> str:
@@ -74,11 +269,13 @@ class D2PindleBot:
         
         if not rotation_config.get('enabled', False):
             # 未启用轮换，使用固定名称
-            return self.config['bot']['game_name']
+            self.current_game_base = self.config['bot']['game_name']
+            return self.current_game_base
         
         names = rotation_config.get('names', [])
         if not names:
-            return self.config['bot']['game_name']
+            self.current_game_base = self.config['bot']['game_name']
+            return self.current_game_base
         
         mode = rotation_config.get('mode', 'sequential')
         change_every = rotation_config.get('change_every', 10)
@@ -94,6 +291,7 @@ class D2PindleBot:
                 self.current_name_index = random.randint(0, len(names) - 1)
         
         base_name = names[self.current_name_index]
+        self.current_game_base = base_name
         
         # 添加随机后缀（可选）
         if add_suffix:
@@ -105,19 +303,20 @@ class D2PindleBot:
     def create_game(self):
         # 获取游戏名称
         game_name = self.get_current_game_name()
-        self.logger.info(f"创建游戏: {game_name}...")
+        self.current_game_name = game_name
+        self.logger.info("创建游戏: %s...", game_name)
         
         lobby = self.config['coordinates']['lobby']
         
         # 点击创建游戏（随机偏移）
         coord = random_offset(lobby['create_game_button'], 3) if self.randomize else lobby['create_game_button']
         self.input_controller.click(*coord)
-        sleep_random(1.0, 0.15) if self.randomize else time.sleep(1)
+        sleep_random(1.0, 0.15) if self.randomize else self.clock.sleep(1)
         
         # 输入游戏名称
         coord = random_offset(lobby['game_name_input'], 3) if self.randomize else lobby['game_name_input']
         self.input_controller.click(*coord)
-        sleep_random(0.2, 0.3) if self.randomize else time.sleep(0.2)
+        sleep_random(0.2, 0.3) if self.randomize else self.clock.sleep(0.2)
         self.input_controller.type_text(game_name)
         
         # 输入密码（如果有）
@@ -125,16 +324,52 @@ class D2PindleBot:
         if password:
             coord = random_offset(lobby['game_password_input'], 3) if self.randomize else lobby['game_password_input']
             self.input_controller.click(*coord)
-            sleep_random(0.2, 0.3) if self.randomize else time.sleep(0.2)
+            sleep_random(0.2, 0.3) if self.randomize else self.clock.sleep(0.2)
             self.input_controller.type_text(password)
         
         # 开始游戏
         coord = random_offset(lobby['start_game_button'], 3) if self.randomize else lobby['start_game_button']
         self.input_controller.click(*coord)
-        sleep_random(5.0, 0.1) if self.randomize else time.sleep(5)
+        self._wait_for_game_ready()
         
         self.logger.info("游戏创建完成")
     
+    def _wait_for_game_ready(self) -> None:
+        """等待游戏加载完成
+
+        有探针时高频轮询：先等加载画面（或直接进入城镇），再等第一帧城镇画面，
+        一旦可操作立即返回；否则或检测失败时退回原来的固定等待。
+        """
+        fixed_wait = random_delay(5.0, 0.1) if self.randomize else 5.0
+        if self.screen_watcher is None:
+            self.clock.sleep(fixed_wait)
+            return
+        
+        screen_config = self.config.get('screen_state', {})
+        ready_states = tuple(screen_config.get('game_ready_states', ['harrogath']))
+        settle_delay = screen_config.get('ready_settle_delay', 0.3)
+        
+        start = self.clock.time()
+        ready = None
+        try:
+            state = self.screen_watcher.wait_for(('loading',) + ready_states, timeout=fixed_wait)
+            if state is not None:
+                ready = self.screen_watcher.wait_for(ready_states, timeout=fixed_wait - (self.clock.time() - start))
+        except Exception as e:
+            self.logger.warning("加载检测失败: %s，使用固定等待", e)
+        
+        elapsed = self.clock.time() - start
+        if ready is None:
+            # 未检测到进入游戏，按原固定时间等待
+            if elapsed < fixed_wait:
+                self.clock.sleep(fixed_wait - elapsed)
+            return
+        
+        self.clock.sleep(settle_delay)
+        saved = max(0.0, fixed_wait - elapsed - settle_delay)
+        self.statistics.record_time_saved('加载检测', saved)
+        self.logger.info("检测到已进入游戏 (%.2f秒，节省%.2f秒)", elapsed, saved)
+    
     def navigate_to_red_portal(self):
         """从城镇初始位置导航到红门"""
         self.logger.info("从城镇导航到红门...")
@@ -146,13 +381,13 @@ class D2PindleBot:
         
         if town_path:
             # 使用预设路径传送
-            self.logger.info(f"使用预设路径（{len(town_path)}个点）")
+            self.logger.info("使用预设路径（%d个点）", len(town_path))
             for i, point in enumerate(town_path):
                 coord = random_offset(point, 5) if self.randomize else point
                 self.input_controller.click(*coord, button='right')
                 
                 delay = 0.4 if i == 0 else 0.3  # 第一次稍慢
-                sleep_random(delay, 0.2) if self.randomize else time.sleep(delay)
+                sleep_random(delay, 0.2) if self.randomize else self.clock.sleep(delay)
         else:
             # 备用：直接尝试传送到红门附近
             self.logger.info("使用直接传送（备用）")
@@ -167,7 +402,7 @@ class D2PindleBot:
                 
                 coord = random_offset((target_x, target_y), 8) if self.randomize else (target_x, target_y)
                 self.input_controller.click(*coord, button='right')
-                sleep_random(0.4, 0.2) if self.randomize else time.sleep(0.4)
+                sleep_random(0.4, 0.2) if self.randomize else self.clock.sleep(0.4)
         
         self.logger.info("已到达红门附近")
     
@@ -183,16 +418,16 @@ class D2PindleBot:
             self.input_controller.click(*coord)
             
             if attempt < max_attempts - 1:
-                sleep_random(0.5, 0.2) if self.randomize else time.sleep(0.5)
+                sleep_random(0.5, 0.2) if self.randomize else self.clock.sleep(0.5)
                 
                 # 如果第一次失败，尝试移动一下位置
                 if attempt == 0:
                     self.logger.info("调整位置重试...")
                     offset_coord = random_offset(in_game['red_portal_position'], 15) if self.randomize else in_game['red_portal_position']
                     self.input_controller.click(*offset_coord, button='right')
-                    sleep_random(0.3, 0.1) if self.randomize else time.sleep(0.3)
+                    sleep_random(0.3, 0.1) if self.randomize else self.clock.sleep(0.3)
         
-        sleep_random(2.0, 0.2) if self.randomize else time.sleep(2.0)
+        sleep_random(2.0, 0.2) if self.randomize else self.clock.sleep(2.0)
         self.logger.info("已进入神殿")
     
     def navigate_to_pindle(self):
@@ -224,19 +459,24 @@ class D2PindleBot:
                     # 第一次传送可能稍慢（人类反应）
                     base_delay = tp_delay if i > 0 else tp_delay * 1.5
                     delay = random_delay(base_delay, 0.2)
-                    time.sleep(delay)
+                    self.clock.sleep(delay)
                 else:
-                    time.sleep(tp_delay)
+                    self.clock.sleep(tp_delay)
                 
                 success = True  # 假设成功，实际可以添加位置检测
                 attempts += 1
                 
                 if not success and attempts < max_attempts:
-                    self.logger.warning(f"传送点{i+1}可能失败，重试...")
+                    self.logger.warning("传送点%d可能失败，重试...", i + 1)
         
-        sleep_random(0.3, 0.2) if self.randomize else time.sleep(0.3)
+        sleep_random(0.3, 0.2) if self.randomize else self.clock.sleep(0.3)
     
-    def kill_pindle(self):
+    def kill_pindle(self) -> Dict[str, Any]:
+        """击杀Pindleskin，检测到死亡时提前结束施法
+
+        Returns:
+            击杀记录 {kill_casts, kill_seconds, kill_early_exit}
+        """
         self.logger.info("击杀Pindleskin...")
         in_game = self.config['coordinates']['in_game']
         sorc_config = self.config.get('sorceress', {})
@@ -250,29 +490,50 @@ class D2PindleBot:
         static_casts = sorc_config.get('static_field_casts', 3)
         static_key = self.config['hotkeys'].get('static_field', 'f2')
         
+        kill_start = self.clock.time()
+        casts = 0
+        target_dead = False
+        self.kill_detector.reset()
+        
         self.logger.info("释放静态力场...")
         for _ in range(static_casts):
             self.input_controller.press_key_by_name(static_key)
-            time.sleep(0.1)
+            self.clock.sleep(0.1)
             self.input_controller.click(*pindle_area)
-            time.sleep(cast_delay)
+            self.clock.sleep(cast_delay)
+            casts += 1
+            
+            if self.kill_detector.is_dead():
+                target_dead = True
+                break
         
         # 2. 使用暴风雪击杀（F1）
         blizzard_key = self.config['hotkeys'].get('blizzard', 'f1')
         blizzard_casts = sorc_config.get('blizzard_casts', 3)
         blizzard_delay = sorc_config.get('blizzard_delay', 0.6)
         
-        self.logger.info("释放暴风雪...")
-        for i in range(blizzard_casts):
-            self.input_controller.press_key_by_name(blizzard_key)
-            time.sleep(0.1)
-            # 暴风雪在Pindle位置施放
-            self.input_controller.click(*pindle_area)
-            time.sleep(cast_delay)
-            
-            # 等待暴风雪持续伤害
-            if i < blizzard_casts - 1:
-                time.sleep(blizzard_delay)
+        if not target_dead:
+            self.logger.info("释放暴风雪...")
+            for i in range(blizzard_casts):
+                self.input_controller.press_key_by_name(blizzard_key)
+                self.clock.sleep(0.1)
+                # 暴风雪在Pindle位置施放
+                self.input_controller.click(*pindle_area)
+                self.clock.sleep(cast_delay)
+                casts += 1
+                
+                # 等待暴风雪持续伤害，期间检测是否已死亡
+                if i < blizzard_casts - 1:
+                    target_dead = self.kill_detector.wait_for_death(blizzard_delay)
+                else:
+                    target_dead = self.kill_detector.is_dead()
+                
+                if target_dead:
+                    break
+        
+        kill_seconds = self.clock.time() - kill_start
+        if target_dead:
+            self.logger.info("检测到Pindleskin死亡，提前结束施法 (%d次, %.2f秒)", casts, kill_seconds)
         
         # 3. 安全机制：传送到安全位置（避免Pindle死亡爆炸）
         if safety_config.get('teleport_away_after_cast', True):
@@ -282,18 +543,24 @@ class D2PindleBot:
             
             # 右键传送离开
             self.input_controller.click(safe_x, safe_y, button='right')
-            time.sleep(0.3)
+            self.clock.sleep(0.3)
         
         # 4. 等待Pindle死亡和尸爆完成
         wait_time = safety_config.get('wait_before_pickup', 1.5)
-        self.logger.info(f"等待{wait_time}秒确保安全...")
-        time.sleep(wait_time)
+        self.logger.info("等待%s秒确保安全...", wait_time)
+        self.clock.sleep(wait_time)
         
         # 5. 预防性喝血药
         if safety_config.get('drink_potion_after_kill', True):
             health_key = self.config['hotkeys'].get('health_potion', '1')
             self.input_controller.press_key_by_name(health_key)
-            time.sleep(0.2)
+            self.clock.sleep(0.2)
+        
+        return {
+            'kill_casts': casts,
+            'kill_seconds': round(kill_seconds, 3),
+            'kill_early_exit': target_dead
+        }
     
     def pickup_items(self):
         self.logger.info("拾取物品...")
@@ -306,22 +573,29 @@ class D2PindleBot:
         
         # 额外等待尸爆完成
         if pickup_config.get('wait_for_corpse_explosion', True):
-            time.sleep(0.5)
+            self.clock.sleep(0.5)
         
         if use_smart_pickup and scan_area:
             # 智能拾取：检测屏幕颜色
-            self.logger.info(f"扫描物品类型: {', '.join(item_types)}")
+            self.logger.info("扫描物品类型: %s", ', '.join(item_types))
             
-            time.sleep(0.5)  # 等待物品掉落显示
+            self.clock.sleep(0.5)  # 等待物品掉落显示
             
             try:
-                items = self.item_detector.find_items_in_area(
-                    tuple(scan_area), 
-                    item_types
-                )
+                self.performance_monitor.start_timer('item_detection')
+                try:
+                    items = self.item_detector.find_items_in_area(
+                        tuple(scan_area), 
+                        item_types
+                    )
+                finally:
+                    self.performance_monitor.end_timer('item_detection')
                 
+                frame = getattr(items, 'frame', None)
+                self._event('item_detected', count=len(items), frame=frame.seq if frame else None,
+                            items=[[int(x), int(y), item_type] for x, y, item_type in items])
                 if items:
-                    self.logger.info(f"检测到 {len(items)} 个物品")
+                    self.logger.info("检测到 %d 个物品", len(items))
                     picked_count = 0
                     picked_items = {"unique": 0, "rune": 0, "set": 0, "rare": 0}
                     
@@ -340,68 +614,127 @@ class D2PindleBot:
                             reason = item_type
                         
                         if should_pickup:
-                            self.logger.info(f"拾取物品 {idx+1} [{reason}]: ({x}, {y})")
+                            self.logger.info("拾取物品 %d [%s]: (%d, %d)", idx + 1, reason, x, y)
+                            self._event('item_picked', index=idx + 1, item_type=item_type, x=int(x), y=int(y))
+                            self.performance_monitor.record_frame_action(items)
                             self.input_controller.click(x, y)
-                            time.sleep(0.3)
+                            self.clock.sleep(0.3)
                             picked_count += 1
                             if item_type in picked_items:
                                 picked_items[item_type] += 1
                         else:
-                            self.logger.debug(f"跳过物品 {idx+1} [{item_type}]: 低价值")
+                            self.logger.debug("跳过物品 %d [%s]: 低价值", idx + 1, item_type)
                     
-                    self.logger.info(f"拾取完成: {picked_count}/{len(items)} 个物品")
+                    self.logger.info("拾取完成: %d/%d 个物品", picked_count, len(items))
                     return picked_items
                 else:
                     self.logger.info("未检测到可拾取物品")
                     return {}
             except Exception as e:
-                self.logger.warning(f"智能拾取失败: {e}，使用固定坐标")
+                self.logger.warning("智能拾取失败: %s，使用固定坐标", e)
                 self._pickup_by_positions()
         else:
             # 传统拾取：固定坐标
             self._pickup_by_positions()
         
-        time.sleep(0.5)
+        self.clock.sleep(0.5)
     
     def _pickup_by_positions(self):
         """使用固定坐标拾取物品"""
         pickup_positions = self.config['coordinates'].get('legacy_pickup_positions', [])
         for pos in pickup_positions:
             self.input_controller.click(*pos)
-            time.sleep(0.2)
+            self.clock.sleep(0.2)
     
     def leave_game(self):
         self.logger.info("离开游戏...")
         self.input_controller.press_key_by_name('esc')
-        time.sleep(0.5)
+        self.clock.sleep(0.5)
         self.input_controller.press_key_by_name('enter')
-        time.sleep(3)
+        self.clock.sleep(3)
+    
+    def recover_from_abort(self) -> bool:
+        """看门狗中止后的快速恢复：退出游戏并确认回到大厅
+
+        Returns:
+            是否确认回到大厅（没有画面探针时无法确认，按固定等待后返回True）
+        """
+        recovery = self.config.get('watchdog', {}).get('recovery', {})
+        attempts = recovery.get('max_attempts', 2)
+        lobby_timeout = recovery.get('lobby_timeout', 5.0)
+
+        for attempt in range(attempts):
+            state = None
+            if self.screen_watcher is not None:
+                state = self.screen_watcher.current_state()
+                if state == 'loading':
+                    state = self.screen_watcher.wait_for(('lobby', 'harrogath', 'temple', 'menu'),
+                                                         timeout=lobby_timeout)
+                if state == 'lobby':
+                    self.logger.info("已在大厅")
+                    return True
+            
+            # 菜单已打开时再按ESC会关闭菜单
+            if state != 'menu':
+                self.input_controller.press_key_by_name('esc')
+                self.clock.sleep(0.3)
+            self.input_controller.press_key_by_name('enter')
+            
+            if self.screen_watcher is None:
+                self.clock.sleep(3)
+                return True
+            if self.screen_watcher.wait_for(('lobby',), timeout=lobby_timeout) == 'lobby':
+                self.logger.info("已回到大厅")
+                return True
+            self.logger.warning("恢复第%d次后未检测到大厅，重试...", attempt + 1)
+        
+        self.logger.error("快速恢复失败，未能确认回到大厅")
+        return False
     
     def run_single_game(self):
         success = False
         picked_items = {"unique": 0, "rune": 0, "set": 0, "rare": 0}
+        run_details: Dict[str, Any] = {}
+        self.current_game_name = None
+        self.current_game_base = None
+        previous_clock = set_clock(self.clock)
+        self.current_run = self.statistics.total_runs + 1
+        run_span = self.tracer.span('run', 'run', run=self.current_run)
+        run_span.__enter__()
         
         try:
             self.statistics.start_run()
+            self._event('run_start')
             
-            self.create_game()
-            self.navigate_to_red_portal()  # 从城镇导航到红门
-            self.use_red_portal()           # 进入红门
-            self.navigate_to_pindle()       # 传送到Pindle
-            self.kill_pindle()
+            with self._phase('create_game'):
+                self.create_game()
+            run_details['game_name'] = self.current_game_name
+            run_details['game_name_base'] = self.current_game_base
+            with self._phase('navigate_to_red_portal'):
+                self.navigate_to_red_portal()  # 从城镇导航到红门
+            with self._phase('use_red_portal'):
+                self.use_red_portal()           # 进入红门
+            with self._phase('navigate_to_pindle'):
+                self.navigate_to_pindle()       # 传送到Pindle
+            with self._phase('kill_pindle'):
+                run_details.update(self.kill_pindle())
             
             # 拾取物品并记录
-            items = self.pickup_items()
+            with self._phase('pickup_items'):
+                items = self.pickup_items()
             if items:
                 for item_type, count in items.items():
                     picked_items[item_type] = count
             
-            self.leave_game()
+            with self._phase('leave_game'):
+                self.leave_game()
             
             self.run_count += 1
             success = True
             
-            self.logger.info(f"✅ 完成第 {self.run_count} 次 | {self.statistics.get_short_status()}")
+            self.logger.info("✅ 完成第 %d 次 | 击杀: %d次施法/%.2f秒 | %s",
+                             self.run_count, run_details['kill_casts'], run_details['kill_seconds'],
+                             self.statistics.get_short_status())
             
             # 每5分钟生成一次详细报告
             if self.statistics.should_report(interval=300):
@@ -409,20 +742,49 @@ class D2PindleBot:
             
             # 随机化两局之间的延迟
             base_delay = self.config['bot']['delay_between_runs']
-            if self.randomize:
-                delay = random_delay(base_delay, 0.3)
-                time.sleep(delay)
-            else:
-                time.sleep(base_delay)
+            with self._phase('between_runs'):
+                if self.randomize:
+                    delay = random_delay(base_delay, 0.3)
+                    self.clock.sleep(delay)
+                else:
+                    self.clock.sleep(base_delay)
             
+        except RunAborted as e:
+            self.logger.warning("⏱️ 看门狗中止本局: %s", e)
+            self._event('error', kind='watchdog_abort', phase=e.phase, message=str(e))
+            run_details['timeout_phase'] = e.phase
+            self.tracer.instant('watchdog_abort', 'phase', phase=e.phase)
+            try:
+                with self.tracer.span('recovery', 'phase'), self.statistics.phase('recovery'):
+                    self.recover_from_abort()
+            except Exception as recover_error:
+                self.logger.error("快速恢复出错: %s", recover_error)
         except Exception as e:
-            self.logger.error(f"❌ 运行出错: {e}", exc_info=True)
+            self.logger.error("❌ 运行出错: %s", e, exc_info=True)
+            self._event('error', kind=type(e).__name__, message=str(e))
             try:
-                self.leave_game()
-            except:
-                pass
+                with self.statistics.phase('leave_game'):
+                    self.leave_game()
+            except Exception as leave_error:
+                self.logger.error("出错后离开游戏失败: %s", leave_error)
         finally:
-            self.statistics.end_run(success=success, items=picked_items)
+            set_clock(previous_clock)
+            duration = self.statistics.end_run(success=success, items=picked_items,
+                                               details=run_details)
+            # end_run 记录失败时返回None
+            duration = duration if duration is not None else 0.0
+            if not success and self.journal is not None:
+                # 中止或出错的局之后更可能崩溃，立即fsync
+                self.journal.sync()
+            run_span.set(success=success, game_name=self.current_game_name)
+            self._event('run_end', success=success, duration=round(duration, 4),
+                        game_name=self.current_game_name, items=picked_items)
+            run_span.__exit__(None, None, None)
+            if self.tuner:
+                self.tuner.record_run(success, duration)
+                self.tuner.apply(self.config)
+            if self.statistics.total_runs % self.watchdog.update_every == 0:
+                self.watchdog.update_deadlines(self.statistics.get_phase_stats())
     
     def start(self):
         if not self.initialize():
@@ -431,7 +793,7 @@ class D2PindleBot:
         self.is_running = True
         max_runs = self.config['bot']['runs_count']
         
-        self.logger.info(f"开始刷Pindleskin，目标次数: {max_runs}")
+        self.logger.info("开始刷Pindleskin，目标次数: %d", max_runs)
         
         try:
             while self.is_running and self.run_count < max_runs:
@@ -443,16 +805,75 @@ class D2PindleBot:
     
     def stop(self):
         self.is_running = False
+        self.watchdog.stop()
+        self.item_detector.close()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
         
         # 显示最终统计报告
         self.logger.info("\n" + "=" * 50)
         self.logger.info("程序已停止")
         self.logger.info(self.statistics.get_report(detailed=True))
+        if self.tuner:
+            self.logger.info(self.tuner.get_summary())
+            self.tuner.save()
+        self.logger.info(self.watchdog.get_summary())
+        self.performance_monitor.stop_monitoring()
+        self.performance_monitor.stop_memory_diagnostics()
+        self.logger.info(self.performance_monitor.get_performance_report())
         self.logger.info("=" * 50)
         
-        # 保存统计到文件
-        self.statistics.save_to_file("run_statistics.txt")
-        self.logger.info("统计数据已保存到 run_statistics.txt")
+        # 保存统计到文件（模拟和实验的数据不覆盖真实运行的统计）
+        if self.persist:
+            self.statistics.save_to_file(self.stats_file)
+            self.logger.info("统计数据已保存到 %s", self.stats_file)
+        if self.journal is not None:
+            self.journal.close()
+        if self.run_store is not None:
+            self.run_store.close()
+            self.logger.info("运行历史已写入 %s (本次 %d 局)", self.run_store.path, self.run_store.written)
+        if self.latency_dir is not None:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            self.performance_monitor.save_latency_histograms(
+                os.path.join(self.latency_dir, f"latency_{self.session_name or 'default'}_{timestamp}.json"))
+        if self.tracing_config.get('enabled', False) and self.tracer.event_count:
+            self.export_trace()
+        if self.profiler_config.get('enabled', False):
+            self.performance_monitor.stop_profiling()
+            self.logger.info(self.performance_monitor.profiler.get_summary())
+            self.save_profile()
+
+        # 等待日志队列写空，停止后的报告不会滞留在队列中
+        queue_stats = LoggerConfig.get_queue_stats().get(self.logger.name)
+        if queue_stats and (queue_stats['dropped'] or queue_stats['blocked']):
+            self.logger.info("日志队列: 丢弃 %d 条DEBUG记录, 队列满时等待 %d 次",
+                             queue_stats['dropped'], queue_stats['blocked'])
+        if self.events is not None:
+            self.events.close()
+            self.logger.info("事件日志已写入 %s (%d 条)", self.events.path, self.events.written)
+        if not LoggerConfig.flush():
+            self.logger.warning("日志队列未能在超时前写空")
+
+    def save_profile(self, path: Optional[str] = None) -> bool:
+        """保存采样分析结果（运行中也可调用），默认写入 profiler.output_dir"""
+        if path is None:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            session = self.session_name or 'default'
+            path = os.path.join(self.profiler_config.get('output_dir', 'profiles'),
+                                f"profile_{session}_{timestamp}.folded")
+        return self.performance_monitor.save_profile(path)
+
+    def export_trace(self, path: Optional[str] = None) -> Optional[str]:
+        """导出Chrome trace文件，默认写入 tracing.output_dir"""
+        if path is None:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            session = self.session_name or 'default'
+            path = os.path.join(self.tracing_config.get('output_dir', 'traces'), f"trace_{session}_{timestamp}.json")
+        try:
+            return self.tracer.export_chrome_trace(path)
+        except Exception as e:
+            self.logger.error("导出追踪失败: %s", e)
+            return None
 
 
 if __name__ == '__main__':
@@ -1,37 +1,42 @@
 import win32api
 import win32con
-import time
 from typing import Tuple
 
+from clock import get_clock
+from tracing import traced
+
 
 class InputController:
     @staticmethod
+    @traced('click', 'input')
     def click(x: int, y: int, button: str = 'left', delay: float = 0.1):
         win32api.SetCursorPos((x, y))
-        time.sleep(delay)
+        get_clock().sleep(delay)
         
         if button == 'left':
             win32api.mouse_event(win32con.MOUSEEVENTF_LEFTDOWN, x, y, 0, 0)
-            time.sleep(0.05)
+            get_clock().sleep(0.05)
             win32api.mouse_event(win32con.MOUSEEVENTF_LEFTUP, x, y, 0, 0)
         elif button == 'right':
             win32api.mouse_event(win32con.MOUSEEVENTF_RIGHTDOWN, x, y, 0, 0)
-            time.sleep(0.05)
+            get_clock().sleep(0.05)
             win32api.mouse_event(win32con.MOUSEEVENTF_RIGHTUP, x, y, 0, 0)
     
     @staticmethod
     def move_to(x: int, y: int, delay: float = 0.1):
         win32api.SetCursorPos((x, y))
-        time.sleep(delay)
+        get_clock().sleep(delay)
     
     @staticmethod
+    @traced('press_key', 'input')
     def press_key(key_code: int, delay: float = 0.1):
         win32api.keybd_event(key_code, 0, 0, 0)
-        time.sleep(0.05)
+        get_clock().sleep(0.05)
         win32api.keybd_event(key_code, 0, win32con.KEYEVENTF_KEYUP, 0)
-        time.sleep(delay)
+        get_clock().sleep(delay)
     
     @staticmethod
+    @traced('press_key_by_name', 'input')
     def press_key_by_name(key_name: str, delay: float = 0.1):
         key_map = {
             'f1': win32con.VK_F1,
@@ -53,10 +58,11 @@ class InputController:
             InputController.press_key(key_code, delay)
     
     @staticmethod
+    @traced('type_text', 'input')
     def type_text(text: str, delay: float = 0.05):
         for char in text:
             vk_code = win32api.VkKeyScan(char)
             win32api.keybd_event(vk_code, 0, 0, 0)
-            time.sleep(0.02)
+            get_clock().sleep(0.02)
             win32api.keybd_event(vk_code, 0, win32con.KEYEVENTF_KEYUP, 0)
-            time.sleep(delay)
+            get_clock().sleep(delay)
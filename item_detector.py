@@ -1,10 +1,72 @@
 import cv2
+import itertools
 import numpy as np
 from PIL import ImageGrab
-import win32gui
+from dataclasses import dataclass
 from typing import List, Tuple, Optional, Dict, Any
 import logging
-import time
+
+from clock import get_clock
+from performance_monitor import get_global_monitor, monitor_performance
+from tracing import get_tracer, traced
+
+
+# 截图序号（进程内递增）
+_frame_seq = itertools.count(1)
+
+
+@dataclass
+class FrameInfo:
+    """截图元数据"""
+    seq: int
+    captured_at: float          # 截图完成时的单调时间（get_clock().monotonic()）
+    capture_duration: float     # 截图本身的耗时（秒，不含限频等待）
+    region: Optional[Tuple[int, int, int, int]] = None
+
+
+class CapturedFrame(np.ndarray):
+    """带 FrameInfo 的截图，用法与普通numpy数组相同，切片后保留元数据"""
+    info: Optional[FrameInfo] = None
+
+    def __array_finalize__(self, obj) -> None:
+        self.info = getattr(obj, 'info', None)
+
+
+class DetectionList(list):
+    """检测结果 [(x, y, item_type), ...]，附带来源帧和检测完成时间，用于计算截图到点击的延迟"""
+
+    def __init__(self, items=(), frame: Optional[FrameInfo] = None, detected_at: Optional[float] = None):
+        super().__init__(items)
+        self.frame = frame
+        self.detected_at = detected_at
+
+
+def tag_frame(img: np.ndarray, started: float,
+              region: Optional[Tuple[int, int, int, int]] = None) -> CapturedFrame:
+    """给截图加上序号和时间戳
+
+    截图耗时不在这里记录：血条轮询等小区域截图不进入物品检测，
+    帧处理链路只统计送入 detect_items_by_color 的截图。
+
+    Args:
+        img: 截图
+        started: 开始截图时的 get_clock().monotonic()，与 captured_at 使用同一时间基准
+        region: 截图区域
+    """
+    frame = img.view(CapturedFrame)
+    captured_at = get_clock().monotonic()
+    frame.info = FrameInfo(
+        seq=next(_frame_seq),
+        captured_at=captured_at,
+        capture_duration=captured_at - started,
+        region=tuple(region) if region else None
+    )
+    tracer = get_tracer()
+    if tracer.enabled:
+        span = tracer.current_span()
+        if span is not None:
+            span.set(seq=frame.info.seq)
+    return frame
 
 
 class ItemDetector:
@@ -19,7 +81,7 @@ class ItemDetector:
 
     # 暗黑2重置版物品颜色范围 (BGR格式)
     # D2R使用更鲜艳的颜色和更好的渲染
-    ITEM_COLORS: Dict[str, Dict[str, np.ndarray] = {
+    ITEM_COLORS: Dict[str, Dict[str, np.ndarray]] = {
         'unique': {  # 暗金装备 - 深棕色文字
             'lower': np.array([0, 80, 160]),
             'upper': np.array([40, 150, 220])
@@ -57,7 +119,11 @@ class ItemDetector:
         # 性能优化：缓存常用变量
         self._last_capture_time = 0
         self._capture_cooldown = 0.033  # 30 FPS限制
+
+        # 探针像素读取器（按需创建）
+        self._pixel_reader: Optional["_GdiPixelReader"] = None
     
+    @monitor_performance('capture_screen', 'capture')
     def capture_screen(self, region: Optional[Tuple[int, int, int, int]] = None) -> np.ndarray:
         """截取屏幕
 
@@ -65,16 +131,17 @@ class ItemDetector:
             region: (x1, y1, x2, y2) 截取区域，None为全屏
 
         Returns:
-            numpy数组格式的图像 (BGR)
+            numpy数组格式的图像 (BGR)，为 CapturedFrame（.info 中有序号和截图时间）
         """
         # 性能优化：限制截图频率
-        current_time = time.time()
+        current_time = get_clock().time()
         if current_time - self._last_capture_time < self._capture_cooldown:
-            time.sleep(self._capture_cooldown - (current_time - self._last_capture_time))
+            get_clock().sleep(self._capture_cooldown - (current_time - self._last_capture_time))
 
-        self._last_capture_time = time.time()
+        self._last_capture_time = get_clock().time()
 
         try:
+            started = get_clock().monotonic()
             if region:
                 screenshot = ImageGrab.grab(bbox=region)
             else:
@@ -82,16 +149,52 @@ class ItemDetector:
 
             # 转换为OpenCV格式 (BGR)
             img = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
-            return img
+            return tag_frame(img, started, region)
         except Exception as e:
             self.logger.error(f"屏幕截图失败: {e}")
             raise
     
+    def get_screen_size(self) -> Optional[Tuple[int, int]]:
+        """桌面分辨率 (宽, 高)，无法获取时返回None"""
+        try:
+            import win32api
+            return win32api.GetSystemMetrics(0), win32api.GetSystemMetrics(1)
+        except Exception:
+            pass
+        try:
+            return ImageGrab.grab().size
+        except Exception as e:
+            self.logger.warning(f"无法获取屏幕分辨率: {e}")
+            return None
+
+    @traced('read_pixels', 'capture')
+    def read_pixels(self, points: np.ndarray) -> np.ndarray:
+        """只读取指定屏幕坐标的像素（用于探针式画面状态判断）
+
+        Args:
+            points: 形状为 (N, 2) 的坐标数组 [(x, y), ...]
+
+        Returns:
+            形状为 (N, 3) 的BGR像素数组
+        """
+        if self._pixel_reader is None or self._pixel_reader.count != len(points):
+            if self._pixel_reader is not None:
+                self._pixel_reader.close()
+            self._pixel_reader = _GdiPixelReader(len(points))
+        return self._pixel_reader.read(points)
+
+    def close(self) -> None:
+        """释放探针像素读取器占用的GDI资源"""
+        if self._pixel_reader is not None:
+            self._pixel_reader.close()
+            self._pixel_reader = None
+
+    @monitor_performance('detect_items_by_color', 'detect')
     def detect_items_by_color(self,
                               img: np.ndarray,
                               item_types: List[str] = ['unique'],
                               min_area: int = 30,
-                              max_area: int = 5000) -> List[Tuple[int, int, str]]:
+                              max_area: int = 5000) -> DetectionList:
         """根据颜色检测物品位置（D2R优化版）
 
         Args:
@@ -101,8 +204,16 @@ class ItemDetector:
             max_area: 最大检测区域（像素）
 
         Returns:
-            检测到的物品列表 [(x, y, item_type), ...]
+            检测到的物品列表 [(x, y, item_type), ...]，.frame 为来源截图的 FrameInfo
         """
+        frame = getattr(img, 'info', None)
+        if frame is not None:
+            get_global_monitor().record_operation('frame_capture', frame.capture_duration)
+        positions = self._detect_items(img, item_types, min_area, max_area)
+        return DetectionList(positions, frame=frame, detected_at=get_clock().monotonic())
+
+    def _detect_items(self, img: np.ndarray, item_types: List[str],
+                      min_area: int, max_area: int) -> List[Tuple[int, int, str]]:
         if img is None or img.size == 0:
             self.logger.warning("图像为空，跳过检测")
             return []
@@ -203,7 +314,7 @@ class ItemDetector:
     
     def find_items_in_area(self,
                           region: Tuple[int, int, int, int],
-                          item_types: List[str] = ['unique']) -> List[Tuple[int, int, str]]:
+                          item_types: List[str] = ['unique']) -> DetectionList:
         """在指定区域查找物品（D2R优化版）
 
         Args:
@@ -211,7 +322,7 @@ class ItemDetector:
             item_types: 物品类型列表
 
         Returns:
-            物品的绝对屏幕坐标和类型 [(x, y, type), ...]
+            物品的绝对屏幕坐标和类型 [(x, y, type), ...]（DetectionList）
         """
         # 输入验证
         if not isinstance(region, (tuple, list)) or len(region) != 4:
@@ -227,7 +338,49 @@ class ItemDetector:
                 for x, y, item_type in relative_positions
             ]
 
-            return absolute_positions
+            return DetectionList(absolute_positions, relative_positions.frame, relative_positions.detected_at)
         except Exception as e:
             self.logger.error(f"在区域 {region} 查找物品失败: {e}")
-            return []
+            return DetectionList()
+
+
+class _GdiPixelReader:
+    """通过GDI逐点拷贝读取少量屏幕像素
+
+    每个探针点BitBlt一个像素到 N x 1 的内存位图，最后一次性取回，
+    避免整屏截图和颜色转换的开销。
+    """
+
+    def __init__(self, count: int):
+        import win32gui
+        import win32ui
+        import win32con
+
+        self._win32gui = win32gui
+
+        self.count = count
+        self._srccopy = win32con.SRCCOPY
+        self._hwnd = win32gui.GetDesktopWindow()
+        self._hdc = win32gui.GetWindowDC(self._hwnd)
+        self._src_dc = win32ui.CreateDCFromHandle(self._hdc)
+        self._mem_dc = self._src_dc.CreateCompatibleDC()
+        self._bitmap = win32ui.CreateBitmap()
+        self._bitmap.CreateCompatibleBitmap(self._src_dc, count, 1)
+        self._mem_dc.SelectObject(self._bitmap)
+
+    def read(self, points: np.ndarray) -> np.ndarray:
+        for i, (x, y) in enumerate(points):
+            self._mem_dc.BitBlt((i, 0), (1, 1), self._src_dc, (int(x), int(y)), self._srccopy)
+
+        raw = self._bitmap.GetBitmapBits(True)
+        # GDI位图为BGRA格式，去掉Alpha通道
+        return np.frombuffer(raw, dtype=np.uint8).reshape(self.count, 4)[:, :3]
+
+    def close(self) -> None:
+        try:
+            self._mem_dc.DeleteDC()
+            self._src_dc.DeleteDC()
+            self._win32gui.ReleaseDC(self._hwnd, self._hdc)
+            self._win32gui.DeleteObject(self._bitmap.GetHandle())
+        except Exception:
+            pass
@@ -0,0 +1,116 @@
+"""
+Pindleskin死亡检测
+施法时鼠标停在Pindle身上，游戏顶部会显示目标的红色血条；
+血条消失即认为目标已死亡，可以提前结束施法循环
+"""
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from clock import get_clock
+
+
+class PindleDeathDetector:
+    """通过监视小块区域中的血条颜色判断目标是否死亡
+
+    默认区域为屏幕顶部中央的怪物血条，也可以配置为 pindle_spawn_area 周围的区域。
+    只有先看到过目标存活，才会判定死亡，避免鼠标未指向目标时误判。
+    """
+
+    # 血条红色范围 (BGR)
+    DEFAULT_LOWER = (0, 0, 120)
+    DEFAULT_UPPER = (70, 60, 255)
+
+    def __init__(self,
+                 capture: Callable[[Tuple[int, int, int, int]], np.ndarray],
+                 config: Optional[Dict[str, Any]] = None,
+                 spawn_area: Optional[Tuple[int, int]] = None):
+        """
+        Args:
+            capture: 截图函数，参数为 (x1, y1, x2, y2)，通常为 ItemDetector.capture_screen
+            config: sorceress.kill_detection 配置
+            spawn_area: pindle_spawn_area 坐标，region 为 "spawn_area" 时使用
+        """
+        config = config or {}
+        self.logger = logging.getLogger(__name__)
+        self.capture = capture
+        self.enabled: bool = config.get('enabled', True)
+        self.min_red_ratio: float = config.get('min_red_ratio', 0.15)
+        self.confirm_frames: int = config.get('confirm_frames', 2)
+        self.poll_interval: float = config.get('poll_interval', 0.05)
+        # 确认帧在同一次检查内间隔 confirm_interval 秒重新截图，不必等到下一次施法
+        self.confirm_interval: float = config.get('confirm_interval', 0.03)
+        self.lower = np.array(config.get('color_lower', self.DEFAULT_LOWER), dtype=np.uint8)
+        self.upper = np.array(config.get('color_upper', self.DEFAULT_UPPER), dtype=np.uint8)
+
+        region = config.get('region', 'health_bar')
+        if region == 'spawn_area' and spawn_area:
+            size = config.get('roi_size', 60)
+            x, y = spawn_area
+            self.region = (x - size, y - size, x + size, y + size)
+        else:
+            self.region = tuple(config.get('health_bar_area', [860, 20, 1060, 50]))
+
+        self.reset()
+
+    def reset(self) -> None:
+        """每次击杀前重置状态"""
+        self.seen_alive = False
+
+    def get_red_ratio(self) -> float:
+        """检测区域内血条颜色像素占比"""
+        img = self.capture(self.region)
+        if img is None or img.size == 0:
+            return 0.0
+        mask = cv2.inRange(img, self.lower, self.upper)
+        return cv2.countNonZero(mask) / float(mask.size)
+
+    def _sample_alive(self) -> Optional[bool]:
+        """截图一次，返回血条是否可见；截图失败返回None"""
+        try:
+            ratio = self.get_red_ratio()
+        except Exception as e:
+            self.logger.warning(f"死亡检测截图失败: {e}")
+            return None
+        return ratio >= self.min_red_ratio
+
+    def is_dead(self) -> bool:
+        """检查一次目标是否死亡
+
+        血条消失后在本次检查内每隔 confirm_interval 秒重新截图，
+        连续 confirm_frames 帧都未见血条才判定死亡（血条闪烁或被遮挡一帧不会误判）。
+        """
+        if not self.enabled:
+            return False
+
+        alive = self._sample_alive()
+        if alive is None:
+            return False
+        if alive:
+            self.seen_alive = True
+            return False
+        if not self.seen_alive:
+            return False
+
+        for _ in range(self.confirm_frames - 1):
+            get_clock().sleep(self.confirm_interval)
+            if self._sample_alive() is not False:
+                return False
+        return True
+
+    def wait_for_death(self, timeout: float) -> bool:
+        """在超时前轮询，目标死亡时提前返回True"""
+        if not self.enabled:
+            get_clock().sleep(timeout)
+            return False
+
+        deadline = get_clock().time() + timeout
+        while True:
+            if self.is_dead():
+                return True
+            remaining = deadline - get_clock().time()
+            if remaining <= 0:
+                return False
+            get_clock().sleep(min(self.poll_interval, remaining))
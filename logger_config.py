@@ -2,22 +2,88 @@
 日志配置模块
 提供统一的日志配置和管理
 """
+import atexit
 import logging
 import logging.handlers
 import os
+import queue
+import threading
+import time
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Optional
+
+
+# 队列已满时的处理方式
+OVERFLOW_POLICIES = ('block', 'drop_debug')
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """写入有上限队列的日志处理器
+
+    队列满时：'block' 等待监听线程腾出空间（不丢日志）；
+    'drop_debug' 直接丢弃DEBUG及以下级别的记录并计数，INFO及以上仍然等待。
+    """
+
+    def __init__(self, log_queue: queue.Queue, overflow: str = 'drop_debug'):
+        super().__init__(log_queue)
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的日志队列溢出策略: {overflow}")
+        self.overflow = overflow
+        self.dropped = 0
+        self.blocked = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if self.overflow == 'drop_debug' and record.levelno <= logging.DEBUG:
+                self.dropped += 1
+                return
+            self.blocked += 1
+            self.queue.put(record)
+
+
+class LogListener(logging.handlers.QueueListener):
+    """在名为 LogListener 的后台线程中把队列里的记录交给控制台和文件处理器"""
+
+    def __init__(self, log_queue: queue.Queue, *handlers: logging.Handler):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._monitor, name="LogListener", daemon=True)
+        self._thread.start()
+
+    def enqueue_sentinel(self) -> None:
+        # 队列满时也要等到结束标记写入，保证之前的记录全部写出
+        self.queue.put(self._sentinel)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """等待队列中已有的记录全部写出（监听线程继续运行），超时返回False"""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        for handler in self.handlers:
+            handler.flush()
+        return True
 
 
 class LoggerConfig:
     """日志配置管理器"""
 
+    # 使用队列的日志记录器: 名称 -> (队列处理器, 监听器)
+    _queues: Dict[str, tuple] = {}
+
     @staticmethod
     def setup_logger(name: str = "D2PindleBot",
                     level: int = logging.INFO,
                     log_file: Optional[str] = None,
                     max_bytes: int = 10 * 1024 * 1024,  # 10MB
-                    backup_count: int = 5) -> logging.Logger:
+                    backup_count: int = 5,
+                    use_queue: bool = False,
+                    queue_size: int = 10000,
+                    overflow: str = 'drop_debug') -> logging.Logger:
         """设置日志记录器
 
         Args:
@@ -26,6 +92,9 @@ class LoggerConfig:
             log_file: 日志文件路径，None表示不写入文件
             max_bytes: 单个日志文件最大字节数
             backup_count: 保留的日志文件数量
+            use_queue: 是否经有上限的队列由后台线程写出（调用线程不等待控制台和文件写入、日志轮转）
+            queue_size: 队列容量
+            overflow: 队列满时的处理方式，见 BoundedQueueHandler
 
         Returns:
             配置好的日志记录器
@@ -72,26 +141,90 @@ class LoggerConfig:
                 # 如果文件处理器设置失败，只使用控制台输出
                 logger.error(f"设置日志文件处理器失败: {e}")
 
+        if use_queue:
+            LoggerConfig.attach_queue(logger, queue_size, overflow)
+
         return logger
 
     @staticmethod
-    def get_session_logger(log_dir: str = "logs") -> logging.Logger:
+    def attach_queue(logger: logging.Logger, queue_size: int, overflow: str) -> None:
+        """把已有的处理器移到监听线程，记录器只保留队列处理器"""
+        handlers = list(logger.handlers)
+        log_queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        queue_handler = BoundedQueueHandler(log_queue, overflow)
+        listener = LogListener(log_queue, *handlers)
+        for handler in handlers:
+            logger.removeHandler(handler)
+        logger.addHandler(queue_handler)
+        listener.start()
+        LoggerConfig._queues[logger.name] = (queue_handler, listener)
+
+    @staticmethod
+    def flush(timeout: float = 5.0) -> bool:
+        """等待所有日志队列写空（监听线程继续运行），全部写出返回True"""
+        flushed = True
+        for _, listener in list(LoggerConfig._queues.values()):
+            flushed = listener.flush(timeout) and flushed
+        return flushed
+
+    @staticmethod
+    def stop_queue_logging(name: Optional[str] = None) -> None:
+        """写出剩余记录并停止监听线程，记录器恢复为直接使用原来的处理器
+
+        Args:
+            name: 只停止该记录器的队列，None表示全部
+        """
+        for logger_name, (queue_handler, listener) in list(LoggerConfig._queues.items()):
+            if name is not None and logger_name != name:
+                continue
+            listener.stop()
+            logger = logging.getLogger(logger_name)
+            logger.removeHandler(queue_handler)
+            for handler in listener.handlers:
+                logger.addHandler(handler)
+            del LoggerConfig._queues[logger_name]
+            if queue_handler.dropped:
+                logger.warning(f"日志队列已满时丢弃了 {queue_handler.dropped} 条DEBUG记录")
+
+    @staticmethod
+    def get_queue_stats() -> Dict[str, Dict[str, Any]]:
+        """各日志队列的当前长度、容量、丢弃和等待次数"""
+        return {
+            name: {
+                'size': queue_handler.queue.qsize(),
+                'capacity': queue_handler.queue.maxsize,
+                'dropped': queue_handler.dropped,
+                'blocked': queue_handler.blocked,
+            }
+            for name, (queue_handler, _) in LoggerConfig._queues.items()
+        }
+
+    @staticmethod
+    def get_session_logger(log_dir: str = "logs", session_name: Optional[str] = None,
+                           logging_config: Optional[Dict[str, Any]] = None) -> logging.Logger:
         """获取会话日志记录器
 
         Args:
             log_dir: 日志目录
+            session_name: 会话名称（多实例运行时区分日志文件）
+            logging_config: 配置文件中的 logging 部分（队列写出等）
 
         Returns:
             会话日志记录器
         """
+        logging_config = logging_config or {}
         # 创建会话特定的日志文件名
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        log_file = os.path.join(log_dir, f"bot_session_{timestamp}.log")
+        prefix = f"bot_session_{session_name}_" if session_name else "bot_session_"
+        log_file = os.path.join(log_dir, f"{prefix}{timestamp}.log")
 
         return LoggerConfig.setup_logger(
             name="D2PindleBot",
             level=logging.INFO,
-            log_file=log_file
+            log_file=log_file,
+            use_queue=logging_config.get('queue', True),
+            queue_size=logging_config.get('queue_size', 10000),
+            overflow=logging_config.get('overflow', 'drop_debug')
         )
 
     @staticmethod
@@ -155,6 +288,10 @@ class LoggerConfig:
             print(f"清理日志文件失败: {e}")
 
 
+# 退出时写出队列中剩余的日志
+atexit.register(LoggerConfig.stop_queue_logging)
+
+
 # 预定义的日志配置
 LOGGING_CONFIG = {
     'version': 1,
@@ -0,0 +1,256 @@
+"""
+指标接口
+在本机HTTP端口上以Prometheus文本格式输出运行统计、阶段耗时直方图、检测耗时和进程CPU/内存，
+便于用Prometheus等工具统一监控多台机器
+
+    curl http://127.0.0.1:9464/metrics
+"""
+import bisect
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import psutil
+
+from clock import get_clock
+from statistics import Statistics
+
+
+# 阶段/单局耗时的直方图分桶（秒）
+PHASE_BUCKETS = (0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 20.0, 30.0, 60.0)
+RUN_BUCKETS = (5.0, 10.0, 15.0, 20.0, 25.0, 30.0, 40.0, 60.0, 120.0)
+# 检测等操作耗时的分桶（秒）
+OPERATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """累计分桶直方图（Prometheus histogram 语义）"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个为 +Inf
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def snapshot(self) -> Tuple[Tuple[float, ...], Tuple[int, ...], int, float]:
+        """(分桶上界, 累计计数, 总数, 总和)"""
+        cumulative = []
+        running = 0
+        for count in self.counts:
+            running += count
+            cumulative.append(running)
+        return self.buckets, tuple(cumulative), self.count, self.total
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsCollector:
+    """收集指标并维护只读快照
+
+    统计监听器和性能监控监听器在机器人线程中更新直方图，并在每局结束时发布一份新的快照字典
+    （整体替换引用）；HTTP线程只读取快照，不与机器人线程竞争锁。
+    """
+
+    def __init__(self, statistics: Statistics, monitor=None, namespace: str = 'd2bot'):
+        self.statistics = statistics
+        self.monitor = monitor
+        self.namespace = namespace
+        self.process = psutil.Process(os.getpid())
+
+        self._phase_histograms: Dict[str, Histogram] = {}
+        self._run_histogram = Histogram(RUN_BUCKETS)
+        self._operation_histograms: Dict[str, Histogram] = {}
+        self._operation_lock = threading.Lock()
+        self._snapshot: Dict[str, Any] = {}
+
+        statistics.add_listener(self._on_run)
+        if monitor is not None:
+            monitor.add_listener(self._on_operation)
+        self._publish()
+
+    def _on_run(self, record: Dict[str, Any]) -> None:
+        self._run_histogram.observe(record['duration'])
+        for phase, duration in record.get('phases', {}).items():
+            histogram = self._phase_histograms.get(phase)
+            if histogram is None:
+                histogram = self._phase_histograms[phase] = Histogram(PHASE_BUCKETS)
+            histogram.observe(duration)
+        self._publish()
+
+    def _on_operation(self, operation: str, duration: float) -> None:
+        # 性能监控的计时可能来自其他线程
+        with self._operation_lock:
+            histogram = self._operation_histograms.get(operation)
+            if histogram is None:
+                histogram = self._operation_histograms[operation] = Histogram(OPERATION_BUCKETS)
+            histogram.observe(duration)
+
+    def _publish(self) -> None:
+        stats = self.statistics
+        self._snapshot = {
+            'runs': stats.total_runs,
+            'successful': stats.successful_runs,
+            'failed': stats.failed_runs,
+            'runs_per_hour': stats.get_runs_per_hour(),
+            'window_runs_per_hour': {
+                str(int(window.seconds)): window.summary(get_clock().time(), stats.start_time)['runs_per_hour']
+                for window in stats.rolling.windows.values()
+            },
+            'ewma_runs_per_hour': stats.rolling.get_ewma()['runs_per_hour'],
+            'average_run_time': stats.get_average_run_time(),
+            'items': dict(stats.items_picked),
+            'timeouts': dict(stats.timeouts),
+            'run_histogram': self._run_histogram.snapshot(),
+            'phase_histograms': {name: h.snapshot() for name, h in self._phase_histograms.items()},
+        }
+
+    def render(self) -> str:
+        """生成Prometheus文本格式（在HTTP线程中调用）"""
+        snapshot = self._snapshot
+        ns = self.namespace
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, help_text: str, samples: List[Tuple[Dict[str, str], float]]) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels)} {_format_value(value)}")
+
+        def histogram(name: str, help_text: str, series: Dict[str, Any], label: Optional[str]) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, (buckets, cumulative, count, total) in series.items():
+                base = {label: key} if label else {}
+                for bound, value in zip(buckets + (float('inf'),), cumulative):
+                    lines.append(f"{name}_bucket{_labels(dict(base, le=_format_value(float(bound))))} {value}")
+                lines.append(f"{name}_sum{_labels(base)} {_format_value(float(total))}")
+                lines.append(f"{name}_count{_labels(base)} {count}")
+
+        metric(f"{ns}_runs_total", 'counter', '已完成的局数', [({}, snapshot['runs'])])
+        metric(f"{ns}_runs_successful_total", 'counter', '成功的局数', [({}, snapshot['successful'])])
+        metric(f"{ns}_runs_failed_total", 'counter', '失败的局数', [({}, snapshot['failed'])])
+        metric(f"{ns}_runs_per_hour", 'gauge', '每小时局数（整个会话）', [({}, snapshot['runs_per_hour'])])
+        metric(f"{ns}_runs_per_hour_window", 'gauge', '最近窗口内的每小时局数',
+               [({'window_seconds': window}, value) for window, value in snapshot['window_runs_per_hour'].items()])
+        metric(f"{ns}_runs_per_hour_ewma", 'gauge', '每小时局数的EWMA估计', [({}, snapshot['ewma_runs_per_hour'])])
+        metric(f"{ns}_drops_total", 'counter', '按类型统计的拾取物品数',
+               [({'type': item_type}, count) for item_type, count in snapshot['items'].items()])
+        if snapshot['timeouts']:
+            metric(f"{ns}_phase_timeouts_total", 'counter', '看门狗中止的阶段次数',
+                   [({'phase': phase}, count) for phase, count in snapshot['timeouts'].items()])
+
+        histogram(f"{ns}_run_duration_seconds", '单局耗时', {'': snapshot['run_histogram']}, None)
+        if snapshot['phase_histograms']:
+            histogram(f"{ns}_phase_duration_seconds", '各阶段耗时', snapshot['phase_histograms'], 'phase')
+
+        with self._operation_lock:
+            operations = {name: h.snapshot() for name, h in self._operation_histograms.items()}
+        if operations:
+            histogram(f"{ns}_operation_duration_seconds", '检测等操作耗时', operations, 'operation')
+
+        try:
+            cpu = self.process.cpu_times()
+            memory = self.process.memory_info()
+            metric('process_cpu_seconds_total', 'counter', '进程CPU时间（用户+系统）',
+                   [({}, cpu.user + cpu.system)])
+            metric('process_resident_memory_bytes', 'gauge', '进程常驻内存', [({}, memory.rss)])
+            metric('process_num_threads', 'gauge', '进程线程数', [({}, self.process.num_threads())])
+        except psutil.Error:
+            pass
+
+        if self.monitor is not None:
+            thread_usage = self.monitor.get_thread_usage()
+            if thread_usage:
+                metric(f"{ns}_thread_cpu_seconds_total", 'counter', '按线程名称累计的CPU时间',
+                       [({'thread': name}, usage['cpu_seconds']) for name, usage in thread_usage.items()])
+            operation_cpu = self.monitor.get_operation_cpu()
+            if operation_cpu:
+                metric(f"{ns}_operation_cpu_seconds_total", 'counter', '各操作消耗的CPU时间',
+                       [({'operation': name}, seconds) for name, seconds in operation_cpu.items()])
+            current = self.monitor.get_current_metrics()
+            if current is not None and current.game_rss_mb is not None:
+                metric(f"{ns}_game_cpu_percent", 'gauge', '游戏进程CPU使用率', [({}, current.game_cpu_percent)])
+                metric(f"{ns}_game_resident_memory_bytes", 'gauge', '游戏进程常驻内存',
+                       [({}, current.game_rss_mb * 1024 * 1024)])
+
+        return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    collector: MetricsCollector = None
+
+    def do_GET(self) -> None:
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        try:
+            body = self.collector.render().encode('utf-8')
+        except Exception as e:
+            logging.getLogger(__name__).error(f"生成指标失败: {e}")
+            self.send_error(500)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        # 不把每次抓取写入日志
+        pass
+
+
+class MetricsServer:
+    """后台线程中的指标HTTP服务（默认只监听本机）"""
+
+    def __init__(self, collector: MetricsCollector, host: str = '127.0.0.1', port: int = 9464):
+        self.collector = collector
+        self.host = host
+        self.port = port
+        self.logger = logging.getLogger(__name__)
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> bool:
+        """启动服务，端口被占用等情况下返回False（不影响机器人运行）"""
+        handler = type('MetricsHandler', (_MetricsHandler,), {'collector': self.collector})
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        except OSError as e:
+            self.logger.warning(f"指标服务启动失败 ({self.host}:{self.port}): {e}")
+            return False
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True)
+        self._thread.start()
+        self.logger.info(f"指标服务已启动: http://{self.host}:{self.port}/metrics")
+        return True
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
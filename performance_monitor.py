@@ -2,40 +2,382 @@
 性能监控模块
 提供性能指标收集和分析功能
 """
+import argparse
+import functools
+import json
+import linecache
+import math
+import os
+import sys
 import time
 import psutil
 import threading
+import tracemalloc
+from collections import Counter
 from typing import Dict, List, Optional, Callable
 from dataclasses import dataclass
 from datetime import datetime
 import logging
 
+import numpy as np
+
+from stream_stats import LatencyHistogram, RingBuffer
+from clock import get_clock
+from tracing import span
+
 
 @dataclass
 class PerformanceMetrics:
-    """性能指标数据类"""
+    """性能指标数据类
+
+    cpu_percent/memory_* 为整个系统，process_* 为机器人进程本身，game_* 为游戏进程（未采样时为None）
+    """
     timestamp: float
     cpu_percent: float
     memory_percent: float
     memory_mb: float
     execution_time: Optional[float] = None
     operation_name: Optional[str] = None
+    process_cpu_percent: Optional[float] = None
+    rss_mb: Optional[float] = None
+    uss_mb: Optional[float] = None
+    num_threads: Optional[int] = None
+    num_handles: Optional[int] = None
+    game_cpu_percent: Optional[float] = None
+    game_rss_mb: Optional[float] = None
+
+
+# 环形缓冲区中的记录格式（无法获取的值为NaN）
+SAMPLE_DTYPE = np.dtype([('timestamp', 'f8'), ('cpu_percent', 'f8'),
+                         ('memory_percent', 'f8'), ('memory_mb', 'f8'),
+                         ('process_cpu_percent', 'f8'), ('rss_mb', 'f8'), ('uss_mb', 'f8'),
+                         ('num_threads', 'f8'), ('num_handles', 'f8'),
+                         ('game_cpu_percent', 'f8'), ('game_rss_mb', 'f8')])
+OPERATION_DTYPE = np.dtype([('operation', 'i4'), ('duration', 'f8'), ('timestamp', 'f8')])
+
+# 帧处理链路的各段：截图耗时（只含送入物品检测的截图）、检测耗时、检测完成到动作的排队时间、截图完成到动作的总延迟
+FRAME_PIPELINE = (
+    ('frame_capture', '截图'),
+    ('detect_items_by_color', '检测'),
+    ('frame_queue', '排队'),
+    ('capture_to_click', '截图→点击'),
+)
+
+
+class SamplingProfiler:
+    """采样分析器
+
+    后台线程按固定间隔读取所有线程的调用栈（sys._current_frames），合并相同的栈并计数，
+    输出 collapsed 格式（每行 "线程;函数;函数... 次数"），可用 flamegraph.pl 或 speedscope 生成火焰图。
+    不修改被分析的代码，日志格式化、图像转换等未手动计时的开销也能看到；
+    采样线程自身的CPU时间会被统计，便于判断能否长期开启。
+    """
+
+    def __init__(self, interval: float = 0.01, max_depth: int = 64,
+                 threads: Optional[List[str]] = None):
+        """
+        Args:
+            interval: 采样间隔（秒）
+            max_depth: 每个栈最多保留的层数（从最内层算起）
+            threads: 只采样这些名称的线程，None表示除采样线程外的所有线程
+        """
+        self.interval = interval
+        self.max_depth = max_depth
+        self.threads = set(threads) if threads else None
+        self.logger = logging.getLogger("Performance")
+
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.cpu_time = 0.0
+        self.wall_time = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._frame_labels: Dict[object, str] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._sample_loop, name="SamplingProfiler", daemon=True)
+        self._thread.start()
+        self.logger.info(f"采样分析已启动 (间隔 {self.interval * 1000:.0f}ms)")
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout=2.0)
+        self._thread = None
+        self.logger.info("采样分析已停止")
+
+    def _label(self, code) -> str:
+        label = self._frame_labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._frame_labels[code] = label
+        return label
+
+    def _sample_loop(self) -> None:
+        own_ident = threading.get_ident()
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        while not self._stop_event.wait(self.interval):
+            try:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                frames = sys._current_frames()
+                folded = []
+                for ident, frame in frames.items():
+                    if ident == own_ident:
+                        continue
+                    name = names.get(ident, str(ident))
+                    if self.threads is not None and name not in self.threads:
+                        continue
+                    labels = []
+                    while frame is not None and len(labels) < self.max_depth:
+                        labels.append(self._label(frame.f_code))
+                        frame = frame.f_back
+                    labels.append(name)
+                    labels.reverse()
+                    folded.append(";".join(labels))
+                del frames
+                with self._lock:
+                    self.stacks.update(folded)
+                    self.samples += 1
+            except Exception as e:
+                self.logger.error(f"采样失败: {e}")
+            # 每次采样后累计，运行中也能读取当前开销
+            self.cpu_time = time.thread_time() - cpu_start
+            self.wall_time = time.perf_counter() - wall_start
+
+    @property
+    def overhead(self) -> float:
+        """采样线程CPU时间占运行时长的比例"""
+        return self.cpu_time / self.wall_time if self.wall_time > 0 else 0.0
+
+    def get_collapsed(self) -> List[str]:
+        """collapsed 格式的各行（按次数降序）"""
+        with self._lock:
+            stacks = self.stacks.most_common()
+        return [f"{stack} {count}" for stack, count in stacks]
+
+    def save_collapsed(self, path: str) -> None:
+        """写出 collapsed 文件（运行中也可随时调用）"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        lines = self.get_collapsed()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + ("\n" if lines else ""))
+        self.logger.info(f"采样结果已保存到: {path} ({self.samples} 次采样)")
+
+    def get_top_functions(self, count: int = 10) -> List[tuple]:
+        """按自身时间（位于栈顶的采样数）排序的函数 [(函数, 采样数, 占比)]"""
+        with self._lock:
+            stacks = list(self.stacks.items())
+        leaves: Counter = Counter()
+        for stack, samples in stacks:
+            leaves[stack.rsplit(";", 1)[-1]] += samples
+        total = sum(leaves.values())
+        return [(name, samples, samples / total) for name, samples in leaves.most_common(count)] if total else []
+
+    def get_summary(self) -> str:
+        lines = [f"采样分析: {self.samples} 次采样 / {self.wall_time:.1f}秒 | "
+                 f"采样线程CPU {self.cpu_time:.2f}秒 ({self.overhead * 100:.2f}%)"]
+        for name, samples, share in self.get_top_functions():
+            lines.append(f"  {share * 100:5.1f}%  {samples:6d}  {name}")
+        return "\n".join(lines)
+
+
+class MemoryDiagnostics:
+    """内存诊断
+
+    用 tracemalloc 跟踪Python对象的分配位置，每隔若干局拍一次快照，与上一次快照比较，
+    按分配位置列出增长最多的条目，写入日志和差异报告，用于排查长时间运行时的内存缓慢上涨。
+    跟踪期间每次分配都有额外开销，保留的栈层数（frames）越多开销和占用越大，
+    拍快照本身的耗时和 tracemalloc 自身占用的内存都会被统计。
+    """
+
+    # 诊断自身（含报告读取源码行用的 linecache）和导入机制的分配不计入
+    _IGNORED = ('<frozen importlib._bootstrap>', '<frozen importlib._bootstrap_external>',
+                '<unknown>', tracemalloc.__file__, linecache.__file__)
+
+    def __init__(self, every_runs: int = 50, frames: int = 1, top: int = 15,
+                 output_dir: Optional[str] = 'memory', prefix: str = 'memory'):
+        """
+        Args:
+            every_runs: 每隔多少局拍一次快照
+            frames: 每次分配保留的栈层数（1表示只记录分配所在的行）
+            top: 日志和报告中列出的条目数
+            output_dir: 差异报告目录，None表示只写日志
+            prefix: 报告文件名前缀
+        """
+        self.every_runs = max(1, every_runs)
+        self.frames = max(1, frames)
+        self.top = top
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.logger = logging.getLogger("Performance")
+
+        self.snapshots = 0
+        self.snapshot_time = 0.0
+        self.traced_memory = (0, 0)    # 最近一次快照时跟踪到的 (当前, 峰值) 字节数
+        self.tracing_overhead = 0      # tracemalloc 自身占用的字节数
+        self._active = False
+        self._started_tracing = False
+        self._first: Optional[tracemalloc.Snapshot] = None
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._previous_label = ''
+        self._last_growth: List[tracemalloc.StatisticDiff] = []
+
+    @property
+    def running(self) -> bool:
+        return self._active and tracemalloc.is_tracing()
+
+    def start(self) -> None:
+        """开始跟踪并拍下基准快照"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracing = True
+        self._active = True
+        self._first = self._previous = self._take()
+        self._previous_label = '开始'
+        self.logger.info(f"内存诊断已启动 (每 {self.every_runs} 局快照, {self.frames} 层栈)")
+
+    def stop(self) -> None:
+        """停止跟踪（只停止由自己启动的跟踪）"""
+        self._active = False
+        if self._started_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+            self.logger.info("内存诊断已停止")
+        self._started_tracing = False
+
+    def _take(self) -> tracemalloc.Snapshot:
+        start = time.perf_counter()
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, pattern) for pattern in self._IGNORED])
+        self.snapshot_time += time.perf_counter() - start
+        self.traced_memory = tracemalloc.get_traced_memory()
+        self.tracing_overhead = tracemalloc.get_tracemalloc_memory()
+        return snapshot
+
+    def on_run(self, run_number: int) -> Optional[List[tracemalloc.StatisticDiff]]:
+        """每局结束时调用，到达间隔时拍快照并返回增长最多的条目"""
+        if not self.running or run_number % self.every_runs != 0:
+            return None
+        return self.check(f"第{run_number}局")
+
+    def check(self, label: str) -> List[tracemalloc.StatisticDiff]:
+        """立即拍快照并与上一次比较"""
+        if not self.running:
+            return []
+        key_type = 'traceback' if self.frames > 1 else 'lineno'
+        snapshot = self._take()
+        self.snapshots += 1
+        diff = [stat for stat in snapshot.compare_to(self._previous, key_type) if stat.size_diff > 0]
+        diff.sort(key=lambda stat: stat.size_diff, reverse=True)
+        total = sum(stat.size for stat in snapshot.statistics('filename'))
+        total_diff = total - sum(stat.size for stat in self._previous.statistics('filename'))
+
+        lines = [f"内存快照 {label} (对比 {self._previous_label}): 已跟踪 {total / 1024 / 1024:.2f} MB, "
+                 f"变化 {total_diff / 1024:+.1f} KB"]
+        for stat in diff[:self.top]:
+            lines.append(f"  {stat.size_diff / 1024:+9.1f} KB  {stat.count_diff:+7d} 个  {self._location(stat)}")
+        self.logger.info("\n".join(lines))
+
+        if self.output_dir:
+            self._write_report(label, snapshot, diff, lines)
+        self._previous = snapshot
+        self._previous_label = label
+        self._last_growth = diff[:self.top]
+        return self._last_growth
+
+    @staticmethod
+    def _location(stat: tracemalloc.StatisticDiff) -> str:
+        frame = stat.traceback[0]
+        return f"{os.path.basename(frame.filename)}:{frame.lineno}"
+
+    def _write_report(self, label: str, snapshot: tracemalloc.Snapshot,
+                      diff: List[tracemalloc.StatisticDiff], header: List[str]) -> None:
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, f"{self.prefix}_{self.snapshots:04d}.txt")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(f"时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+                f.write(header[0] + "\n\n")
+                f.write("与上一次快照相比增长最多的分配位置:\n")
+                for stat in diff[:self.top]:
+                    f.write(f"{stat.size_diff / 1024:+.1f} KB ({stat.count_diff:+d} 个, 当前 {stat.size / 1024:.1f} KB)\n")
+                    for line in stat.traceback.format():
+                        f.write(f"    {line}\n")
+                if self._first is not None and self._first is not self._previous:
+                    f.write("\n与开始时相比增长最多的分配位置:\n")
+                    cumulative = snapshot.compare_to(self._first, 'lineno')
+                    cumulative.sort(key=lambda stat: stat.size_diff, reverse=True)
+                    for stat in cumulative[:self.top]:
+                        if stat.size_diff <= 0:
+                            break
+                        f.write(f"{stat.size_diff / 1024:+.1f} KB ({stat.count_diff:+d} 个)  {self._location(stat)}\n")
+            self.logger.info(f"内存差异报告已保存到: {path}")
+        except Exception as e:
+            self.logger.error(f"保存内存差异报告失败: {e}")
+
+    def get_summary(self) -> str:
+        current, peak = self.traced_memory
+        overhead = self.tracing_overhead
+        lines = [f"内存诊断: {self.snapshots} 次快照 (耗时 {self.snapshot_time:.2f}秒) | "
+                 f"已跟踪 {current / 1024 / 1024:.1f} MB, 峰值 {peak / 1024 / 1024:.1f} MB | "
+                 f"tracemalloc 自身占用 {overhead / 1024 / 1024:.1f} MB"]
+        if self._last_growth:
+            lines.append(f"  最近一次增长最多 ({self._previous_label}):")
+            for stat in self._last_growth[:5]:
+                lines.append(f"    {stat.size_diff / 1024:+.1f} KB  {self._location(stat)}")
+        return "\n".join(lines)
 
 
 class PerformanceMonitor:
-    """性能监控器"""
+    """性能监控器
+
+    系统采样和操作耗时保存在预分配的numpy环形缓冲区中（内存固定），写入和读取快照都持有锁，
+    监控线程、机器人线程和指标接口线程可以同时使用；统计按操作编号向量化计算。
+    每个操作另有覆盖整个会话的对数分桶延迟直方图，用于查询 p50/p90/p99/p99.9 和跨会话比较。
+    监控线程除系统整体占用外，还采样机器人进程本身（CPU、RSS/USS、线程数、句柄数）、
+    按线程名称累计的CPU时间，以及可选的游戏进程。
+    """
 
     def __init__(self, max_samples: int = 1000):
         self.max_samples = max_samples
-        self.metrics: List[PerformanceMetrics] = []
+        self.metrics = RingBuffer(max_samples, dtype=SAMPLE_DTYPE)
         self.logger = logging.getLogger("Performance")
         self._monitoring = False
         self._monitor_thread: Optional[threading.Thread] = None
         self._stop_event = threading.Event()
 
         # 定时器相关
-        self._timers: Dict[str, float] = {}
-        self._operation_times: List[tuple] = []  # (operation, duration, timestamp)
+        self._timers: Dict[str, tuple] = {}  # 操作名称 -> (开始时间, 开始时的线程CPU时间)
+        self._operation_times = RingBuffer(max_samples, dtype=OPERATION_DTYPE)
+        self._operation_ids: Dict[str, int] = {}
+        self._operation_names: List[str] = []
+        self._latency: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[str, float], None]] = []
+
+        # 采样分析和内存诊断（可选）
+        self.profiler: Optional[SamplingProfiler] = None
+        self.memory: Optional[MemoryDiagnostics] = None
+
+        # 本进程、各线程和游戏进程的资源占用
+        self.process = psutil.Process(os.getpid())
+        self._thread_cpu: Dict[int, tuple] = {}        # 系统线程ID -> (线程名, 上次CPU秒数)
+        self._thread_usage: Dict[str, Dict[str, float]] = {}
+        self._operation_cpu: Dict[str, float] = {}
+        self.game_process_name: Optional[str] = None
+        self._game_process: Optional[psutil.Process] = None
+        self._game_search_at = 0.0
 
     def start_monitoring(self, interval: float = 1.0) -> None:
         """开始性能监控
@@ -51,6 +393,7 @@ class PerformanceMonitor:
         self._monitor_thread = threading.Thread(
             target=self._monitor_loop,
             args=(interval,),
+            name="PerformanceMonitor",
             daemon=True
         )
         self._monitor_thread.start()
@@ -69,8 +412,15 @@ class PerformanceMonitor:
 
         self.logger.info("性能监控已停止")
 
+    def set_game_process(self, process_name: Optional[str]) -> None:
+        """同时采样游戏进程（按进程名查找，游戏重启后自动重新查找），None表示不采样"""
+        self.game_process_name = process_name
+        self._game_process = None
+        self._game_search_at = 0.0
+
     def _monitor_loop(self, interval: float) -> None:
         """监控循环"""
+        last_sample = time.perf_counter()
         while self._monitoring and not self._stop_event.is_set():
             try:
                 # 收集系统性能指标
@@ -78,17 +428,15 @@ class PerformanceMonitor:
                 memory_info = psutil.virtual_memory()
                 memory_mb = memory_info.used / 1024 / 1024
 
-                metrics = PerformanceMetrics(
-                    timestamp=time.time(),
-                    cpu_percent=cpu_percent,
-                    memory_percent=memory_info.percent,
-                    memory_mb=memory_mb
-                )
+                now = time.perf_counter()
+                process_sample = self._sample_process()
+                self._sample_threads(now - last_sample)
+                game_sample = self._sample_game_process()
+                last_sample = now
 
-                # 添加到指标列表（限制大小）
-                if len(self.metrics) >= self.max_samples:
-                    self.metrics.pop(0)
-                self.metrics.append(metrics)
+                with self._lock:
+                    self.metrics.append((time.time(), cpu_percent, memory_info.percent, memory_mb)
+                                        + process_sample + game_sample)
 
             except Exception as e:
                 self.logger.error(f"收集性能指标失败: {e}")
@@ -96,13 +444,130 @@ class PerformanceMonitor:
             # 等待下一次监控
             self._stop_event.wait(interval)
 
+    def _sample_process(self) -> tuple:
+        """本进程 (CPU%, RSS MB, USS MB, 线程数, 句柄数)"""
+        process = self.process
+        cpu_percent = process.cpu_percent()
+        try:
+            # USS（进程独占内存）需要遍历内存映射，权限不足时退回RSS
+            memory = process.memory_full_info()
+            uss_mb = memory.uss / 1024 / 1024
+        except (psutil.AccessDenied, AttributeError):
+            memory = process.memory_info()
+            uss_mb = math.nan
+        if hasattr(process, 'num_handles'):
+            handles = process.num_handles()      # Windows
+        elif hasattr(process, 'num_fds'):
+            handles = process.num_fds()          # 其他系统为打开的文件描述符数
+        else:
+            handles = math.nan
+        return (cpu_percent, memory.rss / 1024 / 1024, uss_mb, process.num_threads(), handles)
+
+    def _sample_threads(self, elapsed: float) -> None:
+        """按线程名称累计CPU时间，并计算上个间隔内的CPU占用"""
+        names = {thread.native_id: thread.name for thread in threading.enumerate()}
+        seen = set()
+        interval_cpu: Dict[str, float] = {}
+        for thread in self.process.threads():
+            cpu = thread.user_time + thread.system_time
+            previous = self._thread_cpu.get(thread.id)
+            name = previous[0] if previous else names.get(thread.id, f"native-{thread.id}")
+            delta = cpu - previous[1] if previous else cpu
+            self._thread_cpu[thread.id] = (name, cpu)
+            seen.add(thread.id)
+            interval_cpu[name] = interval_cpu.get(name, 0.0) + max(delta, 0.0)
+
+        # 已结束的线程不再跟踪（累计值保留在 _thread_usage 中）
+        for thread_id in set(self._thread_cpu) - seen:
+            del self._thread_cpu[thread_id]
+
+        with self._lock:
+            for usage in self._thread_usage.values():
+                usage['cpu_percent'] = 0.0
+            for name, delta in interval_cpu.items():
+                usage = self._thread_usage.setdefault(name, {'cpu_seconds': 0.0, 'cpu_percent': 0.0})
+                usage['cpu_seconds'] += delta
+                usage['cpu_percent'] = delta / elapsed * 100 if elapsed > 0 else 0.0
+
+    def _sample_game_process(self) -> tuple:
+        """游戏进程 (CPU%, RSS MB)，未设置或未找到时为NaN"""
+        if not self.game_process_name:
+            return (math.nan, math.nan)
+        if self._game_process is None or not self._game_process.is_running():
+            self._game_process = None
+            if time.monotonic() < self._game_search_at:
+                return (math.nan, math.nan)
+            # 遍历进程列表开销较大，找不到时每30秒重试一次
+            self._game_search_at = time.monotonic() + 30.0
+            target = self.game_process_name.lower()
+            for process in psutil.process_iter(['name']):
+                if (process.info.get('name') or '').lower() == target:
+                    self._game_process = process
+                    process.cpu_percent()  # 第一次调用只建立基准
+                    self.logger.info(f"已找到游戏进程: {self.game_process_name} (PID {process.pid})")
+                    break
+            else:
+                return (math.nan, math.nan)
+        try:
+            return (self._game_process.cpu_percent(), self._game_process.memory_info().rss / 1024 / 1024)
+        except psutil.Error:
+            self._game_process = None
+            return (math.nan, math.nan)
+
+    def get_thread_usage(self) -> Dict[str, Dict[str, float]]:
+        """各线程（按名称）的累计CPU秒数和最近一个间隔的CPU占用"""
+        with self._lock:
+            return {name: dict(usage) for name, usage in self._thread_usage.items()}
+
+    def get_operation_cpu(self) -> Dict[str, float]:
+        """各操作累计的CPU时间（秒），同一线程中的截图和检测等可以分开统计"""
+        with self._lock:
+            return dict(self._operation_cpu)
+
+    def start_profiling(self, interval: float = 0.01, max_depth: int = 64,
+                        threads: Optional[List[str]] = None) -> SamplingProfiler:
+        """开始采样分析，已在运行时返回现有的分析器"""
+        if self.profiler is None or not self.profiler.running:
+            self.profiler = SamplingProfiler(interval, max_depth, threads)
+            self.profiler.start()
+        return self.profiler
+
+    def stop_profiling(self) -> None:
+        """停止采样分析（结果保留，可继续保存）"""
+        if self.profiler is not None:
+            self.profiler.stop()
+
+    def save_profile(self, filename: str) -> bool:
+        """保存采样分析的 collapsed 结果"""
+        if self.profiler is None:
+            return False
+        try:
+            self.profiler.save_collapsed(filename)
+            return True
+        except Exception as e:
+            self.logger.error(f"保存采样结果失败: {e}")
+            return False
+
+    def start_memory_diagnostics(self, every_runs: int = 50, frames: int = 1, top: int = 15,
+                                 output_dir: Optional[str] = 'memory', prefix: str = 'memory') -> MemoryDiagnostics:
+        """开始内存诊断，已在运行时返回现有的诊断器"""
+        if self.memory is None or not self.memory.running:
+            self.memory = MemoryDiagnostics(every_runs, frames, top, output_dir, prefix)
+            self.memory.start()
+        return self.memory
+
+    def stop_memory_diagnostics(self) -> None:
+        """停止内存诊断（汇总保留）"""
+        if self.memory is not None:
+            self.memory.stop()
+
     def start_timer(self, operation_name: str) -> None:
         """开始计时
 
         Args:
             operation_name: 操作名称
         """
-        self._timers[operation_name] = time.time()
+        self._timers[operation_name] = (time.perf_counter(), time.thread_time())
 
     def end_timer(self, operation_name: str) -> float:
         """结束计时
@@ -117,23 +582,67 @@ class PerformanceMonitor:
             self.logger.warning(f"未找到计时器: {operation_name}")
             return 0.0
 
-        start_time = self._timers.pop(operation_name)
-        duration = time.time() - start_time
+        start_time, cpu_start = self._timers.pop(operation_name)
+        duration = time.perf_counter() - start_time
+        self.record_operation(operation_name, duration, time.thread_time() - cpu_start)
+        return duration
 
-        # 记录操作时间
-        self._operation_times.append((operation_name, duration, time.time()))
+    def record_operation(self, operation_name: str, duration: float, cpu_time: Optional[float] = None) -> None:
+        """记录一次已完成操作的耗时（秒）并通知监听器
 
-        # 限制历史记录大小
-        if len(self._operation_times) > self.max_samples:
-            self._operation_times.pop(0)
+        Args:
+            operation_name: 操作名称
+            duration: 耗时（秒）
+            cpu_time: 操作所在线程消耗的CPU时间（秒），可选
+        """
+        with self._lock:
+            if cpu_time is not None:
+                self._operation_cpu[operation_name] = self._operation_cpu.get(operation_name, 0.0) + cpu_time
+            operation_id = self._operation_ids.get(operation_name)
+            if operation_id is None:
+                operation_id = self._operation_ids[operation_name] = len(self._operation_names)
+                self._operation_names.append(operation_name)
+                self._latency[operation_name] = LatencyHistogram()
+            self._operation_times.append((operation_id, duration, time.time()))
+            self._latency[operation_name].record(duration)
+
+        for listener in self._listeners:
+            try:
+                listener(operation_name, duration)
+            except Exception as e:
+                self.logger.error(f"性能监听器出错: {e}")
 
-        return duration
+    def add_listener(self, callback: Callable[[str, float], None]) -> None:
+        """注册操作计时结束时的回调，参数为 (操作名称, 耗时秒数)"""
+        self._listeners.append(callback)
 
     def get_current_metrics(self) -> Optional[PerformanceMetrics]:
         """获取当前性能指标"""
-        if not self.metrics:
+        with self._lock:
+            last = self.metrics.last(1)
+        if not len(last):
             return None
-        return self.metrics[-1]
+        row = last[0]
+
+        def optional(field: str) -> Optional[float]:
+            value = float(row[field])
+            return None if math.isnan(value) else value
+
+        num_threads = optional('num_threads')
+        num_handles = optional('num_handles')
+        return PerformanceMetrics(
+            timestamp=float(row['timestamp']),
+            cpu_percent=float(row['cpu_percent']),
+            memory_percent=float(row['memory_percent']),
+            memory_mb=float(row['memory_mb']),
+            process_cpu_percent=optional('process_cpu_percent'),
+            rss_mb=optional('rss_mb'),
+            uss_mb=optional('uss_mb'),
+            num_threads=int(num_threads) if num_threads is not None else None,
+            num_handles=int(num_handles) if num_handles is not None else None,
+            game_cpu_percent=optional('game_cpu_percent'),
+            game_rss_mb=optional('game_rss_mb')
+        )
 
     def get_average_metrics(self, sample_count: int = 10) -> Optional[Dict[str, float]]:
         """获取平均性能指标
@@ -144,22 +653,59 @@ class PerformanceMonitor:
         Returns:
             平均性能指标
         """
-        if not self.metrics:
-            return None
-
-        recent_metrics = self.metrics[-sample_count:]
-        if not recent_metrics:
+        with self._lock:
+            recent_metrics = self.metrics.last(sample_count)
+        if not len(recent_metrics):
             return None
 
-        avg_cpu = sum(m.cpu_percent for m in recent_metrics) / len(recent_metrics)
-        avg_memory = sum(m.memory_percent for m in recent_metrics) / len(recent_metrics)
-        avg_memory_mb = sum(m.memory_mb for m in recent_metrics) / len(recent_metrics)
-
-        return {
-            'cpu_percent': avg_cpu,
-            'memory_percent': avg_memory,
-            'memory_mb': avg_memory_mb
+        result = {
+            'cpu_percent': float(recent_metrics['cpu_percent'].mean()),
+            'memory_percent': float(recent_metrics['memory_percent'].mean()),
+            'memory_mb': float(recent_metrics['memory_mb'].mean())
         }
+        for field in ('process_cpu_percent', 'rss_mb', 'uss_mb', 'game_cpu_percent', 'game_rss_mb'):
+            values = recent_metrics[field]
+            values = values[~np.isnan(values)]
+            if len(values):
+                result[field] = float(values.mean())
+        return result
+
+    def _operation_snapshot(self):
+        """一致的操作耗时快照 (记录数组, 操作名称列表)"""
+        with self._lock:
+            return self._operation_times.to_array(), list(self._operation_names)
+
+    def get_all_operation_stats(self) -> Dict[str, Dict[str, float]]:
+        """所有操作的统计信息（一次遍历，按操作编号分组）"""
+        records, names = self._operation_snapshot()
+        if not len(records):
+            return {}
+
+        ids = records['operation']
+        durations = records['duration']
+        size = len(names)
+        counts = np.bincount(ids, minlength=size)
+        totals = np.bincount(ids, weights=durations, minlength=size)
+        mins = np.full(size, np.inf)
+        maxs = np.full(size, -np.inf)
+        np.minimum.at(mins, ids, durations)
+        np.maximum.at(maxs, ids, durations)
+
+        latency = self.get_latency_histograms()
+        result = {}
+        for operation_id in np.flatnonzero(counts):
+            count = int(counts[operation_id])
+            name = names[operation_id]
+            result[name] = {
+                'count': count,
+                'total_time': float(totals[operation_id]),
+                'avg_time': float(totals[operation_id]) / count,
+                'min_time': float(mins[operation_id]),
+                'max_time': float(maxs[operation_id])
+            }
+            if name in latency:
+                result[name].update(latency[name].percentiles())
+        return result
 
     def get_operation_stats(self, operation_name: str) -> Optional[Dict[str, float]]:
         """获取操作统计信息
@@ -170,21 +716,92 @@ class PerformanceMonitor:
         Returns:
             操作统计信息
         """
-        operation_times = [
-            duration for op, duration, _ in self._operation_times
-            if op == operation_name
-        ]
+        records, names = self._operation_snapshot()
+        if operation_name not in names:
+            return None
+        operation_times = records['duration'][records['operation'] == names.index(operation_name)]
 
-        if not operation_times:
+        if not len(operation_times):
             return None
 
-        return {
+        stats = {
             'count': len(operation_times),
-            'total_time': sum(operation_times),
-            'avg_time': sum(operation_times) / len(operation_times),
-            'min_time': min(operation_times),
-            'max_time': max(operation_times)
+            'total_time': float(operation_times.sum()),
+            'avg_time': float(operation_times.mean()),
+            'min_time': float(operation_times.min()),
+            'max_time': float(operation_times.max())
         }
+        histogram = self.get_latency_histogram(operation_name)
+        if histogram is not None:
+            stats.update(histogram.percentiles())
+        return stats
+
+    def record_frame_action(self, detections) -> None:
+        """在根据检测结果执行动作（点击）前调用，记录结果的排队时间和来源帧的年龄
+
+        Args:
+            detections: ItemDetector 返回的 DetectionList（没有来源帧信息时忽略）
+        """
+        frame = getattr(detections, 'frame', None)
+        if frame is None:
+            return
+        now = get_clock().monotonic()
+        if detections.detected_at is not None:
+            self.record_operation('frame_queue', max(now - detections.detected_at, 0.0))
+        self.record_operation('capture_to_click', max(now - frame.captured_at, 0.0))
+
+    def get_frame_pipeline_report(self) -> List[str]:
+        """帧处理链路各段的分位数（报告中的一节）"""
+        latency = self.get_latency_histograms()
+        lines = []
+        for operation, label in FRAME_PIPELINE:
+            histogram = latency.get(operation)
+            if histogram is None or not histogram.count:
+                continue
+            p = histogram.percentiles()
+            lines.append(f"  {label}: {histogram.count}次 | P50 {p['p50'] * 1000:.2f}ms | P90 {p['p90'] * 1000:.2f}ms | "
+                         f"P99 {p['p99'] * 1000:.2f}ms | 最大 {histogram.max * 1000:.2f}ms")
+        return lines
+
+    def get_latency_histogram(self, operation_name: str) -> Optional[LatencyHistogram]:
+        """某个操作整个会话的延迟直方图（副本）"""
+        with self._lock:
+            histogram = self._latency.get(operation_name)
+            return histogram.copy() if histogram is not None else None
+
+    def get_latency_histograms(self) -> Dict[str, LatencyHistogram]:
+        """所有操作的延迟直方图（副本）"""
+        with self._lock:
+            return {name: histogram.copy() for name, histogram in self._latency.items()}
+
+    def get_latency_state(self) -> Dict[str, Dict]:
+        """所有操作的延迟直方图状态（可JSON序列化，可跨进程传递）"""
+        with self._lock:
+            return {name: histogram.to_state() for name, histogram in self._latency.items()}
+
+    def merge_latency_state(self, state: Dict[str, Dict]) -> None:
+        """合并其他线程、进程或会话导出的直方图状态"""
+        histograms = {name: LatencyHistogram.from_state(item) for name, item in state.items()}
+        with self._lock:
+            for name, histogram in histograms.items():
+                if name in self._latency:
+                    self._latency[name].merge(histogram)
+                else:
+                    self._latency[name] = histogram
+
+    def save_latency_histograms(self, filename: str) -> bool:
+        """保存延迟直方图，便于之后比较不同会话"""
+        try:
+            directory = os.path.dirname(filename)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(filename, 'w', encoding='utf-8') as f:
+                json.dump({'saved_at': time.time(), 'operations': self.get_latency_state()}, f)
+            self.logger.info(f"延迟直方图已保存到: {filename}")
+            return True
+        except Exception as e:
+            self.logger.error(f"保存延迟直方图失败: {e}")
+            return False
 
     def get_performance_report(self) -> str:
         """生成性能报告"""
@@ -197,6 +814,15 @@ class PerformanceMonitor:
             report.append(f"  CPU使用率: {current.cpu_percent:.1f}%")
             report.append(f"  内存使用率: {current.memory_percent:.1f}%")
             report.append(f"  内存使用量: {current.memory_mb:.1f} MB")
+            if current.rss_mb is not None:
+                report.append(f"\n机器人进程:")
+                report.append(f"  CPU使用率: {current.process_cpu_percent:.1f}%")
+                uss = f" | USS {current.uss_mb:.1f} MB" if current.uss_mb is not None else ""
+                report.append(f"  内存: RSS {current.rss_mb:.1f} MB{uss}")
+                report.append(f"  线程数: {current.num_threads} | 句柄数: {current.num_handles}")
+            if current.game_rss_mb is not None:
+                report.append(f"\n游戏进程 ({self.game_process_name}):")
+                report.append(f"  CPU使用率: {current.game_cpu_percent:.1f}% | 内存: {current.game_rss_mb:.1f} MB")
 
         # 平均性能指标
         avg_metrics = self.get_average_metrics()
@@ -206,19 +832,45 @@ class PerformanceMonitor:
             report.append(f"  平均内存使用率: {avg_metrics['memory_percent']:.1f}%")
             report.append(f"  平均内存使用量: {avg_metrics['memory_mb']:.1f} MB")
 
-        # 操作统计
-        if self._operation_times:
+        # 各线程CPU
+        thread_usage = self.get_thread_usage()
+        if thread_usage:
+            report.append(f"\n各线程CPU时间:")
+            for name, usage in sorted(thread_usage.items(), key=lambda item: -item[1]['cpu_seconds']):
+                report.append(f"  {name}: {usage['cpu_seconds']:.2f}s (当前 {usage['cpu_percent']:.1f}%)")
+
+        # 帧处理链路
+        frame_lines = self.get_frame_pipeline_report()
+        if frame_lines:
+            report.append(f"\n帧处理延迟 (截图 → 检测 → 点击):")
+            report.extend(frame_lines)
+
+        # 操作统计（帧链路中单独统计的延迟不重复列出）
+        frame_only = {'frame_capture', 'frame_queue', 'capture_to_click'}
+        operation_stats = {op: stats for op, stats in self.get_all_operation_stats().items() if op not in frame_only}
+        operation_cpu = self.get_operation_cpu()
+        if operation_stats:
             report.append(f"\n操作统计:")
-            operations = set(op for op, _, _ in self._operation_times)
-            for op in sorted(operations):
-                stats = self.get_operation_stats(op)
-                if stats:
-                    report.append(f"  {op}:")
-                    report.append(f"    执行次数: {stats['count']}")
-                    report.append(f"    总耗时: {stats['total_time']:.3f}s")
-                    report.append(f"    平均耗时: {stats['avg_time']:.3f}s")
-                    report.append(f"    最短耗时: {stats['min_time']:.3f}s")
-                    report.append(f"    最长耗时: {stats['max_time']:.3f}s")
+            for op, stats in sorted(operation_stats.items()):
+                report.append(f"  {op}:")
+                report.append(f"    执行次数: {stats['count']}")
+                report.append(f"    总耗时: {stats['total_time']:.3f}s")
+                report.append(f"    平均耗时: {stats['avg_time']:.3f}s")
+                report.append(f"    最短耗时: {stats['min_time']:.3f}s")
+                report.append(f"    最长耗时: {stats['max_time']:.3f}s")
+                if op in operation_cpu:
+                    report.append(f"    CPU时间(整个会话): {operation_cpu[op]:.3f}s")
+                if 'p50' in stats:
+                    report.append(f"    分位数(整个会话): P50 {stats['p50'] * 1000:.2f}ms | P90 {stats['p90'] * 1000:.2f}ms | "
+                                  f"P99 {stats['p99'] * 1000:.2f}ms | P99.9 {stats['p99.9'] * 1000:.2f}ms")
+
+        if self.profiler is not None and self.profiler.samples:
+            report.append("")
+            report.append(self.profiler.get_summary())
+
+        if self.memory is not None and self.memory.snapshots:
+            report.append("")
+            report.append(self.memory.get_summary())
 
         return "\n".join(report)
 
@@ -235,25 +887,35 @@ class PerformanceMonitor:
 
     def clear_metrics(self) -> None:
         """清空性能指标"""
-        self.metrics.clear()
-        self._operation_times.clear()
+        with self._lock:
+            self.metrics = RingBuffer(self.max_samples, dtype=SAMPLE_DTYPE)
+            self._operation_times = RingBuffer(self.max_samples, dtype=OPERATION_DTYPE)
+            self._latency = {name: LatencyHistogram() for name in self._operation_names}
+            self._operation_cpu.clear()
         self.logger.info("性能指标已清空")
 
 
 # 装饰器版本的性能监控
-def monitor_performance(operation_name: Optional[str] = None):
-    """性能监控装饰器"""
+def monitor_performance(operation_name: Optional[str] = None, category: str = 'operation'):
+    """性能监控装饰器
+
+    耗时记录到全局监控实例（会出现在性能报告、延迟直方图和指标接口中），启用追踪时同时记录为时间段。
+    每次调用独立计时，可以嵌套或在多个线程中同时调用。
+    """
     def decorator(func: Callable):
-        def wrapper(*args, **kwargs):
-            monitor = PerformanceMonitor()
-            name = operation_name or func.__name__
+        name = operation_name or func.__name__
 
-            monitor.start_timer(name)
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            cpu_start = time.thread_time()
             try:
-                result = func(*args, **kwargs)
-                return result
+                with span(name, category):
+                    return func(*args, **kwargs)
             finally:
-                duration = monitor.end_timer(name)
+                duration = time.perf_counter() - start
+                monitor = get_global_monitor()
+                monitor.record_operation(name, duration, time.thread_time() - cpu_start)
                 if duration > 1.0:  # 只记录超过1秒的操作
                     monitor.logger.info(f"{name} 执行时间: {duration:.3f}s")
 
@@ -267,4 +929,51 @@ _global_monitor = PerformanceMonitor()
 
 def get_global_monitor() -> PerformanceMonitor:
     """获取全局性能监控实例"""
-    return _global_monitor
\ No newline at end of file
+    return _global_monitor
+
+def load_latency_histograms(filename: str) -> Dict[str, LatencyHistogram]:
+    """读取 save_latency_histograms 保存的文件"""
+    with open(filename, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return {name: LatencyHistogram.from_state(state) for name, state in data['operations'].items()}
+
+
+def format_latency_comparison(sessions: Dict[str, Dict[str, LatencyHistogram]]) -> str:
+    """按操作列出各会话的延迟分位数（毫秒）"""
+    operations = sorted(set().union(*(histograms.keys() for histograms in sessions.values())))
+    width = max(len(label) for label in sessions) if sessions else 0
+    lines = []
+    for operation in operations:
+        lines.append(f"{operation}:")
+        for label, histograms in sessions.items():
+            histogram = histograms.get(operation)
+            if histogram is None or not histogram.count:
+                continue
+            p = histogram.percentiles()
+            lines.append(f"  {label:<{width}}  {histogram.count:8d}次 | P50 {p['p50'] * 1000:8.2f} | P90 {p['p90'] * 1000:8.2f} | "
+                         f"P99 {p['p99'] * 1000:8.2f} | P99.9 {p['p99.9'] * 1000:8.2f} | 最大 {histogram.max * 1000:8.2f} ms")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="比较各会话保存的延迟直方图")
+    parser.add_argument('files', nargs='+', help='save_latency_histograms 保存的JSON文件')
+    parser.add_argument('--merge', action='store_true', help='另外输出所有文件合并后的结果')
+    args = parser.parse_args(argv)
+
+    sessions = {os.path.basename(path): load_latency_histograms(path) for path in args.files}
+    if args.merge and len(sessions) > 1:
+        merged: Dict[str, LatencyHistogram] = {}
+        for histograms in sessions.values():
+            for name, histogram in histograms.items():
+                if name in merged:
+                    merged[name].merge(histogram)
+                else:
+                    merged[name] = histogram.copy()
+        sessions['合计'] = merged
+    print(format_latency_comparison(sessions))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
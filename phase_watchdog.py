@@ -0,0 +1,202 @@
+"""
+阶段看门狗
+为单局中的每个阶段设置截止时间，超时后立即中止本局，由机器人执行快速恢复（退出游戏、确认回到大厅），
+避免角色卡住时仍按脚本把整局点完
+"""
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from clock import Clock, get_clock
+
+
+# 各阶段默认截止时间（秒），约为正常运行p99的两倍
+DEFAULT_DEADLINES = {
+    'create_game': 15.0,
+    'navigate_to_red_portal': 5.0,
+    'use_red_portal': 9.0,
+    'navigate_to_pindle': 4.0,
+    'kill_pindle': 15.0,
+    'pickup_items': 8.0,
+    'leave_game': 8.0,
+}
+
+
+class RunAborted(BaseException):
+    """本局被看门狗中止
+
+    继承 BaseException 而不是 Exception，这样各阶段内部的 ``except Exception``
+    （如智能拾取失败时退回固定坐标）不会吞掉中止信号，只有 run_single_game 处理它。
+    """
+
+    def __init__(self, phase: str, elapsed: float, deadline: float):
+        super().__init__(f"阶段 {phase} 超时 ({elapsed:.2f}秒 > {deadline:.2f}秒)")
+        self.phase = phase
+        self.elapsed = elapsed
+        self.deadline = deadline
+
+
+class PhaseWatchdog:
+    """阶段截止时间监控
+
+    检查点在 WatchdogClock.sleep 中：每次等待前后检查是否超时，等待时间不会越过截止时间。
+    使用真实时钟时另有后台线程监视，阶段卡在非等待的调用中（如截图阻塞）时也能及时记录超时，
+    并唤醒正在等待的检查点；虚拟时钟下只依靠检查点（虚拟时间只在 sleep 中推进）。
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, clock: Optional[Clock] = None):
+        """
+        Args:
+            config: watchdog 配置
+            clock: 计时使用的时钟，默认为全局时钟
+        """
+        config = config or {}
+        self.logger = logging.getLogger(__name__)
+        self.clock = clock or get_clock()
+        self.enabled: bool = config.get('enabled', True)
+        self.check_interval: float = config.get('check_interval', 0.1)
+
+        self.configured_deadlines: Dict[str, float] = dict(DEFAULT_DEADLINES)
+        self.configured_deadlines.update(config.get('deadlines', {}))
+        self.deadlines: Dict[str, float] = dict(self.configured_deadlines)
+
+        # 根据观测到的阶段耗时收紧截止时间
+        adaptive = config.get('adaptive', {})
+        self.adaptive: bool = adaptive.get('enabled', True)
+        self.min_samples: int = adaptive.get('min_samples', 30)
+        self.p99_multiplier: float = adaptive.get('p99_multiplier', 2.0)
+        self.min_deadline: float = adaptive.get('min_deadline', 1.0)
+        self.update_every: int = adaptive.get('update_every', 10)
+
+        self._lock = threading.Lock()
+        self._phase: Optional[str] = None
+        self._phase_start = 0.0
+        self._deadline_at: Optional[float] = None
+        self._expired = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """启动后台监视线程（虚拟时钟下不需要）"""
+        if not self.enabled or self.clock.is_virtual or self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._watch_loop, name="PhaseWatchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止后台监视线程"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _watch_loop(self) -> None:
+        while not self._stop_event.wait(self.check_interval):
+            with self._lock:
+                phase, deadline_at = self._phase, self._deadline_at
+            if deadline_at is None or self._expired.is_set():
+                continue
+            if self.clock.monotonic() >= deadline_at:
+                self._expired.set()
+                self.logger.warning(f"看门狗: 阶段 {phase} 超过截止时间 {self.deadlines.get(phase, 0):.1f}秒")
+
+    @contextmanager
+    def watch(self, phase: str) -> Iterator[None]:
+        """在阶段执行期间启用截止时间（未配置截止时间的阶段不监控）"""
+        deadline = self.deadlines.get(phase) if self.enabled else None
+        if deadline is None:
+            yield
+            return
+
+        with self._lock:
+            self._phase = phase
+            self._phase_start = self.clock.monotonic()
+            self._deadline_at = self._phase_start + deadline
+            self._expired.clear()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._phase = None
+                self._deadline_at = None
+                self._expired.clear()
+
+    def remaining(self) -> Optional[float]:
+        """当前阶段剩余时间（秒），未监控时返回None"""
+        deadline_at = self._deadline_at
+        if deadline_at is None:
+            return None
+        return deadline_at - self.clock.monotonic()
+
+    def check(self) -> None:
+        """检查点：当前阶段已超时则抛出 RunAborted"""
+        with self._lock:
+            phase, deadline_at, start = self._phase, self._deadline_at, self._phase_start
+        if deadline_at is None:
+            return
+        now = self.clock.monotonic()
+        if self._expired.is_set() or now >= deadline_at:
+            raise RunAborted(phase, now - start, deadline_at - start)
+
+    def wait(self, seconds: float) -> None:
+        """可中止的等待：不会越过当前阶段的截止时间"""
+        self.check()
+        remaining = self.remaining()
+        if remaining is not None and remaining < seconds:
+            seconds = max(remaining, 0.0)
+
+        if self._thread is not None and self._deadline_at is not None:
+            # 后台线程判定超时后可立即唤醒
+            self._expired.wait(seconds)
+        else:
+            self.clock.sleep(seconds)
+        self.check()
+
+    def update_deadlines(self, phase_stats: Dict[str, Dict[str, float]]) -> None:
+        """根据各阶段的p99耗时收紧截止时间（不超过配置值）
+
+        Args:
+            phase_stats: Statistics.get_phase_stats() 的结果
+        """
+        if not self.adaptive:
+            return
+        for phase, configured in self.configured_deadlines.items():
+            stats = phase_stats.get(phase)
+            if not stats or stats['count'] < self.min_samples:
+                continue
+            observed = max(stats['p99'] * self.p99_multiplier, self.min_deadline)
+            self.deadlines[phase] = min(configured, observed)
+
+    def get_summary(self) -> str:
+        """当前截止时间摘要"""
+        parts = [f"{phase}={deadline:.1f}s" for phase, deadline in self.deadlines.items()]
+        return "看门狗截止时间: " + ", ".join(parts)
+
+
+class WatchdogClock(Clock):
+    """带检查点的时钟：时间读取委托给原时钟，等待通过看门狗进行
+
+    机器人在每局运行期间把它设为全局时钟，utils、输入控制等模块中的等待也会成为检查点。
+    """
+
+    def __init__(self, base: Clock, watchdog: PhaseWatchdog):
+        self.base = base
+        self.watchdog = watchdog
+
+    def time(self) -> float:
+        return self.base.time()
+
+    def monotonic(self) -> float:
+        return self.base.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            self.watchdog.wait(seconds)
+        else:
+            self.watchdog.check()
+
+    @property
+    def is_virtual(self) -> bool:
+        return self.base.is_virtual
@@ -0,0 +1,207 @@
+"""
+滚动窗口统计
+最近15分钟/1小时/6小时的每小时次数、失败率和每小时掉落，以及指数加权移动平均（EWMA），
+按物品类型和游戏名称分别统计，稀有掉落给出泊松置信区间；每局增量更新，不重新扫描历史
+"""
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import stats_math
+
+
+# 窗口名称 -> 秒数
+DEFAULT_WINDOWS: Tuple[Tuple[str, float], ...] = (
+    ('15分钟', 900.0),
+    ('1小时', 3600.0),
+    ('6小时', 21600.0),
+)
+OTHER_GAME_NAME = '其他'
+# 多实例汇总时，超过该倍数的平均间隔没有新记录的实例不再计入EWMA每小时次数
+STALE_INTERVALS = 3
+
+
+class Ewma:
+    """指数加权移动平均"""
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.value: Optional[float] = None
+
+    def update(self, x: float) -> float:
+        if self.value is None:
+            self.value = x
+        else:
+            self.value += self.alpha * (x - self.value)
+        return self.value
+
+
+class RollingWindow:
+    """固定时长的滑动窗口，进出窗口时增量维护计数"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self._entries: Deque[Tuple[float, bool, Dict[str, int]]] = deque()
+        self.runs = 0
+        self.failures = 0
+        self.drops: Dict[str, int] = {}
+
+    def add(self, timestamp: float, success: bool, items: Dict[str, int]) -> None:
+        self._entries.append((timestamp, success, items))
+        self.runs += 1
+        if not success:
+            self.failures += 1
+        for item_type, count in items.items():
+            self.drops[item_type] = self.drops.get(item_type, 0) + count
+
+    def evict(self, now: float) -> None:
+        """移出窗口之外的记录"""
+        cutoff = now - self.seconds
+        while self._entries and self._entries[0][0] < cutoff:
+            _, success, items = self._entries.popleft()
+            self.runs -= 1
+            if not success:
+                self.failures -= 1
+            for item_type, count in items.items():
+                self.drops[item_type] -= count
+
+    def summary(self, now: float, start_time: float) -> Dict[str, Any]:
+        """窗口内的每小时次数、失败率和每小时掉落（会话不足一个窗口时按实际时长计算）"""
+        self.evict(now)
+        hours = max(min(self.seconds, now - start_time), 1e-9) / 3600
+        fail_low, fail_high = stats_math.wilson_interval(self.failures, self.runs)
+        drops = {}
+        for item_type, count in self.drops.items():
+            low, high = stats_math.poisson_interval(count, hours)
+            drops[item_type] = {'count': count, 'per_hour': count / hours, 'per_hour_ci': (low, high)}
+        return {
+            'runs': self.runs,
+            'hours': hours,
+            'runs_per_hour': self.runs / hours,
+            'failure_rate': self.failures / self.runs if self.runs else 0.0,
+            'failure_rate_ci': (fail_low, fail_high),
+            'drops': drops,
+        }
+
+
+class RollingAnalytics:
+    """滚动窗口和EWMA统计，由 Statistics.add_record 每局调用一次"""
+
+    def __init__(self, windows: Tuple[Tuple[str, float], ...] = DEFAULT_WINDOWS,
+                 alpha: float = 0.05, max_game_names: int = 50):
+        """
+        Args:
+            windows: (名称, 秒数) 列表
+            alpha: EWMA平滑系数（约等于最近 2/alpha 局的权重）
+            max_game_names: 单独统计的游戏名称上限，超出的计入"其他"
+        """
+        self.windows = {name: RollingWindow(seconds) for name, seconds in windows}
+        self.alpha = alpha
+        self.max_game_names = max_game_names
+
+        # 相邻两局结束的间隔（包含局间停顿），按来源实例分别计算：
+        # 监控程序汇总多个实例时，交错的时间戳之间的间隔不代表任何一个实例的速度
+        self._intervals: Dict[Optional[str], Tuple[float, Ewma]] = {}
+        self.ewma_failure = Ewma(alpha)
+        self.ewma_drops: Dict[str, Ewma] = {}
+        self.by_game_name: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, record: Dict[str, Any]) -> None:
+        timestamp = record.get('timestamp')
+        if timestamp is None:
+            return
+        success = bool(record['success'])
+        items = {item_type: int(count) for item_type, count in record.get('items', {}).items() if count}
+
+        for window in self.windows.values():
+            window.add(timestamp, success, items)
+            window.evict(timestamp)
+
+        source = record.get('worker')
+        previous = self._intervals.get(source)
+        if previous is None:
+            ewma_interval, interval = Ewma(self.alpha), record['duration']
+        else:
+            ewma_interval, interval = previous[1], timestamp - previous[0]
+        ewma_interval.update(max(interval, 0.0))
+        self._intervals[source] = (timestamp, ewma_interval)
+        self.ewma_failure.update(0.0 if success else 1.0)
+        for item_type in set(self.ewma_drops) | set(items):
+            ewma = self.ewma_drops.get(item_type)
+            if ewma is None:
+                # 新出现的类型，之前各局视为0
+                ewma = self.ewma_drops[item_type] = Ewma(self.alpha)
+                ewma.value = 0.0
+            ewma.update(items.get(item_type, 0))
+
+        name = record.get('game_name_base') or record.get('game_name')
+        if name:
+            if name not in self.by_game_name and len(self.by_game_name) >= self.max_game_names:
+                name = OTHER_GAME_NAME
+            entry = self.by_game_name.setdefault(name, {'runs': 0, 'failures': 0, 'drops': {}})
+            entry['runs'] += 1
+            if not success:
+                entry['failures'] += 1
+            for item_type, count in items.items():
+                entry['drops'][item_type] = entry['drops'].get(item_type, 0) + count
+
+    def get_window_runs_per_hour(self, name: str, now: float, start_time: float) -> float:
+        """某个窗口的每小时次数"""
+        return self.windows[name].summary(now, start_time)['runs_per_hour']
+
+    def get_ewma(self) -> Dict[str, Any]:
+        """EWMA估计：每小时次数（多个实例时为各实例之和）、失败率、各类型每局掉落"""
+        # 已结束或等待重启的实例不计入
+        latest = max((timestamp for timestamp, _ in self._intervals.values()), default=0.0)
+        runs_per_hour = sum(3600 / ewma.value for timestamp, ewma in self._intervals.values()
+                            if ewma.value and latest - timestamp <= STALE_INTERVALS * ewma.value)
+        return {
+            'runs_per_hour': runs_per_hour,
+            'failure_rate': self.ewma_failure.value or 0.0,
+            'drops_per_run': {item_type: ewma.value for item_type, ewma in self.ewma_drops.items()},
+        }
+
+    def get_game_name_stats(self) -> Dict[str, Dict[str, Any]]:
+        """按游戏名称统计每局掉落（泊松置信区间，暴露量为局数）"""
+        result = {}
+        for name, entry in self.by_game_name.items():
+            runs = entry['runs']
+            drops = {}
+            for item_type, count in entry['drops'].items():
+                low, high = stats_math.poisson_interval(count, runs)
+                drops[item_type] = {'count': count, 'per_run': count / runs, 'per_run_ci': (low, high)}
+            result[name] = {
+                'runs': runs,
+                'failure_rate': entry['failures'] / runs if runs else 0.0,
+                'drops': drops,
+            }
+        return result
+
+    def format_report(self, now: float, start_time: float) -> str:
+        """报告中的滚动统计部分"""
+        lines = ["滚动统计:"]
+        for name, window in self.windows.items():
+            summary = window.summary(now, start_time)
+            drops = ", ".join(
+                f"{item_type} {stats['per_hour']:.1f}/时 [{stats['per_hour_ci'][0]:.1f}-{stats['per_hour_ci'][1]:.1f}]"
+                for item_type, stats in sorted(summary['drops'].items())
+            )
+            lines.append(f"- 近{name}: {summary['runs']} 局 | {summary['runs_per_hour']:.1f} 次/小时 | "
+                         f"失败率 {summary['failure_rate'] * 100:.1f}%"
+                         + (f" | 掉落 {drops}" if drops else ""))
+
+        ewma = self.get_ewma()
+        drops = ", ".join(f"{item_type} {value:.3f}" for item_type, value in sorted(ewma['drops_per_run'].items()))
+        lines.append(f"- EWMA: {ewma['runs_per_hour']:.1f} 次/小时 | 失败率 {ewma['failure_rate'] * 100:.1f}%"
+                     + (f" | 每局掉落 {drops}" if drops else ""))
+
+        game_stats = self.get_game_name_stats()
+        if len(game_stats) > 1:
+            lines.append("按游戏名称 (每局掉落):")
+            for name, stats in game_stats.items():
+                drops = ", ".join(
+                    f"{item_type} {d['per_run']:.3f} [{d['per_run_ci'][0]:.3f}-{d['per_run_ci'][1]:.3f}]"
+                    for item_type, d in sorted(stats['drops'].items())
+                )
+                lines.append(f"- {name}: {stats['runs']} 局 | 失败率 {stats['failure_rate'] * 100:.1f}%"
+                             + (f" | {drops}" if drops else ""))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,337 @@
+"""
+运行历史存储
+把每局记录（时间、各阶段耗时、成功与否、游戏名、掉落）写入SQLite数据库（WAL模式），
+由后台线程批量写入，程序崩溃也只丢失最后一批；跨会话保存，可按天、按物品类型查询每小时掉落
+
+用法:
+    python run_store.py --db run_history.db summary --days 30
+    python run_store.py --db run_history.db daily --days 14 --item-type unique
+"""
+import argparse
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from clock import get_clock
+
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT,
+    started_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id INTEGER NOT NULL REFERENCES sessions(id),
+    started_at REAL NOT NULL,
+    ended_at REAL NOT NULL,
+    duration REAL NOT NULL,
+    success INTEGER NOT NULL,
+    game_name TEXT,
+    timeout_phase TEXT,
+    kill_casts INTEGER,
+    kill_seconds REAL,
+    kill_early_exit INTEGER
+);
+CREATE TABLE IF NOT EXISTS run_phases (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    phase TEXT NOT NULL,
+    duration REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS drops (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    ended_at REAL NOT NULL,
+    item_type TEXT NOT NULL,
+    item_name TEXT,
+    count INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_runs_ended_at ON runs(ended_at);
+CREATE INDEX IF NOT EXISTS idx_runs_session ON runs(session_id);
+CREATE INDEX IF NOT EXISTS idx_run_phases_phase ON run_phases(phase, run_id);
+CREATE INDEX IF NOT EXISTS idx_drops_ended_at ON drops(ended_at);
+CREATE INDEX IF NOT EXISTS idx_drops_type_time ON drops(item_type, ended_at);
+"""
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """打开数据库（WAL模式，多个进程可同时读写）"""
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+    return conn
+
+
+class RunStore:
+    """每局记录的持久化存储
+
+    add() 只把记录放入队列，后台线程攒够 batch_size 条或等待 flush_interval 秒后在一个事务中写入。
+    第一次 add() 时才创建数据库和写线程，可直接注册为 Statistics 的监听器。
+
+    记录中的 items {类型: 数量} 按类型写入 drops 表；如有 drops [{type, name}] 则同时写入识别出的物品名。
+    """
+
+    def __init__(self, path: str = 'run_history.db', session_name: Optional[str] = None,
+                 batch_size: int = 20, flush_interval: float = 2.0, max_queue: int = 10000):
+        self.path = path
+        self.session_name = session_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.logger = logging.getLogger(__name__)
+
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.session_id: Optional[int] = None
+        self.written = 0
+        self.dropped = 0
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """加入一局记录（不阻塞，队列满时丢弃并计数）"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._writer_loop, name="RunStoreWriter", daemon=True)
+                self._thread.start()
+
+    def close(self, timeout: float = 10.0) -> None:
+        """写入队列中剩余的记录并停止写线程"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
+        if self._thread.is_alive():
+            self.logger.warning("运行历史写线程未能按时结束，部分记录可能未写入")
+        self._thread = None
+
+    def _writer_loop(self) -> None:
+        try:
+            conn = connect(self.path)
+            cursor = conn.execute("INSERT INTO sessions (name, started_at) VALUES (?, ?)",
+                                  (self.session_name, get_clock().time()))
+            self.session_id = cursor.lastrowid
+            conn.commit()
+        except Exception as e:
+            self.logger.error(f"打开运行历史数据库失败: {e}")
+            return
+
+        batch: List[Dict[str, Any]] = []
+        stopping = False
+        while not stopping:
+            # 攒批：最多等待 flush_interval 秒（用真实时间，虚拟时钟下也能按时写入）
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    record = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+
+            if batch:
+                try:
+                    self._write_batch(conn, batch)
+                    self.written += len(batch)
+                except Exception as e:
+                    self.logger.error(f"写入运行历史失败 ({len(batch)}条): {e}")
+                batch = []
+        conn.close()
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List[Dict[str, Any]]) -> None:
+        with conn:
+            for record in batch:
+                ended_at = record['timestamp']
+                cursor = conn.execute(
+                    "INSERT INTO runs (session_id, started_at, ended_at, duration, success, game_name, "
+                    "timeout_phase, kill_casts, kill_seconds, kill_early_exit) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (self.session_id, ended_at - record['duration'], ended_at, record['duration'],
+                     int(record['success']), record.get('game_name'), record.get('timeout_phase'),
+                     record.get('kill_casts'), record.get('kill_seconds'),
+                     None if 'kill_early_exit' not in record else int(record['kill_early_exit']))
+                )
+                run_id = cursor.lastrowid
+                conn.executemany(
+                    "INSERT INTO run_phases (run_id, phase, duration) VALUES (?, ?, ?)",
+                    [(run_id, phase, duration) for phase, duration in record.get('phases', {}).items()]
+                )
+
+                drops = [(run_id, ended_at, drop['type'], drop.get('name'), 1) for drop in record.get('drops', [])]
+                if not drops:
+                    drops = [(run_id, ended_at, item_type, None, int(count))
+                             for item_type, count in record.get('items', {}).items() if count]
+                conn.executemany(
+                    "INSERT INTO drops (run_id, ended_at, item_type, item_name, count) VALUES (?, ?, ?, ?, ?)",
+                    drops
+                )
+
+
+def _time_filter(column: str, since: Optional[float], until: Optional[float]) -> Tuple[str, list]:
+    clauses, params = [], []
+    if since is not None:
+        clauses.append(f"{column} >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append(f"{column} < ?")
+        params.append(until)
+    return (" AND ".join(clauses) or "1=1"), params
+
+
+def run_summary(conn: sqlite3.Connection, since: Optional[float] = None,
+                until: Optional[float] = None) -> Dict[str, float]:
+    """时间范围内的局数、成功率、运行小时数和每小时次数"""
+    where, params = _time_filter('ended_at', since, until)
+    runs, successes, seconds = conn.execute(
+        f"SELECT COUNT(*), COALESCE(SUM(success), 0), COALESCE(SUM(duration), 0) FROM runs WHERE {where}",
+        params
+    ).fetchone()
+    hours = seconds / 3600
+    return {
+        'runs': runs,
+        'success_rate': successes / runs * 100 if runs else 0.0,
+        'hours': hours,
+        'runs_per_hour': runs / hours if hours > 0 else 0.0,
+    }
+
+
+def drops_per_hour(conn: sqlite3.Connection, since: Optional[float] = None,
+                   until: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+    """按物品类型统计掉落数和每小时掉落（以运行时间计）
+
+    Returns:
+        {类型: {count, per_hour}}
+    """
+    hours = run_summary(conn, since, until)['hours']
+    where, params = _time_filter('ended_at', since, until)
+    rows = conn.execute(
+        f"SELECT item_type, SUM(count) FROM drops WHERE {where} GROUP BY item_type ORDER BY item_type",
+        params
+    ).fetchall()
+    return {
+        item_type: {'count': count, 'per_hour': count / hours if hours > 0 else 0.0}
+        for item_type, count in rows
+    }
+
+
+def drops_by_name(conn: sqlite3.Connection, item_type: Optional[str] = None,
+                  since: Optional[float] = None, limit: int = 20) -> List[tuple]:
+    """识别出名字的掉落按次数排序 [(类型, 名称, 次数), ...]"""
+    where, params = _time_filter('ended_at', since, None)
+    where += " AND item_name IS NOT NULL"
+    if item_type:
+        where += " AND item_type = ?"
+        params.append(item_type)
+    return conn.execute(
+        f"SELECT item_type, item_name, SUM(count) AS n FROM drops WHERE {where} "
+        f"GROUP BY item_type, item_name ORDER BY n DESC LIMIT ?",
+        params + [limit]
+    ).fetchall()
+
+
+def daily_summary(conn: sqlite3.Connection, days: int = 30,
+                  item_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    """按天（本地时间）汇总局数、运行小时和每小时掉落"""
+    since = (datetime.now() - timedelta(days=days)).timestamp()
+    runs = conn.execute(
+        "SELECT date(ended_at, 'unixepoch', 'localtime') AS day, COUNT(*), SUM(success), SUM(duration) "
+        "FROM runs WHERE ended_at >= ? GROUP BY day ORDER BY day",
+        (since,)
+    ).fetchall()
+
+    drop_sql = ("SELECT date(ended_at, 'unixepoch', 'localtime') AS day, SUM(count) "
+                "FROM drops WHERE ended_at >= ?")
+    drop_params: list = [since]
+    if item_type:
+        drop_sql += " AND item_type = ?"
+        drop_params.append(item_type)
+    drops = dict(conn.execute(drop_sql + " GROUP BY day", drop_params).fetchall())
+
+    result = []
+    for day, count, successes, seconds in runs:
+        hours = seconds / 3600
+        day_drops = drops.get(day, 0)
+        result.append({
+            'day': day,
+            'runs': count,
+            'success_rate': successes / count * 100 if count else 0.0,
+            'hours': hours,
+            'runs_per_hour': count / hours if hours > 0 else 0.0,
+            'drops': day_drops,
+            'drops_per_hour': day_drops / hours if hours > 0 else 0.0,
+        })
+    return result
+
+
+def phase_averages(conn: sqlite3.Connection, since: Optional[float] = None) -> Dict[str, float]:
+    """各阶段平均耗时"""
+    where, params = _time_filter('r.ended_at', since, None)
+    rows = conn.execute(
+        f"SELECT p.phase, AVG(p.duration) FROM run_phases p JOIN runs r ON r.id = p.run_id "
+        f"WHERE {where} GROUP BY p.phase",
+        params
+    ).fetchall()
+    return dict(rows)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="运行历史查询")
+    parser.add_argument('--db', default='run_history.db', help='数据库路径')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    summary_parser = sub.add_parser('summary', help='总体效率和各类型每小时掉落')
+    summary_parser.add_argument('--days', type=int, default=None, help='最近N天（默认全部）')
+
+    daily_parser = sub.add_parser('daily', help='按天汇总')
+    daily_parser.add_argument('--days', type=int, default=30, help='最近N天')
+    daily_parser.add_argument('--item-type', default=None, help='只统计某类掉落')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"数据库不存在: {args.db}")
+        return 1
+    conn = connect(args.db)
+
+    if args.command == 'summary':
+        since = (datetime.now() - timedelta(days=args.days)).timestamp() if args.days else None
+        summary = run_summary(conn, since)
+        print(f"局数: {summary['runs']} | 成功率: {summary['success_rate']:.1f}% | "
+              f"运行: {summary['hours']:.1f}小时 | 每小时次数: {summary['runs_per_hour']:.1f}")
+        for item_type, stats in drops_per_hour(conn, since).items():
+            print(f"  {item_type:<8} {stats['count']:>6} 个 | {stats['per_hour']:.2f} 个/小时")
+        for item_type, name, count in drops_by_name(conn, since=since):
+            print(f"  [{item_type}] {name}: {count}")
+        for phase, avg in phase_averages(conn, since).items():
+            print(f"  阶段 {phase:<24} 平均 {avg:.2f} 秒")
+    else:
+        print(f"{'日期':<12}{'局数':>8}{'成功率':>9}{'小时':>8}{'次/小时':>10}{'掉落':>8}{'掉落/小时':>11}")
+        for row in daily_summary(conn, args.days, args.item_type):
+            print(f"{row['day']:<12}{row['runs']:>8}{row['success_rate']:>8.1f}%{row['hours']:>8.2f}"
+                  f"{row['runs_per_hour']:>10.1f}{row['drops']:>8}{row['drops_per_hour']:>11.2f}")
+    conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
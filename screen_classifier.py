@@ -0,0 +1,405 @@
+"""
+屏幕状态探针分类器
+从参考截图中挑选少量判别像素（探针），运行时只读取这些像素即可判断当前画面
+（大厅、加载、哈洛加斯、神殿、菜单），可以60Hz以上频率轮询
+
+参考截图目录结构:
+    screenshots/states/
+        lobby/*.png
+        loading/*.png
+        harrogath/*.png
+        temple/*.png
+        menu/*.png
+
+用法:
+    python screen_classifier.py train --data screenshots/states --out screen_probes.json
+    python screen_classifier.py benchmark --probes screen_probes.json --frames recorded_frames
+    python screen_classifier.py watch --probes screen_probes.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from clock import get_clock
+
+
+SCREEN_STATES = ('lobby', 'loading', 'harrogath', 'temple', 'menu')
+UNKNOWN_STATE = 'unknown'
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+class ProbeClassifier:
+    """基于探针像素的画面状态分类器"""
+
+    FILE_VERSION = 1
+
+    def __init__(self,
+                 points: np.ndarray,
+                 signatures: Dict[str, np.ndarray],
+                 max_distance: float,
+                 resolution: Tuple[int, int]):
+        """
+        Args:
+            points: 探针坐标 (N, 2)，格式 [(x, y), ...]
+            signatures: 各状态在探针处的期望颜色 {state: (N, 3) BGR}
+            max_distance: 最大允许颜色距离，超过则判定为未知状态
+            resolution: 训练截图的分辨率 (宽, 高)
+        """
+        self.points = np.asarray(points, dtype=np.int32).reshape(-1, 2)
+        self.states: List[str] = list(signatures.keys())
+        self.max_distance = float(max_distance)
+        self.resolution = (int(resolution[0]), int(resolution[1]))
+
+        # 性能优化：预先展开为 (S, N*3) 矩阵，分类时只做一次向量化运算
+        self._centroids = np.stack([
+            np.asarray(signatures[state], dtype=np.float32).reshape(-1)
+            for state in self.states
+        ])
+        self._xs = self.points[:, 0]
+        self._ys = self.points[:, 1]
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def probe_count(self) -> int:
+        return len(self.points)
+
+    def classify_pixels(self, pixels: np.ndarray) -> Tuple[str, float]:
+        """根据探针像素判断画面状态
+
+        Args:
+            pixels: 探针处的BGR像素 (N, 3)
+
+        Returns:
+            (状态名, 颜色距离)，距离为各通道的均方根差
+        """
+        sample = np.asarray(pixels, dtype=np.float32).reshape(-1)
+        diff = self._centroids - sample
+        distances = np.sqrt(np.einsum('ij,ij->i', diff, diff) / sample.size)
+
+        best = int(np.argmin(distances))
+        distance = float(distances[best])
+        if distance > self.max_distance:
+            return UNKNOWN_STATE, distance
+        return self.states[best], distance
+
+    def classify_frame(self, img: np.ndarray) -> Tuple[str, float]:
+        """对整幅截图（BGR）分类，只取探针位置的像素"""
+        return self.classify_pixels(img[self._ys, self._xs])
+
+    def classify_screen(self, read_pixels: Callable[[np.ndarray], np.ndarray]) -> Tuple[str, float]:
+        """直接读取屏幕探针像素并分类
+
+        Args:
+            read_pixels: 像素读取函数，通常为 ItemDetector.read_pixels
+        """
+        return self.classify_pixels(read_pixels(self.points))
+
+    @classmethod
+    def train(cls,
+              samples: Dict[str, List[np.ndarray]],
+              probe_count: int = 24,
+              grid_step: int = 8,
+              min_spacing: int = 24,
+              distance_margin: float = 1.5) -> 'ProbeClassifier':
+        """从参考截图训练探针
+
+        在网格候选点上计算各状态的平均颜色与类内方差，然后贪心选择探针：
+        每次选择对“当前区分度最弱的状态对”贡献最大的点，保证每对状态都能被区分。
+
+        Args:
+            samples: {state: [BGR图像, ...]}，所有图像分辨率必须一致
+            probe_count: 探针数量
+            grid_step: 候选点网格间距（像素）
+            min_spacing: 探针之间的最小间距（像素），避免选出冗余的相邻点
+            distance_margin: 判定阈值相对训练样本最大距离的倍数
+        """
+        states = [state for state, images in samples.items() if images]
+        if len(states) < 2:
+            raise ValueError("至少需要两种画面状态的参考截图")
+
+        height, width = samples[states[0]][0].shape[:2]
+        for state in states:
+            for img in samples[state]:
+                if img.shape[:2] != (height, width):
+                    raise ValueError(f"截图分辨率不一致: {state} {img.shape[1]}x{img.shape[0]}")
+
+        # 候选点网格
+        half = grid_step // 2
+        grid_y, grid_x = np.mgrid[half:height:grid_step, half:width:grid_step]
+        cand_x = grid_x.reshape(-1)
+        cand_y = grid_y.reshape(-1)
+
+        # 各状态在候选点处的均值和类内方差
+        means = []
+        within_var = np.zeros(len(cand_x), dtype=np.float64)
+        for state in states:
+            stack = np.stack([img[cand_y, cand_x] for img in samples[state]]).astype(np.float64)
+            means.append(stack.mean(axis=0))
+            within_var += stack.var(axis=0).sum(axis=1)
+        means = np.stack(means)  # (S, K, 3)
+        within_std = np.sqrt(within_var / len(states)) + 8.0  # 加入噪声下限，防止除零和过拟合
+
+        # 每对状态在每个候选点的可分性 (P, K)
+        pairs = [(a, b) for a in range(len(states)) for b in range(a + 1, len(states))]
+        separation = np.stack([
+            np.linalg.norm(means[a] - means[b], axis=1) / within_std
+            for a, b in pairs
+        ])
+        separation = np.minimum(separation, 10.0)
+
+        selected: List[int] = []
+        pair_score = np.zeros(len(pairs))
+        available = np.ones(len(cand_x), dtype=bool)
+        spacing_sq = min_spacing * min_spacing
+
+        for _ in range(min(probe_count, len(cand_x))):
+            # 优先照顾区分度最弱的状态对
+            weights = 1.0 / (1.0 + pair_score)
+            gain = weights @ separation
+            gain[~available] = -1.0
+            best = int(np.argmax(gain))
+            if gain[best] <= 0:
+                break
+
+            selected.append(best)
+            pair_score += separation[:, best]
+            too_close = (cand_x - cand_x[best]) ** 2 + (cand_y - cand_y[best]) ** 2 < spacing_sq
+            available &= ~too_close
+
+        points = np.stack([cand_x[selected], cand_y[selected]], axis=1)
+        signatures = {
+            state: means[i][selected].astype(np.float32)
+            for i, state in enumerate(states)
+        }
+
+        classifier = cls(points, signatures, max_distance=float('inf'), resolution=(width, height))
+
+        # 阈值：训练样本到自身中心的最大距离乘以余量
+        worst = 0.0
+        for state in states:
+            for img in samples[state]:
+                _, distance = classifier.classify_frame(img)
+                worst = max(worst, distance)
+        classifier.max_distance = max(worst * distance_margin, 10.0)
+
+        return classifier
+
+    def to_dict(self) -> Dict:
+        return {
+            'version': self.FILE_VERSION,
+            'resolution': list(self.resolution),
+            'max_distance': self.max_distance,
+            'points': self.points.tolist(),
+            'signatures': {
+                state: np.round(self._centroids[i].reshape(-1, 3), 2).tolist()
+                for i, state in enumerate(self.states)
+            }
+        }
+
+    def save(self, path: str) -> None:
+        """保存探针文件"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> 'ProbeClassifier':
+        """加载探针文件"""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        if data.get('version') != cls.FILE_VERSION:
+            raise ValueError(f"不支持的探针文件版本: {data.get('version')}")
+
+        return cls(
+            points=np.array(data['points']),
+            signatures={state: np.array(sig) for state, sig in data['signatures'].items()},
+            max_distance=data['max_distance'],
+            resolution=tuple(data['resolution'])
+        )
+
+
+class ScreenStateWatcher:
+    """高频轮询探针像素，等待画面进入指定状态"""
+
+    def __init__(self,
+                 classifier: ProbeClassifier,
+                 read_pixels: Callable[[np.ndarray], np.ndarray],
+                 poll_interval: float = 0.01):
+        self.classifier = classifier
+        self.read_pixels = read_pixels
+        self.poll_interval = poll_interval
+        self.last_state = UNKNOWN_STATE
+
+    def current_state(self) -> str:
+        """读取一次当前画面状态"""
+        self.last_state, _ = self.classifier.classify_screen(self.read_pixels)
+        return self.last_state
+
+    def wait_for(self, states: Tuple[str, ...], timeout: float) -> Optional[str]:
+        """等待画面进入任一指定状态
+
+        Returns:
+            进入的状态名，超时返回None
+        """
+        deadline = get_clock().time() + timeout
+        while True:
+            state = self.current_state()
+            if state in states:
+                return state
+            remaining = deadline - get_clock().time()
+            if remaining <= 0:
+                return None
+            get_clock().sleep(min(self.poll_interval, remaining))
+
+
+def load_labeled_frames(directory: str) -> Dict[str, List[np.ndarray]]:
+    """按子目录名读取带标签的截图 {state: [BGR图像, ...]}"""
+    frames: Dict[str, List[np.ndarray]] = {}
+    for state in sorted(os.listdir(directory)):
+        state_dir = os.path.join(directory, state)
+        if not os.path.isdir(state_dir):
+            continue
+
+        images = []
+        for filename in sorted(os.listdir(state_dir)):
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            img = cv2.imread(os.path.join(state_dir, filename), cv2.IMREAD_COLOR)
+            if img is not None:
+                images.append(img)
+
+        if images:
+            frames[state] = images
+    return frames
+
+
+def benchmark(classifier: ProbeClassifier,
+              frames: Dict[str, List[np.ndarray]],
+              repeat: int = 200) -> Dict:
+    """在录制的帧上评估准确率和单次分类延迟"""
+    total = 0
+    correct = 0
+    confusion: Dict[str, Dict[str, int]] = {}
+    latencies = []
+
+    for expected, images in frames.items():
+        for img in images:
+            predicted, _ = classifier.classify_frame(img)
+            confusion.setdefault(expected, {}).setdefault(predicted, 0)
+            confusion[expected][predicted] += 1
+            total += 1
+            correct += predicted == expected
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                classifier.classify_frame(img)
+            latencies.append((time.perf_counter() - start) / repeat)
+
+    latencies_us = np.array(latencies) * 1e6 if latencies else np.zeros(1)
+    return {
+        'frames': total,
+        'accuracy': correct / total if total else 0.0,
+        'confusion': confusion,
+        'latency_us_mean': float(latencies_us.mean()),
+        'latency_us_p50': float(np.percentile(latencies_us, 50)),
+        'latency_us_p99': float(np.percentile(latencies_us, 99)),
+    }
+
+
+def _cmd_train(args) -> int:
+    samples = load_labeled_frames(args.data)
+    if not samples:
+        print(f"未找到参考截图: {args.data}")
+        return 1
+
+    for state, images in samples.items():
+        mark = "" if state in SCREEN_STATES else " (非标准状态)"
+        print(f"  {state}: {len(images)} 张{mark}")
+
+    classifier = ProbeClassifier.train(
+        samples,
+        probe_count=args.probes,
+        grid_step=args.grid_step,
+        min_spacing=args.min_spacing
+    )
+    classifier.save(args.out)
+    print(f"\n已选择 {classifier.probe_count} 个探针，阈值 {classifier.max_distance:.1f}")
+    print(f"探针文件已保存到: {args.out}")
+    return 0
+
+
+def _cmd_benchmark(args) -> int:
+    classifier = ProbeClassifier.load(args.probes)
+    frames = load_labeled_frames(args.frames)
+    if not frames:
+        print(f"未找到录制帧: {args.frames}")
+        return 1
+
+    result = benchmark(classifier, frames, repeat=args.repeat)
+    print(f"帧数: {result['frames']}")
+    print(f"准确率: {result['accuracy'] * 100:.1f}%")
+    print(f"分类延迟: 平均 {result['latency_us_mean']:.1f}us | "
+          f"p50 {result['latency_us_p50']:.1f}us | p99 {result['latency_us_p99']:.1f}us")
+    print("\n混淆矩阵 (期望 -> 识别):")
+    for expected, row in result['confusion'].items():
+        cells = ", ".join(f"{state}={count}" for state, count in sorted(row.items()))
+        print(f"  {expected}: {cells}")
+    return 0
+
+
+def _cmd_watch(args) -> int:
+    from item_detector import ItemDetector
+
+    classifier = ProbeClassifier.load(args.probes)
+    detector = ItemDetector()
+    print("实时识别画面状态，按 Ctrl+C 停止")
+    try:
+        while True:
+            start = time.perf_counter()
+            state, distance = classifier.classify_screen(detector.read_pixels)
+            elapsed_us = (time.perf_counter() - start) * 1e6
+            print(f"\r状态: {state:<10} 距离: {distance:6.1f}  耗时: {elapsed_us:7.1f}us    ",
+                  end="", flush=True)
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("\n已停止")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="屏幕状态探针分类器")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = subparsers.add_parser('train', help='从参考截图训练探针')
+    train_parser.add_argument('--data', default='screenshots/states', help='参考截图目录（按状态分子目录）')
+    train_parser.add_argument('--out', default='screen_probes.json', help='输出探针文件')
+    train_parser.add_argument('--probes', type=int, default=24, help='探针数量')
+    train_parser.add_argument('--grid-step', type=int, default=8, help='候选点网格间距')
+    train_parser.add_argument('--min-spacing', type=int, default=24, help='探针最小间距')
+    train_parser.set_defaults(func=_cmd_train)
+
+    bench_parser = subparsers.add_parser('benchmark', help='在录制帧上评估准确率和延迟')
+    bench_parser.add_argument('--probes', default='screen_probes.json', help='探针文件')
+    bench_parser.add_argument('--frames', required=True, help='录制帧目录（按状态分子目录）')
+    bench_parser.add_argument('--repeat', type=int, default=200, help='每帧重复分类次数')
+    bench_parser.set_defaults(func=_cmd_benchmark)
+
+    watch_parser = subparsers.add_parser('watch', help='实时识别当前画面状态')
+    watch_parser.add_argument('--probes', default='screen_probes.json', help='探针文件')
+    watch_parser.add_argument('--interval', type=float, default=0.1, help='刷新间隔（秒）')
+    watch_parser.set_defaults(func=_cmd_watch)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
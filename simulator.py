@@ -0,0 +1,498 @@
+"""
+无界面游戏模拟器
+实现窗口、截图和输入三个后端，按配置坐标响应点击和按键，渲染大厅、加载、
+城镇、神殿和掉落画面，可注入卡传送、慢加载等故障。
+D2PindleBot.run_single_game 无需修改即可在Linux上端到端运行。
+
+用法:
+    python simulator.py --runs 500                  # 默认使用虚拟时钟，几秒内完成
+    python simulator.py --runs 20 --stuck-rate 0.05 --slow-load-rate 0.1 --drop unique=0.5
+    python simulator.py --runs 5 --realtime         # 按真实时间运行
+    python simulator.py --runs 20 --trace traces/sim.json   # 导出Chrome trace
+    python simulator.py --runs 200 --profile profiles/sim.folded   # 采样分析
+    python simulator.py --runs 500 --memory-every 100               # 内存诊断
+    python simulator.py --runs 50 --events logs/events_sim.jsonl    # 结构化事件日志
+"""
+import argparse
+import logging
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from clock import VirtualClock, get_clock, set_clock
+from item_detector import ItemDetector, tag_frame
+from performance_monitor import monitor_performance
+from event_log import EventLog
+from tracing import get_tracer, traced
+
+
+@dataclass
+class SimulationOptions:
+    """模拟参数与故障注入"""
+    load_time: float = 1.5              # 创建游戏的加载时间（秒）
+    portal_load_time: float = 0.5       # 进入红门/退出游戏的加载时间
+    slow_load_rate: float = 0.0         # 慢加载概率
+    slow_load_time: float = 8.0         # 慢加载时间
+    stuck_teleport_rate: float = 0.0    # 单次传送卡住（位置不变）的概率
+    pindle_hp: float = 6.0              # Pindleskin血量（静态力场1点，暴风雪2点）
+    click_tolerance: int = 30           # 点击判定半径（像素）
+    drop_rates: Dict[str, float] = field(default_factory=lambda: {
+        'unique': 0.3, 'rune': 0.1, 'set': 0.2, 'rare': 0.4
+    })
+    seed: Optional[int] = None
+
+
+# 各画面的背景色 (BGR)，均不落在物品颜色和血条颜色范围内
+STATE_COLORS = {
+    'lobby': (60, 40, 20),
+    'loading': (0, 0, 0),
+    'harrogath': (70, 90, 110),
+    'temple': (35, 25, 45),
+    'menu': (20, 20, 20),
+}
+BUTTON_COLOR = (90, 90, 90)
+PORTAL_COLOR = (40, 40, 230)
+HEALTH_BAR_COLOR = (20, 20, 200)
+MENU_PANEL_COLOR = (110, 110, 110)
+
+
+class SimulatedFailure(Exception):
+    """注入的故障导致本局失败（例如传送卡住后没有到达Pindle）
+
+    机器人本身无法察觉这类故障，模拟器按真实结果抛出异常，使本局按出错处理并记为失败。
+    """
+
+
+class SimulatedGame:
+    """模拟的游戏状态机"""
+
+    def __init__(self, config: Dict, options: Optional[SimulationOptions] = None):
+        self.config = config
+        self.options = options or SimulationOptions()
+        self.rng = random.Random(self.options.seed)
+        self.logger = logging.getLogger(__name__)
+
+        width, height = config.get('game', {}).get('resolution', '1920x1080').split('x')
+        self.width, self.height = int(width), int(height)
+
+        coords = config['coordinates']
+        self.lobby = coords['lobby']
+        self.in_game = coords['in_game']
+        self.town_path = coords.get('town_to_portal_path', [])
+        self.teleport_path = coords['teleport_path']
+        self.health_bar_area = tuple(
+            config.get('sorceress', {}).get('kill_detection', {}).get('health_bar_area', [860, 20, 1060, 50])
+        )
+        hotkeys = config.get('hotkeys', {})
+        self.skill_keys = {
+            hotkeys.get('static_field', 'f2').lower(): ('static_field', 1.0),
+            hotkeys.get('blizzard', 'f1').lower(): ('blizzard', 2.0),
+        }
+
+        self.state = 'lobby'
+        self._pending_state: Optional[str] = None
+        self._loading_until = 0.0
+        self.dialog_open = False
+        self.game_name = ''
+        self.town_step = 0
+        self.temple_step = 0
+        self.selected_skill: Optional[Tuple[str, float]] = None
+        self.pindle_hp = self.options.pindle_hp
+        self.drops: List[Tuple[int, int, str]] = []
+        self.cursor = (0, 0)
+
+        self._frame: Optional[np.ndarray] = None
+        self._frame_dirty = True
+
+        # 模拟统计
+        self.stats = {
+            'games': 0, 'kills': 0, 'stuck_teleports': 0, 'slow_loads': 0,
+            'missed_kills': 0, 'drops': 0, 'picked': 0
+        }
+
+    # ---- 状态推进 ----
+
+    def _now(self) -> float:
+        return get_clock().time()
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        self._frame_dirty = True
+
+    def _start_loading(self, next_state: str, duration: float) -> None:
+        self._set_state('loading')
+        self._pending_state = next_state
+        self._loading_until = self._now() + duration
+
+    def update(self) -> None:
+        """推进基于时间的状态变化（加载完成）"""
+        if self.state == 'loading' and self._now() >= self._loading_until:
+            self._set_state(self._pending_state)
+            self._pending_state = None
+            if self.state == 'harrogath':
+                self._enter_game()
+
+    def _enter_game(self) -> None:
+        self.stats['games'] += 1
+        self.town_step = 0
+        self.temple_step = 0
+        self.pindle_hp = self.options.pindle_hp
+        self.drops = []
+        self.selected_skill = None
+
+    def _near(self, x: int, y: int, target) -> bool:
+        tolerance = self.options.click_tolerance
+        return (x - target[0]) ** 2 + (y - target[1]) ** 2 <= tolerance * tolerance
+
+    @property
+    def pindle_in_range(self) -> bool:
+        return self.state == 'temple' and self.temple_step >= len(self.teleport_path)
+
+    @property
+    def pindle_alive(self) -> bool:
+        return self.pindle_hp > 0
+
+    # ---- 输入事件 ----
+
+    def on_click(self, x: int, y: int, button: str = 'left') -> None:
+        self.update()
+        self.cursor = (x, y)
+
+        if (button == 'left' and self.selected_skill and not self.pindle_in_range
+                and self.state not in ('lobby', 'menu') and self._near(x, y, self.in_game['pindle_spawn_area'])):
+            # 在Pindle身边之外施法：之前传送卡住或加载未完成，本局不可能击杀
+            self.stats['missed_kills'] += 1
+            raise SimulatedFailure(f"未到达Pindle就开始施法 (画面: {self.state})")
+
+        if self.state == 'lobby':
+            self._click_lobby(x, y)
+        elif self.state == 'harrogath':
+            self._click_town(x, y, button)
+        elif self.state == 'temple':
+            self._click_temple(x, y, button)
+
+    def _click_lobby(self, x: int, y: int) -> None:
+        if self._near(x, y, self.lobby['create_game_button']):
+            self.dialog_open = True
+            self._frame_dirty = True
+        elif self.dialog_open and self._near(x, y, self.lobby['start_game_button']):
+            self.dialog_open = False
+            duration = self.options.load_time
+            if self.rng.random() < self.options.slow_load_rate:
+                duration = self.options.slow_load_time
+                self.stats['slow_loads'] += 1
+            self._start_loading('harrogath', duration)
+
+    def _teleport(self) -> bool:
+        if self.rng.random() < self.options.stuck_teleport_rate:
+            self.stats['stuck_teleports'] += 1
+            return False
+        return True
+
+    def _click_town(self, x: int, y: int, button: str) -> None:
+        if button == 'right':
+            if self.town_step < len(self.town_path) and self._near(x, y, self.town_path[self.town_step]):
+                if self._teleport():
+                    self.town_step += 1
+            elif not self.town_path and self._near(x, y, self.in_game['red_portal_position']):
+                self.town_step = 1
+            return
+
+        arrived = self.town_step >= max(len(self.town_path), 1)
+        if arrived and self._near(x, y, self.in_game['red_portal_position']):
+            self._start_loading('temple', self.options.portal_load_time)
+
+    def _click_temple(self, x: int, y: int, button: str) -> None:
+        if button == 'right':
+            if self.temple_step < len(self.teleport_path) and self._near(x, y, self.teleport_path[self.temple_step]):
+                if self._teleport():
+                    self.temple_step += 1
+            return
+
+        # 拾取物品
+        for drop in self.drops:
+            if self._near(x, y, drop[:2]):
+                self.drops.remove(drop)
+                self.stats['picked'] += 1
+                self._frame_dirty = True
+                return
+
+        # 施法
+        if (self.selected_skill and self.pindle_in_range and self.pindle_alive
+                and self._near(x, y, self.in_game['pindle_spawn_area'])):
+            self.pindle_hp -= self.selected_skill[1]
+            self._frame_dirty = True
+            if not self.pindle_alive:
+                self._on_pindle_killed()
+
+    def _on_pindle_killed(self) -> None:
+        self.stats['kills'] += 1
+        scan_area = self.config.get('pickup', {}).get('scan_area', [560, 200, 1360, 700])
+        cx, cy = self.in_game['pindle_spawn_area']
+        for item_type, rate in self.options.drop_rates.items():
+            if self.rng.random() < rate:
+                x = min(max(cx + self.rng.randint(-250, 250), scan_area[0] + 50), scan_area[2] - 50)
+                y = min(max(cy + self.rng.randint(-60, 120), scan_area[1] + 20), scan_area[3] - 20)
+                self.drops.append((x, y, item_type))
+                self.stats['drops'] += 1
+
+    def on_key(self, key_name: str) -> None:
+        self.update()
+        key = key_name.lower()
+        if key in self.skill_keys:
+            self.selected_skill = self.skill_keys[key]
+        elif key == 'esc' and self.state in ('harrogath', 'temple'):
+            self._set_state('menu')
+        elif key == 'esc' and self.state == 'menu':
+            self._set_state('temple' if self.temple_step else 'harrogath')
+        elif key == 'enter' and self.state == 'menu':
+            self._start_loading('lobby', self.options.portal_load_time)
+
+    def on_text(self, text: str) -> None:
+        self.update()
+        if self.state == 'lobby' and self.dialog_open:
+            self.game_name = text
+
+    # ---- 渲染 ----
+
+    def render_state(self, state: str, noise: int = 0) -> np.ndarray:
+        """渲染某个画面状态的基础画面（不含掉落物和血条）"""
+        img = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        img[:] = STATE_COLORS[state]
+
+        if state == 'lobby':
+            for name in ('create_game_button', 'start_game_button'):
+                x, y = self.lobby[name]
+                img[y - 20:y + 20, x - 120:x + 120] = BUTTON_COLOR
+        elif state == 'harrogath':
+            x, y = self.in_game['red_portal_position']
+            img[y - 40:y + 40, x - 25:x + 25] = PORTAL_COLOR
+        elif state == 'menu':
+            cy, cx = self.height // 2, self.width // 2
+            img[cy - 150:cy + 150, cx - 200:cx + 200] = MENU_PANEL_COLOR
+
+        if noise:
+            jitter = np.random.randint(-noise, noise + 1, img.shape, dtype=np.int16)
+            img = np.clip(img.astype(np.int16) + jitter, 0, 255).astype(np.uint8)
+        return img
+
+    def render(self) -> np.ndarray:
+        """渲染当前完整画面"""
+        self.update()
+        if not self._frame_dirty and self._frame is not None:
+            return self._frame
+
+        img = self.render_state(self.state)
+
+        if self.state == 'lobby' and self.dialog_open:
+            x, y = self.lobby['game_name_input']
+            img[y - 15:y + 15, x - 150:x + 150] = BUTTON_COLOR
+
+        if self.state == 'temple':
+            if self.pindle_in_range and self.pindle_alive:
+                x1, y1, x2, y2 = self.health_bar_area
+                img[y1:y2, x1:x2] = HEALTH_BAR_COLOR
+            for x, y, item_type in self.drops:
+                color = ItemDetector.ITEM_COLORS[item_type]
+                mid = ((color['lower'].astype(int) + color['upper'].astype(int)) // 2).tolist()
+                img[y - 7:y + 7, x - 35:x + 35] = mid
+
+        self._frame = img
+        self._frame_dirty = False
+        return img
+
+
+class SimWindowController:
+    """模拟窗口控制"""
+
+    def __init__(self, game: SimulatedGame):
+        self.game = game
+        self.window_title = 'Simulated D2R'
+        self.hwnd: Optional[int] = 1
+
+    def find_window(self) -> bool:
+        return True
+
+    def is_window_active(self) -> bool:
+        return True
+
+    def activate_window(self) -> bool:
+        return True
+
+    def get_window_rect(self) -> Optional[Tuple[int, int, int, int]]:
+        return (0, 0, self.game.width, self.game.height)
+
+    def get_client_rect(self) -> Optional[Tuple[int, int, int, int]]:
+        return (0, 0, self.game.width, self.game.height)
+
+
+class SimInputController:
+    """模拟输入控制，接口与 InputController 一致"""
+
+    def __init__(self, game: SimulatedGame):
+        self.game = game
+
+    @traced('click', 'input')
+    def click(self, x: int, y: int, button: str = 'left', delay: float = 0.1):
+        get_clock().sleep(delay + 0.05)
+        self.game.on_click(int(x), int(y), button)
+
+    def move_to(self, x: int, y: int, delay: float = 0.1):
+        self.game.cursor = (int(x), int(y))
+        get_clock().sleep(delay)
+
+    @traced('press_key', 'input')
+    def press_key(self, key_code: int, delay: float = 0.1):
+        get_clock().sleep(0.05 + delay)
+
+    @traced('press_key_by_name', 'input')
+    def press_key_by_name(self, key_name: str, delay: float = 0.1):
+        get_clock().sleep(0.05)
+        self.game.on_key(key_name)
+        get_clock().sleep(delay)
+
+    @traced('type_text', 'input')
+    def type_text(self, text: str, delay: float = 0.05):
+        get_clock().sleep((0.02 + delay) * len(text))
+        self.game.on_text(text)
+
+
+class SimItemDetector(ItemDetector):
+    """从模拟画面截图，检测逻辑与 ItemDetector 相同"""
+
+    def __init__(self, game: SimulatedGame):
+        super().__init__()
+        self.game = game
+
+    @monitor_performance('capture_screen', 'capture')
+    def capture_screen(self, region: Optional[Tuple[int, int, int, int]] = None) -> np.ndarray:
+        started = get_clock().monotonic()
+        frame = self.game.render()
+        if region:
+            x1, y1, x2, y2 = region
+            return tag_frame(frame[y1:y2, x1:x2].copy(), started, region)
+        return tag_frame(frame.copy(), started)
+
+    def get_screen_size(self) -> Optional[Tuple[int, int]]:
+        return self.game.width, self.game.height
+
+    @traced('read_pixels', 'capture')
+    def read_pixels(self, points: np.ndarray) -> np.ndarray:
+        frame = self.game.render()
+        return frame[points[:, 1], points[:, 0]]
+
+
+def train_simulator_probes(game: SimulatedGame, samples_per_state: int = 3):
+    """用模拟画面训练画面状态探针"""
+    from screen_classifier import ProbeClassifier
+
+    samples = {
+        state: [game.render_state(state, noise=6) for _ in range(samples_per_state)]
+        for state in STATE_COLORS
+    }
+    return ProbeClassifier.train(samples)
+
+
+def create_simulated_bot(config_path: str = 'config.json',
+                         options: Optional[SimulationOptions] = None,
+                         use_probes: bool = True):
+    """创建连接到模拟器的机器人
+
+    Returns:
+        (bot, game)
+    """
+    from config_validator import ConfigValidator
+    from game_bot import D2PindleBot
+    from screen_classifier import ScreenStateWatcher
+
+    config = ConfigValidator().load_and_validate_config(config_path)
+    game = SimulatedGame(config, options)
+    detector = SimItemDetector(game)
+    bot = D2PindleBot(
+        config_path,
+        session_name='sim',
+        window_controller=SimWindowController(game),
+        input_controller=SimInputController(game),
+        item_detector=detector,
+        persist=False
+    )
+
+    if use_probes:
+        bot.screen_watcher = ScreenStateWatcher(train_simulator_probes(game), detector.read_pixels)
+    else:
+        bot.screen_watcher = None
+    return bot, game
+
+
+def _parse_drop_rates(values: List[str]) -> Dict[str, float]:
+    rates = dict(SimulationOptions().drop_rates)
+    for value in values or []:
+        item_type, _, rate = value.partition('=')
+        rates[item_type] = float(rate)
+    return rates
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="无界面游戏模拟器")
+    parser.add_argument('--config', default='config.json', help='配置文件')
+    parser.add_argument('--runs', type=int, default=10, help='运行局数')
+    parser.add_argument('--load-time', type=float, default=1.5, help='创建游戏加载时间（秒）')
+    parser.add_argument('--slow-load-rate', type=float, default=0.0, help='慢加载概率')
+    parser.add_argument('--stuck-rate', type=float, default=0.0, help='传送卡住概率')
+    parser.add_argument('--drop', action='append', help='掉落概率，例如 unique=0.5（可重复）')
+    parser.add_argument('--no-probes', action='store_true', help='不使用画面状态探针（固定等待）')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子')
+    parser.add_argument('--realtime', action='store_true', help='使用真实时钟（默认虚拟时钟）')
+    parser.add_argument('--trace', default=None, help='导出Chrome trace到指定文件')
+    parser.add_argument('--profile', default=None, help='采样分析并把 collapsed 结果写入指定文件')
+    parser.add_argument('--memory-every', type=int, default=None, help='内存诊断：每隔多少局对比一次快照')
+    parser.add_argument('--events', default=None, help='把结构化事件写入指定的JSONL文件')
+    args = parser.parse_args(argv)
+
+    if not args.realtime:
+        set_clock(VirtualClock())
+    if args.trace:
+        get_tracer().enable()
+
+    options = SimulationOptions(
+        load_time=args.load_time,
+        slow_load_rate=args.slow_load_rate,
+        stuck_teleport_rate=args.stuck_rate,
+        drop_rates=_parse_drop_rates(args.drop),
+        seed=args.seed
+    )
+    bot, game = create_simulated_bot(args.config, options, use_probes=not args.no_probes)
+    bot.config['bot']['runs_count'] = args.runs
+    if args.profile:
+        bot.performance_monitor.start_profiling()
+    if args.events:
+        bot.events = EventLog(args.events, session='sim')
+    if args.memory_every:
+        memory_config = dict(bot.config.get('memory_diagnostics', {}), every_runs=args.memory_every)
+        bot.start_memory_diagnostics(memory_config)
+
+    wall_start = time.perf_counter()
+    bot.start()
+    wall_time = time.perf_counter() - wall_start
+
+    print("\n模拟器统计:")
+    print(f"  实际耗时: {wall_time:.2f}秒 | 游戏内耗时: {bot.statistics.get_elapsed_time():.1f}秒 | "
+          f"每小时次数: {bot.statistics.get_runs_per_hour():.1f}")
+    for key, value in game.stats.items():
+        print(f"  {key}: {value}")
+    if args.trace:
+        bot.export_trace(args.trace)
+        print(f"  追踪文件: {args.trace}")
+    if args.profile:
+        bot.performance_monitor.stop_profiling()
+        bot.save_profile(args.profile)
+        print(bot.performance_monitor.profiler.get_summary())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
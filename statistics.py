@@ -1,28 +1,60 @@
 """
 统计系统 - 追踪刷怪效率和物品掉落
 """
-import time
-from typing import Dict, List, Optional
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
 from datetime import datetime
 import logging
 
+from clock import get_clock
+from rolling_stats import RollingAnalytics
+from stream_stats import RingBuffer, StreamingSummary
+
+
+# 单局中的各个阶段（按执行顺序）
+RUN_PHASES = (
+    'create_game',
+    'navigate_to_red_portal',
+    'use_red_portal',
+    'navigate_to_pindle',
+    'kill_pindle',
+    'pickup_items',
+    'leave_game',
+    'between_runs',
+)
+
 
 class Statistics:
     """刷怪统计"""
 
     def __init__(self, max_history: int = 1000):
-        self.start_time = time.time()
+        self.start_time = get_clock().time()
         self.total_runs = 0
         self.successful_runs = 0
         self.failed_runs = 0
-        self.run_times: List[float] = []
+        # 最近 max_history 局的明细（环形缓冲区，写满后覆盖最旧的）
+        self.run_times = RingBuffer(max_history)
+        self.run_records: Deque[Dict[str, Any]] = deque(maxlen=max_history)  # 每局详细记录（与run_times对应）
+        # 全部局数的流式聚合，不受 max_history 限制
+        self.duration_summary = StreamingSummary()
+        self.phase_summaries: Dict[str, StreamingSummary] = {}
+        self._kill_totals = {'runs': 0, 'casts': 0, 'seconds': 0.0, 'early_exits': 0}
+        # 最近15分钟/1小时/6小时和EWMA，不受早期停顿影响
+        self.rolling = RollingAnalytics()
+        self._current_phases: Dict[str, float] = {}
+        self._current_time_saved: Dict[str, List[float]] = {}
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
         self.items_picked: Dict[str, int] = {
             "unique": 0,
             "rune": 0,
             "set": 0,
             "rare": 0
         }
-        self.last_report_time = time.time()
+        self.time_saved: Dict[str, List[float]] = {}  # 优化来源 -> [累计节省秒数, 次数]
+        self.timeouts: Dict[str, int] = {}  # 阶段 -> 看门狗超时次数
+        self.last_report_time = get_clock().time()
+        self.last_record_time = self.start_time
         self.logger = logging.getLogger(__name__)
 
         # 性能优化：限制历史记录大小
@@ -30,43 +62,184 @@ class Statistics:
     
     def start_run(self) -> None:
         """开始一次刷怪"""
-        self.run_start_time = time.time()
+        self.run_start_time = get_clock().time()
+        self._current_phases = {}
+        self._current_time_saved = {}
 
-    def end_run(self, success: bool = True, items: Optional[Dict[str, int]] = None) -> None:
-        """结束一次刷怪"""
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """记录当前局中一个阶段的耗时（异常退出时也会记录）
+
+        Example:
+            with statistics.phase('create_game'):
+                bot.create_game()
+        """
+        start = get_clock().time()
         try:
-            duration = time.time() - self.run_start_time
+            yield
+        finally:
+            self._current_phases[name] = self._current_phases.get(name, 0.0) + get_clock().time() - start
 
-            # 性能优化：限制历史记录大小
-            if len(self.run_times) >= self.max_history:
-                self.run_times.pop(0)  # 移除最旧的记录
+    def end_run(self, success: bool = True, items: Optional[Dict[str, int]] = None,
+                details: Optional[Dict[str, Any]] = None) -> Optional[float]:
+        """结束一次刷怪，返回本局耗时
 
-            self.run_times.append(duration)
-            self.total_runs += 1
+        Args:
+            success: 是否成功
+            items: 拾取物品数量 {类型: 数量}
+            details: 附加到本局记录的字段（如击杀施法次数和耗时）
+        """
+        try:
+            duration = get_clock().time() - self.run_start_time
 
-            if success:
-                self.successful_runs += 1
-            else:
-                self.failed_runs += 1
+            record: Dict[str, Any] = {
+                'timestamp': get_clock().time(),
+                'duration': duration,
+                'success': success,
+                'phases': self._current_phases,
+                'items': dict(items) if items else {}
+            }
+            if self._current_time_saved:
+                record['time_saved'] = self._current_time_saved
+            if details:
+                record.update(details)
 
-            # 更新拾取物品统计
-            if items:
-                for item_type, count in items.items():
-                    if item_type in self.items_picked:
-                        self.items_picked[item_type] += count
+            self.add_record(record)
+            return duration
 
         except Exception as e:
             self.logger.error(f"统计记录失败: {e}")
+            return None
+
+    def add_record(self, record: Dict[str, Any], notify: bool = True) -> None:
+        """记录一局结果
+
+        end_run 在本地计时后调用；监控进程也用它汇总其他进程发来的记录。
+
+        Args:
+            record: 至少包含 duration 和 success，可选 items {类型: 数量}
+            notify: 是否通知监听器（从日志恢复时为False，避免重复写入）
+        """
+        # 明细只保留最近 max_history 局，聚合统计覆盖全部局数
+        self.run_times.append(record['duration'])
+        self.run_records.append(record)
+        self.duration_summary.add(record['duration'])
+        self.total_runs += 1
+
+        for name, duration in record.get('phases', {}).items():
+            summary = self.phase_summaries.get(name)
+            if summary is None:
+                summary = self.phase_summaries[name] = StreamingSummary()
+            summary.add(duration)
+
+        if 'kill_casts' in record:
+            self._kill_totals['runs'] += 1
+            self._kill_totals['casts'] += record['kill_casts']
+            self._kill_totals['seconds'] += record['kill_seconds']
+            if record.get('kill_early_exit'):
+                self._kill_totals['early_exits'] += 1
+
+        if record['success']:
+            self.successful_runs += 1
+        else:
+            self.failed_runs += 1
+
+        # 更新拾取物品统计
+        for item_type, count in record.get('items', {}).items():
+            if item_type in self.items_picked:
+                self.items_picked[item_type] += count
+
+        for source, (seconds, count) in record.get('time_saved', {}).items():
+            entry = self.time_saved.setdefault(source, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += count
+
+        self.rolling.add(record)
+
+        # 看门狗中止的局记录超时阶段
+        timeout_phase = record.get('timeout_phase')
+        if timeout_phase:
+            self.timeouts[timeout_phase] = self.timeouts.get(timeout_phase, 0) + 1
+
+        self.last_record_time = record.get('timestamp', self.last_record_time)
+        if not notify:
+            return
+        for listener in self._listeners:
+            try:
+                listener(record)
+            except Exception as e:
+                self.logger.error(f"统计监听器出错: {e}")
+
+    def add_listener(self, callback: Callable[[Dict[str, Any]], None]) -> None:
+        """注册每局结束时的回调，参数为本局记录"""
+        self._listeners.append(callback)
     
+    def record_time_saved(self, source: str, seconds: float) -> None:
+        """记录某项优化相对固定等待节省的时间（随本局记录一起计入）"""
+        entry = self._current_time_saved.setdefault(source, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+    def get_time_saved_per_run(self) -> Dict[str, float]:
+        """各项优化平均每局节省的秒数"""
+        if self.total_runs == 0:
+            return {}
+        return {source: total / self.total_runs for source, (total, _) in self.time_saved.items()}
+
+    def to_snapshot(self) -> Dict[str, Any]:
+        """导出全部统计状态（可JSON序列化），用于统计日志的压缩快照"""
+        return {
+            'start_time': self.start_time,
+            'last_record_time': self.last_record_time,
+            'total_runs': self.total_runs,
+            'successful_runs': self.successful_runs,
+            'failed_runs': self.failed_runs,
+            'items_picked': dict(self.items_picked),
+            'time_saved': {source: list(entry) for source, entry in self.time_saved.items()},
+            'timeouts': dict(self.timeouts),
+            'kill_totals': dict(self._kill_totals),
+            'duration_summary': self.duration_summary.to_state(),
+            'phase_summaries': {name: summary.to_state() for name, summary in self.phase_summaries.items()},
+            'run_records': list(self.run_records),
+        }
+
+    def restore_snapshot(self, snapshot: Dict[str, Any]) -> None:
+        """从快照恢复统计状态
+
+        运行时长只计算到快照中最后一局结束，停机期间不计入每小时次数。
+        """
+        self.total_runs = snapshot['total_runs']
+        self.successful_runs = snapshot['successful_runs']
+        self.failed_runs = snapshot['failed_runs']
+        self.items_picked.update(snapshot['items_picked'])
+        self.time_saved = {source: list(entry) for source, entry in snapshot['time_saved'].items()}
+        self.timeouts = dict(snapshot['timeouts'])
+        self._kill_totals = dict(snapshot['kill_totals'])
+        self.duration_summary = StreamingSummary.from_state(snapshot['duration_summary'])
+        self.phase_summaries = {
+            name: StreamingSummary.from_state(state) for name, state in snapshot['phase_summaries'].items()
+        }
+        for record in snapshot['run_records']:
+            self.run_times.append(record['duration'])
+            self.run_records.append(record)
+            # 滚动统计不单独保存，用最近的明细重建
+            self.rolling.add(record)
+        self.start_time = snapshot['start_time']
+        self.last_record_time = snapshot['last_record_time']
+
+    def resume_clock(self) -> None:
+        """恢复后把开始时间平移到现在，使运行时长不包含停机时间"""
+        active = self.last_record_time - self.start_time
+        self.start_time = get_clock().time() - active
+        self.last_record_time = get_clock().time()
+
     def get_elapsed_time(self) -> float:
         """获取总运行时间（秒）"""
-        return time.time() - self.start_time
+        return get_clock().time() - self.start_time
     
     def get_average_run_time(self) -> float:
         """获取平均单局时间"""
-        if not self.run_times:
-            return 0.0
-        return sum(self.run_times) / len(self.run_times)
+        return self.duration_summary.stats.mean
     
     def get_runs_per_hour(self) -> float:
         """获取每小时刷怪次数"""
@@ -75,6 +248,44 @@ class Statistics:
             return 0.0
         return (self.total_runs / elapsed) * 3600
     
+    def get_recent_runs_per_hour(self, window: str = '15分钟') -> float:
+        """最近一个窗口内的每小时次数"""
+        return self.rolling.get_window_runs_per_hour(window, get_clock().time(), self.start_time)
+
+    def get_kill_stats(self) -> Optional[Dict[str, float]]:
+        """获取击杀阶段统计（平均施法次数、耗时、提前结束比例）"""
+        totals = self._kill_totals
+        if totals['runs'] == 0:
+            return None
+        return {
+            'avg_casts': totals['casts'] / totals['runs'],
+            'avg_seconds': totals['seconds'] / totals['runs'],
+            'early_exit_rate': totals['early_exits'] / totals['runs'] * 100
+        }
+
+    def get_phase_stats(self) -> Dict[str, Dict[str, float]]:
+        """获取各阶段耗时分布（全部局数的流式估计，分位数为P²近似值）
+
+        Returns:
+            {阶段: {count, mean, p50, p90, p99, share}}，share为该阶段占总运行时间的百分比
+        """
+        total_time = self.duration_summary.stats.total
+        ordered = [name for name in RUN_PHASES if name in self.phase_summaries]
+        ordered += sorted(name for name in self.phase_summaries if name not in RUN_PHASES)
+
+        stats = {}
+        for name in ordered:
+            summary = self.phase_summaries[name]
+            stats[name] = {
+                'count': summary.count,
+                'mean': summary.stats.mean,
+                'p50': summary.quantile(0.5),
+                'p90': summary.quantile(0.9),
+                'p99': summary.quantile(0.99),
+                'share': summary.stats.total / total_time * 100 if total_time > 0 else 0.0
+            }
+        return stats
+
     def get_success_rate(self) -> float:
         """获取成功率"""
         if self.total_runs == 0:
@@ -105,7 +316,7 @@ class Statistics:
 ║ 效率指标:
 ║ - 平均单局时间: {avg_time:.2f} 秒
 ║ - 每小时次数:   {runs_per_hour:.1f}
-║ 
+{self._format_time_saved()}║ 
 ║ 拾取物品:
 ║ - 💎 暗金: {self.items_picked['unique']}
 ║ - 🔮 符文: {self.items_picked['rune']}
@@ -116,9 +327,9 @@ class Statistics:
         
         if detailed and self.run_times:
             # 添加详细时间分析
-            min_time = min(self.run_times)
-            max_time = max(self.run_times)
-            recent_avg = sum(self.run_times[-10:]) / min(10, len(self.run_times))
+            min_time = self.duration_summary.stats.min
+            max_time = self.duration_summary.stats.max
+            recent_avg = float(self.run_times.last(10).mean())
             
             report += f"""
 详细分析:
@@ -126,20 +337,49 @@ class Statistics:
 - 最慢单局: {max_time:.2f} 秒
 - 最近10局平均: {recent_avg:.2f} 秒
 """
+            kill_stats = self.get_kill_stats()
+            if kill_stats:
+                report += (f"- 击杀平均: {kill_stats['avg_casts']:.1f} 次施法 / "
+                           f"{kill_stats['avg_seconds']:.2f} 秒 "
+                           f"(提前结束 {kill_stats['early_exit_rate']:.0f}%)\n")
+
+            phase_stats = self.get_phase_stats()
+            if phase_stats:
+                report += "\n阶段耗时 (秒):\n"
+                report += f"  {'阶段':<24}{'p50':>8}{'p90':>8}{'p99':>8}{'平均':>8}{'占比':>8}\n"
+                for name, stats in phase_stats.items():
+                    report += (f"  {name:<24}{stats['p50']:>8.2f}{stats['p90']:>8.2f}"
+                               f"{stats['p99']:>8.2f}{stats['mean']:>8.2f}{stats['share']:>7.1f}%\n")
+
+            report += "\n" + self.rolling.format_report(get_clock().time(), self.start_time)
+
+            if self.timeouts:
+                report += "\n阶段超时: " + ", ".join(
+                    f"{name} {count}次" for name, count in self.timeouts.items()
+                ) + "\n"
         
         return report
     
+    def _format_time_saved(self) -> str:
+        """格式化节省时间（报告中的效率指标部分）"""
+        lines = []
+        for source, per_run in self.get_time_saved_per_run().items():
+            total, count = self.time_saved[source]
+            lines.append(f"║ - {source} 节省: {per_run:.2f} 秒/局 (共 {total:.1f} 秒, {count} 次)\n")
+        return "".join(lines)
+
     def get_short_status(self) -> str:
         """获取简短状态（用于日志）"""
         return (f"进度: {self.total_runs} 次 | "
                 f"成功率: {self.get_success_rate():.1f}% | "
-                f"效率: {self.get_runs_per_hour():.1f} 次/小时 | "
+                f"效率: {self.get_runs_per_hour():.1f} 次/小时 "
+                f"(近15分钟 {self.get_recent_runs_per_hour():.1f}) | "
                 f"暗金: {self.items_picked['unique']} | "
                 f"符文: {self.items_picked['rune']}")
     
     def should_report(self, interval: int = 300) -> bool:
         """判断是否应该生成报告（默认每5分钟）"""
-        now = time.time()
+        now = get_clock().time()
         if now - self.last_report_time >= interval:
             self.last_report_time = now
             return True
@@ -152,7 +392,16 @@ class Statistics:
                 f.write(f"统计时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
                 f.write(self.get_report(detailed=True))
                 f.write("\n\n运行时间记录:\n")
-                for i, run_time in enumerate(self.run_times, 1):
-                    f.write(f"第{i}局: {run_time:.2f}秒\n")
+                # 只保留了最近 max_history 局的明细，序号从全部局数推算
+                first_index = self.total_runs - len(self.run_records) + 1
+                for i, record in enumerate(self.run_records, first_index):
+                    line = f"第{i}局: {record['duration']:.2f}秒"
+                    if not record['success']:
+                        line += " [失败]"
+                    if 'timeout_phase' in record:
+                        line += f" [超时: {record['timeout_phase']}]"
+                    if 'kill_casts' in record:
+                        line += f" | 击杀: {record['kill_casts']}次施法 {record['kill_seconds']:.2f}秒"
+                    f.write(line + "\n")
         except Exception as e:
             print(f"保存统计失败: {e}")
@@ -0,0 +1,177 @@
+"""
+统计日志
+每局结束时向只追加的日志文件写入一行JSON并立即交给操作系统（进程崩溃不丢失），按时间间隔批量fsync；
+累计一定局数后把日志压缩为快照（原子替换），启动时按"快照 + 日志"恢复统计，
+程序崩溃后统计数据可以继续累计，每局的写入量固定，不随历史长度增长
+"""
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+from statistics import Statistics
+
+
+SNAPSHOT_VERSION = 1
+
+
+class StatsJournal:
+    """统计的只追加日志和压缩快照
+
+    日志每行为 {"seq": 局序号, "record": 本局记录}，快照中保存对应的 total_runs；
+    恢复时跳过序号不大于快照的行，因此压缩过程中任意时刻崩溃都不会重复计入。
+    正常停止时写入 closed 标记的快照，下次启动从零开始统计。
+    """
+
+    def __init__(self, directory: str = 'stats_journal', fsync_interval: float = 1.0,
+                 compact_every: int = 500):
+        """
+        Args:
+            directory: 日志和快照所在目录
+            fsync_interval: 两次fsync之间的最长间隔（秒），0表示每局都fsync；
+                每局都会flush到操作系统，间隔只影响断电等系统崩溃时可能丢失的局数
+            compact_every: 每追加多少局压缩一次
+        """
+        self.directory = directory
+        self.journal_path = os.path.join(directory, 'journal.jsonl')
+        self.snapshot_path = os.path.join(directory, 'snapshot.json')
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self.logger = logging.getLogger(__name__)
+
+        self.statistics: Optional[Statistics] = None
+        self._file = None
+        self._last_sync = 0.0
+        self._dirty = False
+        self._appended = 0
+
+    def recover(self, statistics: Statistics, resume: bool = True) -> int:
+        """从快照和日志恢复统计，然后开始记录之后的每一局
+
+        Args:
+            statistics: 要恢复到的统计对象（应为新创建的）
+            resume: 上次未正常停止时是否接着累计
+
+        Returns:
+            恢复的局数
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self.statistics = statistics
+
+        snapshot = self._load_snapshot()
+        restored = 0
+        if resume and snapshot is not None and not snapshot.get('closed', False):
+            statistics.restore_snapshot(snapshot['statistics'])
+            replayed = self._replay(statistics)
+            statistics.resume_clock()
+            restored = statistics.total_runs
+            self.logger.info(f"从统计快照和日志恢复 {restored} 局 (日志 {replayed} 局)")
+        else:
+            # 上次正常停止（或不恢复），从零开始
+            self._truncate_journal()
+
+        # 写入新快照后再打开日志，确保日志中的序号都在快照之后
+        self.compact()
+        statistics.add_listener(self.append)
+        return restored
+
+    def _load_snapshot(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.snapshot_path):
+            return None
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            if snapshot.get('version') != SNAPSHOT_VERSION:
+                self.logger.warning(f"统计快照版本不兼容: {snapshot.get('version')}，忽略")
+                return None
+            return snapshot
+        except Exception as e:
+            self.logger.error(f"读取统计快照失败: {e}")
+            return None
+
+    def _replay(self, statistics: Statistics) -> int:
+        """把日志中快照之后的局重新计入统计"""
+        if not os.path.exists(self.journal_path):
+            return 0
+        replayed = 0
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # 崩溃时最后一行可能只写了一半
+                    self.logger.warning(f"统计日志第{line_no}行不完整，已跳过")
+                    continue
+                if entry['seq'] <= statistics.total_runs:
+                    continue
+                statistics.add_record(entry['record'], notify=False)
+                replayed += 1
+        return replayed
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """统计监听器：追加一局记录"""
+        if self._file is None:
+            self._file = open(self.journal_path, 'a', encoding='utf-8')
+        entry = {'seq': self.statistics.total_runs, 'record': record}
+        self._file.write(json.dumps(entry, ensure_ascii=False, default=float) + "\n")
+        # 写缓冲中的记录在进程崩溃时会丢失，每局都flush，只有fsync按间隔批量进行
+        self._file.flush()
+        self._dirty = True
+        self._appended += 1
+
+        now = time.monotonic()
+        if now - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+        if self.compact_every and self._appended >= self.compact_every:
+            self.compact()
+
+    def sync(self) -> None:
+        """把已追加的记录刷到磁盘"""
+        if self._file is not None and self._dirty:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._dirty = False
+        self._last_sync = time.monotonic()
+
+    def compact(self, closed: bool = False) -> None:
+        """把当前统计写成快照并清空日志
+
+        先原子替换快照再截断日志：两步之间崩溃时，日志中的行序号不大于快照，恢复时会被跳过。
+        """
+        if self.statistics is None:
+            return
+        snapshot = {
+            'version': SNAPSHOT_VERSION,
+            'closed': closed,
+            'statistics': self.statistics.to_snapshot(),
+        }
+        tmp_path = self.snapshot_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False, default=float)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            self._truncate_journal()
+            self._appended = 0
+        except Exception as e:
+            self.logger.error(f"压缩统计日志失败: {e}")
+
+    def _truncate_journal(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        with open(self.journal_path, 'w', encoding='utf-8') as f:
+            f.flush()
+            os.fsync(f.fileno())
+        self._dirty = False
+
+    def close(self) -> None:
+        """正常停止：写入 closed 快照，下次启动不再恢复"""
+        self.sync()
+        self.compact(closed=True)
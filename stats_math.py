@@ -0,0 +1,212 @@
+"""
+统计检验工具
+置信区间和显著性检验（只依赖标准库），用于比较不同配置的效率
+"""
+import math
+from typing import Dict, Sequence, Tuple
+
+
+Z_95 = 1.959963984540054
+
+
+def normal_cdf(x: float) -> float:
+    """标准正态分布函数"""
+    return 0.5 * (1.0 + math.erf(x / math.sqrt(2.0)))
+
+
+def normal_two_sided_p(z: float) -> float:
+    """正态检验的双侧p值"""
+    return 2.0 * (1.0 - normal_cdf(abs(z)))
+
+
+def mean_and_stdev(values: Sequence[float]) -> Tuple[float, float]:
+    """样本均值和标准差"""
+    n = len(values)
+    if n == 0:
+        return 0.0, 0.0
+    mean = sum(values) / n
+    if n < 2:
+        return mean, 0.0
+    variance = sum((v - mean) ** 2 for v in values) / (n - 1)
+    return mean, math.sqrt(variance)
+
+
+def mean_interval(values: Sequence[float], z: float = Z_95) -> Tuple[float, float]:
+    """均值的正态近似置信区间"""
+    n = len(values)
+    mean, stdev = mean_and_stdev(values)
+    if n < 2:
+        return mean, mean
+    half = z * stdev / math.sqrt(n)
+    return mean - half, mean + half
+
+
+def wilson_interval(successes: int, trials: int, z: float = Z_95) -> Tuple[float, float]:
+    """比例的Wilson置信区间（样本少或比例接近0/1时比正态近似可靠）"""
+    if trials == 0:
+        return 0.0, 1.0
+    p = successes / trials
+    denom = 1 + z * z / trials
+    center = (p + z * z / (2 * trials)) / denom
+    half = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denom
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+def _chi2_cdf_even(x: float, dof: int) -> float:
+    """偶数自由度卡方分布函数（与泊松分布的关系，精确值）"""
+    half = x / 2.0
+    term = math.exp(-half)
+    total = term
+    for i in range(1, dof // 2):
+        term *= half / i
+        total += term
+    return 1.0 - total
+
+
+def _chi2_quantile(p: float, dof: float) -> float:
+    """卡方分布分位数
+
+    偶数自由度（泊松区间总是如此）对分布函数二分求精确值，
+    其他情况使用Wilson-Hilferty近似。
+    """
+    if dof <= 0:
+        return 0.0
+    if dof == int(dof) and int(dof) % 2 == 0 and dof <= 1000:
+        lo, hi = 0.0, dof + 20.0 * math.sqrt(dof) + 20.0
+        for _ in range(100):
+            mid = (lo + hi) / 2
+            if _chi2_cdf_even(mid, int(dof)) < p:
+                lo = mid
+            else:
+                hi = mid
+        return (lo + hi) / 2
+    # 正态分位数：对分布函数二分求解
+    lo, hi = -10.0, 10.0
+    for _ in range(80):
+        mid = (lo + hi) / 2
+        if normal_cdf(mid) < p:
+            lo = mid
+        else:
+            hi = mid
+    z = (lo + hi) / 2
+    k = 2.0 / (9.0 * dof)
+    return max(0.0, dof * (1 - k + z * math.sqrt(k)) ** 3)
+
+
+def poisson_interval(count: int, exposure: float = 1.0, confidence: float = 0.95) -> Tuple[float, float]:
+    """泊松计数的置信区间（卡方法），适合稀有掉落
+
+    Args:
+        count: 观测到的次数
+        exposure: 暴露量（如小时数或局数），返回的是速率区间
+        confidence: 置信水平
+    """
+    if exposure <= 0:
+        return 0.0, 0.0
+    alpha = 1 - confidence
+    lower = 0.0 if count == 0 else _chi2_quantile(alpha / 2, 2 * count) / 2
+    upper = _chi2_quantile(1 - alpha / 2, 2 * count + 2) / 2
+    return lower / exposure, upper / exposure
+
+
+def _betacf(a: float, b: float, x: float) -> float:
+    """不完全Beta函数的连分式展开"""
+    tiny = 1e-300
+    qab, qap, qam = a + b, a + 1.0, a - 1.0
+    c, d = 1.0, 1.0 - qab * x / qap
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, 200):
+        m2 = 2 * m
+        aa = m * (b - m) * x / ((qam + m2) * (a + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / (d if abs(d) > tiny else tiny)
+        c = 1.0 + aa / c
+        c = c if abs(c) > tiny else tiny
+        h *= d * c
+        aa = -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / (d if abs(d) > tiny else tiny)
+        c = 1.0 + aa / c
+        c = c if abs(c) > tiny else tiny
+        delta = d * c
+        h *= delta
+        if abs(delta - 1.0) < 1e-12:
+            break
+    return h
+
+
+def _incomplete_beta(a: float, b: float, x: float) -> float:
+    """正则化不完全Beta函数 I_x(a, b)"""
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    ln_front = (math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b)
+                + a * math.log(x) + b * math.log(1 - x))
+    front = math.exp(ln_front)
+    if x < (a + 1) / (a + b + 2):
+        return front * _betacf(a, b, x) / a
+    return 1.0 - front * _betacf(b, a, 1 - x) / b
+
+
+def student_t_two_sided_p(t: float, dof: float) -> float:
+    """t分布的双侧p值"""
+    if dof <= 0 or math.isnan(t):
+        return 1.0
+    return _incomplete_beta(dof / 2, 0.5, dof / (dof + t * t))
+
+
+def welch_t_test(a: Sequence[float], b: Sequence[float]) -> Dict[str, float]:
+    """Welch t检验（不假设方差相等）
+
+    Returns:
+        {diff, t, dof, p}，diff = mean(b) - mean(a)
+    """
+    n1, n2 = len(a), len(b)
+    mean1, sd1 = mean_and_stdev(a)
+    mean2, sd2 = mean_and_stdev(b)
+    diff = mean2 - mean1
+    if n1 < 2 or n2 < 2:
+        return {'diff': diff, 't': 0.0, 'dof': 0.0, 'p': 1.0}
+
+    v1, v2 = sd1 * sd1 / n1, sd2 * sd2 / n2
+    if v1 + v2 == 0:
+        return {'diff': diff, 't': 0.0, 'dof': float(n1 + n2 - 2), 'p': 1.0 if diff == 0 else 0.0}
+
+    t = diff / math.sqrt(v1 + v2)
+    dof = (v1 + v2) ** 2 / (v1 * v1 / (n1 - 1) + v2 * v2 / (n2 - 1))
+    return {'diff': diff, 't': t, 'dof': dof, 'p': student_t_two_sided_p(t, dof)}
+
+
+def two_proportion_test(x1: int, n1: int, x2: int, n2: int) -> Dict[str, float]:
+    """两比例z检验
+
+    Returns:
+        {diff, z, p}，diff = x2/n2 - x1/n1
+    """
+    if n1 == 0 or n2 == 0:
+        return {'diff': 0.0, 'z': 0.0, 'p': 1.0}
+    p1, p2 = x1 / n1, x2 / n2
+    pooled = (x1 + x2) / (n1 + n2)
+    se = math.sqrt(pooled * (1 - pooled) * (1 / n1 + 1 / n2))
+    if se == 0:
+        return {'diff': p2 - p1, 'z': 0.0, 'p': 1.0}
+    z = (p2 - p1) / se
+    return {'diff': p2 - p1, 'z': z, 'p': normal_two_sided_p(z)}
+
+
+def poisson_rate_test(count1: int, exposure1: float, count2: int, exposure2: float) -> Dict[str, float]:
+    """两个泊松速率的比较（正态近似）
+
+    Returns:
+        {diff, z, p}，diff = rate2 - rate1
+    """
+    if exposure1 <= 0 or exposure2 <= 0:
+        return {'diff': 0.0, 'z': 0.0, 'p': 1.0}
+    rate1, rate2 = count1 / exposure1, count2 / exposure2
+    se = math.sqrt(rate1 / exposure1 + rate2 / exposure2)
+    if se == 0:
+        return {'diff': rate2 - rate1, 'z': 0.0, 'p': 1.0}
+    z = (rate2 - rate1) / se
+    return {'diff': rate2 - rate1, 'z': z, 'p': normal_two_sided_p(z)}
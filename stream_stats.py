@@ -0,0 +1,360 @@
+"""
+流式统计
+固定大小的环形缓冲区和增量聚合（均值/方差、最值、P²分位数），
+每次更新和查询都是O(1)，长时间运行（10万局以上）时内存和耗时不随局数增长
+"""
+import math
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+
+class RingBuffer:
+    """基于numpy数组的定长环形缓冲区，写满后覆盖最旧的数据"""
+
+    def __init__(self, capacity: int, dtype=np.float64):
+        if capacity <= 0:
+            raise ValueError("capacity 必须大于0")
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=dtype)
+        self._start = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, value: float) -> None:
+        end = (self._start + self._size) % self.capacity
+        self._data[end] = value
+        if self._size < self.capacity:
+            self._size += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+
+    def to_array(self) -> np.ndarray:
+        """按时间顺序返回数据副本（最旧的在前）"""
+        if self._start + self._size <= self.capacity:
+            return self._data[self._start:self._start + self._size].copy()
+        return np.concatenate((self._data[self._start:], self._data[:(self._start + self._size) % self.capacity]))
+
+    def last(self, n: int) -> np.ndarray:
+        """最近n个值（按时间顺序）"""
+        n = min(n, self._size)
+        if n <= 0:
+            return self._data[:0].copy()
+        end = (self._start + self._size) % self.capacity
+        idx = (np.arange(end - n, end)) % self.capacity
+        return self._data[idx]
+
+    def __iter__(self):
+        return iter(self.to_array().tolist())
+
+
+class RunningStats:
+    """Welford算法的增量均值和方差，以及最小值、最大值和总和"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def to_state(self) -> Dict[str, float]:
+        """导出内部状态（可JSON序列化）"""
+        return {'count': self.count, 'mean': self.mean, 'm2': self._m2, 'total': self.total,
+                'min': self.min if self.count else None, 'max': self.max if self.count else None}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, float]) -> 'RunningStats':
+        stats = cls()
+        stats.count = state['count']
+        stats.mean = state['mean']
+        stats._m2 = state['m2']
+        stats.total = state['total']
+        if stats.count:
+            stats.min, stats.max = state['min'], state['max']
+        return stats
+
+    @property
+    def variance(self) -> float:
+        """样本方差"""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stdev(self) -> float:
+        return math.sqrt(self.variance)
+
+
+class P2Quantile:
+    """P²算法（Jain & Chlamtac）的单个分位数估计，只保存5个标记点
+
+    前5个样本精确计算，之后按抛物线插值调整标记点高度。
+    """
+
+    def __init__(self, q: float):
+        """
+        Args:
+            q: 分位数 (0-1)
+        """
+        if not 0 < q < 1:
+            raise ValueError("q 必须在0和1之间")
+        self.q = q
+        self.count = 0
+        self._heights: List[float] = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+        self._increments = [0, q / 2, q, (1 + q) / 2, 1]
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        heights = self._heights
+        if self.count <= 5:
+            heights.append(value)
+            heights.sort()
+            return
+
+        # 找到新样本所在的区间并更新端点
+        if value < heights[0]:
+            heights[0] = value
+            k = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            k = 3
+        else:
+            k = 0
+            while value >= heights[k + 1]:
+                k += 1
+
+        positions = self._positions
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # 调整中间三个标记点
+        for i in range(1, 4):
+            d = self._desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or \
+                    (d <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if d > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = self._linear(i, step)
+                heights[i] = height
+                positions[i] += step
+
+    def to_state(self) -> Dict[str, Any]:
+        """导出内部状态（可JSON序列化）"""
+        return {'q': self.q, 'count': self.count, 'heights': list(self._heights),
+                'positions': list(self._positions), 'desired': list(self._desired)}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> 'P2Quantile':
+        estimator = cls(state['q'])
+        estimator.count = state['count']
+        estimator._heights = list(state['heights'])
+        estimator._positions = list(state['positions'])
+        estimator._desired = list(state['desired'])
+        return estimator
+
+    def _parabolic(self, i: int, d: int) -> float:
+        h, n = self._heights, self._positions
+        return h[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def _linear(self, i: int, d: int) -> float:
+        h, n = self._heights, self._positions
+        return h[i] + d * (h[i + d] - h[i]) / (n[i + d] - n[i])
+
+    def value(self) -> float:
+        """当前分位数估计"""
+        if self.count == 0:
+            return 0.0
+        if self.count <= 5:
+            # 样本不足5个时线性插值
+            values = self._heights
+            pos = (len(values) - 1) * self.q
+            lower = int(pos)
+            upper = min(lower + 1, len(values) - 1)
+            return values[lower] + (values[upper] - values[lower]) * (pos - lower)
+        return self._heights[2]
+
+
+class StreamingSummary:
+    """一组数值的流式摘要：均值、方差、最值和若干分位数"""
+
+    def __init__(self, quantiles: Sequence[float] = (0.5, 0.9, 0.99)):
+        self.stats = RunningStats()
+        self._quantiles = {q: P2Quantile(q) for q in quantiles}
+
+    @property
+    def count(self) -> int:
+        return self.stats.count
+
+    def add(self, value: float) -> None:
+        self.stats.add(value)
+        for estimator in self._quantiles.values():
+            estimator.add(value)
+
+    def to_state(self) -> Dict[str, Any]:
+        """导出内部状态（可JSON序列化）"""
+        return {'stats': self.stats.to_state(),
+                'quantiles': [estimator.to_state() for estimator in self._quantiles.values()]}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> 'StreamingSummary':
+        summary = cls(quantiles=())
+        summary.stats = RunningStats.from_state(state['stats'])
+        for quantile_state in state['quantiles']:
+            estimator = P2Quantile.from_state(quantile_state)
+            summary._quantiles[estimator.q] = estimator
+        return summary
+
+    def quantile(self, q: float) -> float:
+        """分位数估计（q必须是创建时指定的分位数之一）"""
+        return self._quantiles[q].value()
+
+    def to_dict(self) -> Dict[str, float]:
+        """{count, mean, stdev, min, max, total, p50, p90, ...}"""
+        result = {
+            'count': self.stats.count,
+            'mean': self.stats.mean,
+            'stdev': self.stats.stdev,
+            'min': self.stats.min if self.stats.count else 0.0,
+            'max': self.stats.max if self.stats.count else 0.0,
+            'total': self.stats.total,
+        }
+        for q, estimator in self._quantiles.items():
+            result[f"p{q * 100:g}"] = estimator.value()
+        return result
+
+
+class LatencyHistogram:
+    """对数分桶的延迟直方图（HDR histogram 的简化版）
+
+    以 unit 为最小单位把数值转成整数，小于 2^sub_bucket_bits 的值精确计数，更大的值按2的幂分段，
+    每段再线性分成 2^(sub_bucket_bits-1) 个桶，相对误差不超过 1/2^(sub_bucket_bits-1)（默认约0.8%）。
+    记录是O(1)的整数运算，分位数查询只需一次累加；分桶结构相同的直方图可以直接相加合并。
+    """
+
+    def __init__(self, unit: float = 1e-6, highest: float = 3600.0, sub_bucket_bits: int = 8):
+        """
+        Args:
+            unit: 最小分辨率（秒），默认1微秒
+            highest: 可区分的最大值（秒），更大的值计入最后一个桶
+            sub_bucket_bits: 每段的分桶精度（位数）
+        """
+        self.unit = unit
+        self.highest = highest
+        self.sub_bucket_bits = sub_bucket_bits
+        self._sub_count = 1 << sub_bucket_bits
+        self._half = self._sub_count >> 1
+        self._max_raw = max(int(highest / unit), 1)
+        # 单次记录只增加一个计数，Python列表比numpy数组的标量写入快得多
+        self.counts: List[int] = [0] * (self._index(self._max_raw) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, raw: int) -> int:
+        if raw < self._sub_count:
+            return raw
+        shift = raw.bit_length() - self.sub_bucket_bits
+        return self._sub_count + (shift - 1) * self._half + ((raw >> shift) - self._half)
+
+    def _bucket_range(self, index: int):
+        """桶覆盖的整数范围 [low, high)"""
+        if index < self._sub_count:
+            return index, index + 1
+        shift = (index - self._sub_count) // self._half + 1
+        mantissa = (index - self._sub_count) % self._half + self._half
+        return mantissa << shift, (mantissa + 1) << shift
+
+    def record(self, value: float) -> None:
+        """记录一个数值（秒）"""
+        raw = min(max(int(value / self.unit), 0), self._max_raw)
+        self.counts[self._index(raw)] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def value_at_percentile(self, percentile: float) -> float:
+        """分位数（percentile 取 0-100），返回所在桶的中点，并限制在最小值和最大值之间"""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(percentile / 100 * self.count))
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        low, high = self._bucket_range(index)
+        value = (low + high - 1) / 2 * self.unit
+        return min(max(value, self.min), self.max)
+
+    def percentiles(self, percentiles: Sequence[float] = (50, 90, 99, 99.9)) -> Dict[str, float]:
+        """多个分位数 {p50, p90, p99, p99.9, ...}，共用一次累加"""
+        if not self.count:
+            return {f"p{p:g}": 0.0 for p in percentiles}
+        cumulative = np.cumsum(self.counts)
+        result = {}
+        for p in percentiles:
+            rank = max(1, math.ceil(p / 100 * self.count))
+            low, high = self._bucket_range(int(np.searchsorted(cumulative, rank)))
+            result[f"p{p:g}"] = min(max((low + high - 1) / 2 * self.unit, self.min), self.max)
+        return result
+
+    def _compatible(self, other: 'LatencyHistogram') -> bool:
+        return (self.unit, self.highest, self.sub_bucket_bits) == (other.unit, other.highest, other.sub_bucket_bits)
+
+    def merge(self, other: 'LatencyHistogram') -> 'LatencyHistogram':
+        """把另一个直方图（其他线程、进程或会话）累加进来"""
+        if not self._compatible(other):
+            raise ValueError("直方图分桶参数不同，无法合并")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def copy(self) -> 'LatencyHistogram':
+        return LatencyHistogram(self.unit, self.highest, self.sub_bucket_bits).merge(self)
+
+    def to_state(self) -> Dict[str, Any]:
+        """导出内部状态（可JSON序列化，只保存非零桶）"""
+        nonzero = [index for index, count in enumerate(self.counts) if count]
+        return {'unit': self.unit, 'highest': self.highest, 'sub_bucket_bits': self.sub_bucket_bits,
+                'count': self.count, 'total': self.total,
+                'min': self.min if self.count else None, 'max': self.max if self.count else None,
+                'buckets': [[index, self.counts[index]] for index in nonzero]}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> 'LatencyHistogram':
+        histogram = cls(state['unit'], state['highest'], state['sub_bucket_bits'])
+        for index, count in state['buckets']:
+            histogram.counts[index] = count
+        histogram.count = state['count']
+        histogram.total = state['total']
+        histogram.min = state['min'] if state['min'] is not None else math.inf
+        histogram.max = state['max'] if state['max'] is not None else -math.inf
+        return histogram
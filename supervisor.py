@@ -0,0 +1,399 @@
+"""
+多实例监控程序
+在独立进程中同时运行多个机器人（每个配置文件或游戏窗口一个），
+崩溃后按退避时间自动重启，并通过共享队列汇总所有实例的统计数据
+
+用法:
+    python supervisor.py --config pindle_a.json --config pindle_b.json
+    python supervisor.py --window "Diablo II: Resurrected 1" --window "Diablo II: Resurrected 2"
+    python supervisor.py --dummy 3 --runs 20        # 使用模拟实例测试监控程序本身
+"""
+import argparse
+import importlib
+import logging
+import multiprocessing
+import queue
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from logger_config import LoggerConfig
+from performance_monitor import format_latency_comparison
+from statistics import Statistics
+from stream_stats import LatencyHistogram
+
+
+@dataclass
+class WorkerSpec:
+    """一个机器人实例的启动参数"""
+    name: str
+    config_path: str = 'config.json'
+    window_title: Optional[str] = None
+    options: Dict[str, Any] = field(default_factory=dict)
+
+
+# 实例函数签名: worker(spec, events, stop_event)
+# events 队列中的消息: {'worker': 名称, 'type': 'run' | 'started' | 'latency', 'record': {...}}
+# 'latency' 在实例结束时发送，'histograms' 为各操作延迟直方图的状态
+WorkerFunc = Callable[[WorkerSpec, Any, Any], None]
+
+
+def run_bot_worker(spec: WorkerSpec, events, stop_event) -> None:
+    """真实机器人实例（跳过交互确认，直接开始）"""
+    import threading
+    from game_bot import D2PindleBot
+
+    # 每个实例写自己的统计文件和调优参数文件，避免多个进程互相覆盖
+    bot = D2PindleBot(spec.config_path, session_name=spec.name,
+                      stats_file=f"run_statistics_{spec.name}.txt",
+                      tuner_state_file=f"timing_tuner_{spec.name}.json")
+    if spec.window_title:
+        bot.window_controller.window_title = spec.window_title
+
+    bot.statistics.add_listener(
+        lambda record: events.put({'worker': spec.name, 'type': 'run', 'record': record})
+    )
+
+    def watch_stop():
+        stop_event.wait()
+        bot.is_running = False
+
+    threading.Thread(target=watch_stop, name="StopWatcher", daemon=True).start()
+    events.put({'worker': spec.name, 'type': 'started'})
+    bot.start()
+    events.put({'worker': spec.name, 'type': 'latency',
+                'histograms': bot.performance_monitor.get_latency_state()})
+
+
+def run_dummy_worker(spec: WorkerSpec, events, stop_event) -> None:
+    """模拟实例：不操作游戏，只按配置的概率生成假的运行结果
+
+    options:
+        runs: 运行局数（默认无限）
+        run_time: 平均单局时间（秒）
+        failure_rate: 单局失败概率
+        crash_rate: 每局后进程崩溃的概率（用于测试自动重启）
+    """
+    options = spec.options
+    runs = options.get('runs', 0)
+    run_time = options.get('run_time', 0.5)
+    failure_rate = options.get('failure_rate', 0.05)
+    crash_rate = options.get('crash_rate', 0.0)
+    rng = random.Random()
+
+    events.put({'worker': spec.name, 'type': 'started'})
+    count = 0
+    while not stop_event.is_set() and (runs <= 0 or count < runs):
+        duration = rng.uniform(run_time * 0.7, run_time * 1.3)
+        if stop_event.wait(duration):
+            break
+
+        success = rng.random() >= failure_rate
+        items = {
+            'unique': int(rng.random() < 0.3),
+            'rune': int(rng.random() < 0.1),
+            'set': 0,
+            'rare': 0
+        } if success else {}
+        events.put({'worker': spec.name, 'type': 'run', 'record': {
+            'timestamp': time.time(),
+            'duration': duration,
+            'success': success,
+            'items': items
+        }})
+        count += 1
+
+        if rng.random() < crash_rate:
+            raise RuntimeError(f"{spec.name} 模拟崩溃")
+
+
+WORKER_TYPES: Dict[str, WorkerFunc] = {
+    'bot': run_bot_worker,
+    'dummy': run_dummy_worker,
+}
+
+
+def resolve_worker(name: str) -> WorkerFunc:
+    """按名称或 "模块:函数" 获取实例函数"""
+    if name in WORKER_TYPES:
+        return WORKER_TYPES[name]
+    module_name, _, func_name = name.partition(':')
+    if not func_name:
+        raise ValueError(f"未知的实例类型: {name}")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def _worker_entry(worker: WorkerFunc, spec: WorkerSpec, events, stop_event) -> None:
+    """子进程入口"""
+    try:
+        worker(spec, events, stop_event)
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        logging.getLogger("Supervisor").error(f"实例 {spec.name} 异常退出: {e}", exc_info=True)
+        sys.exit(1)
+
+
+class _WorkerHandle:
+    """监控程序中一个实例的状态"""
+
+    def __init__(self, spec: WorkerSpec):
+        self.spec = spec
+        self.process: Optional[multiprocessing.Process] = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.consecutive_crashes = 0
+        self.next_start_at = 0.0
+        self.finished = False
+        self.statistics = Statistics()
+        self.latency: Dict[str, LatencyHistogram] = {}
+
+
+class Supervisor:
+    """多实例监控器"""
+
+    def __init__(self,
+                 specs: List[WorkerSpec],
+                 worker: WorkerFunc = run_bot_worker,
+                 backoff_base: float = 2.0,
+                 backoff_max: float = 120.0,
+                 stable_after: float = 300.0,
+                 max_restarts: int = 0,
+                 report_interval: float = 300.0,
+                 metrics_port: int = 0):
+        """
+        Args:
+            specs: 实例列表
+            worker: 实例函数（需可被子进程导入）
+            backoff_base: 首次重启等待时间（秒），之后每次连续崩溃翻倍
+            backoff_max: 最长重启等待时间（秒）
+            stable_after: 运行超过该时间后的崩溃不计入连续崩溃次数
+            max_restarts: 单个实例最大重启次数，0表示不限
+            report_interval: 汇总报告间隔（秒）
+            metrics_port: 汇总指标的HTTP端口（Prometheus格式），0表示不启动
+        """
+        self.logger = logging.getLogger("Supervisor")
+        self.worker = worker
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self.max_restarts = max_restarts
+        self.report_interval = report_interval
+
+        # 使用spawn，与Windows行为一致
+        self._ctx = multiprocessing.get_context('spawn')
+        self.events = self._ctx.Queue()
+        self.stop_event = self._ctx.Event()
+
+        self.workers: Dict[str, _WorkerHandle] = {spec.name: _WorkerHandle(spec) for spec in specs}
+        self.combined = Statistics()
+
+        self.metrics_server = None
+        if metrics_port:
+            from metrics_server import MetricsCollector, MetricsServer
+            self.metrics_server = MetricsServer(MetricsCollector(self.combined), port=metrics_port)
+
+    def _start_worker(self, handle: _WorkerHandle) -> None:
+        handle.process = self._ctx.Process(
+            target=_worker_entry,
+            args=(self.worker, handle.spec, self.events, self.stop_event),
+            name=f"worker-{handle.spec.name}",
+            daemon=False
+        )
+        handle.process.start()
+        handle.started_at = time.time()
+        self.logger.info(f"已启动实例 {handle.spec.name} (pid={handle.process.pid})")
+
+    def _check_worker(self, handle: _WorkerHandle, now: float) -> None:
+        process = handle.process
+        if handle.finished:
+            return
+
+        if process is None:
+            if now >= handle.next_start_at:
+                self._start_worker(handle)
+            return
+
+        if process.is_alive():
+            return
+
+        exitcode = process.exitcode
+        process.join()
+        handle.process = None
+
+        if exitcode == 0:
+            handle.finished = True
+            self.logger.info(f"实例 {handle.spec.name} 已完成")
+            return
+
+        if self.max_restarts and handle.restarts >= self.max_restarts:
+            handle.finished = True
+            self.logger.error(f"实例 {handle.spec.name} 已达到最大重启次数，不再重启")
+            return
+
+        if now - handle.started_at >= self.stable_after:
+            handle.consecutive_crashes = 0
+        handle.consecutive_crashes += 1
+        handle.restarts += 1
+
+        delay = min(self.backoff_base * 2 ** (handle.consecutive_crashes - 1), self.backoff_max)
+        handle.next_start_at = now + delay
+        self.logger.warning(f"实例 {handle.spec.name} 崩溃 (退出码 {exitcode})，"
+                            f"{delay:.1f}秒后第{handle.restarts}次重启")
+
+    def _drain_events(self, timeout: float) -> None:
+        try:
+            event = self.events.get(timeout=timeout)
+        except queue.Empty:
+            return
+
+        while True:
+            handle = self.workers.get(event.get('worker'))
+            if handle and event.get('type') == 'run':
+                record = event['record']
+                handle.statistics.add_record(record)
+                self.combined.add_record(dict(record, worker=handle.spec.name))
+            elif handle and event.get('type') == 'latency':
+                # 重启后的实例重新计数，累加到之前的结果上
+                for name, state in event['histograms'].items():
+                    histogram = LatencyHistogram.from_state(state)
+                    if name in handle.latency:
+                        handle.latency[name].merge(histogram)
+                    else:
+                        handle.latency[name] = histogram
+
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                return
+
+    def get_report(self) -> str:
+        """汇总报告：总体统计加每个实例的简短状态"""
+        lines = [self.combined.get_report(detailed=True), "各实例状态:"]
+        for name, handle in self.workers.items():
+            if handle.finished:
+                state = "已结束"
+            elif handle.process is not None:
+                state = "运行中"
+            else:
+                state = "等待重启"
+            lines.append(f"- {name} [{state}, 重启{handle.restarts}次] {handle.statistics.get_short_status()}")
+
+        sessions = {name: handle.latency for name, handle in self.workers.items() if handle.latency}
+        if sessions:
+            lines.append("操作延迟 (已结束的实例):")
+            lines.append(format_latency_comparison(sessions))
+        return "\n".join(lines)
+
+    def run(self) -> None:
+        """运行直到所有实例结束或收到 Ctrl+C"""
+        self.logger.info(f"启动 {len(self.workers)} 个实例")
+        if self.metrics_server is not None:
+            self.metrics_server.start()
+        last_report = time.time()
+        try:
+            while not all(handle.finished for handle in self.workers.values()):
+                now = time.time()
+                for handle in self.workers.values():
+                    self._check_worker(handle, now)
+
+                self._drain_events(timeout=0.5)
+
+                if now - last_report >= self.report_interval:
+                    last_report = now
+                    self.logger.info(self.get_report())
+        except KeyboardInterrupt:
+            self.logger.info("用户中断，正在停止所有实例...")
+        finally:
+            self.stop()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """通知所有实例停止，超时后强制结束"""
+        self.stop_event.set()
+        deadline = time.time() + timeout
+        for handle in self.workers.values():
+            if handle.process is None:
+                continue
+            handle.process.join(timeout=max(0.0, deadline - time.time()))
+            if handle.process.is_alive():
+                self.logger.warning(f"实例 {handle.spec.name} 未响应，强制结束")
+                handle.process.terminate()
+                handle.process.join()
+            handle.process = None
+
+        self._drain_events(timeout=0.1)
+        self.logger.info(self.get_report())
+        self.combined.save_to_file("supervisor_statistics.txt")
+        self.logger.info("汇总统计已保存到 supervisor_statistics.txt")
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+
+
+def build_specs(args) -> List[WorkerSpec]:
+    """根据命令行参数生成实例列表"""
+    if args.dummy:
+        options = {
+            'runs': args.runs,
+            'run_time': args.dummy_run_time,
+            'failure_rate': args.dummy_failure_rate,
+            'crash_rate': args.dummy_crash_rate
+        }
+        return [WorkerSpec(name=f"dummy{i + 1}", options=options) for i in range(args.dummy)]
+
+    configs = args.config or []
+    windows = args.window or []
+    if configs and windows and len(configs) != len(windows):
+        raise ValueError("--config 和 --window 数量必须一致")
+
+    count = max(len(configs), len(windows))
+    specs = []
+    for i in range(count):
+        specs.append(WorkerSpec(
+            name=f"bot{i + 1}",
+            config_path=configs[i] if configs else 'config.json',
+            window_title=windows[i] if windows else None
+        ))
+    return specs
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="多实例监控程序")
+    parser.add_argument('--config', action='append', help='实例配置文件（可重复）')
+    parser.add_argument('--window', action='append', help='实例游戏窗口标题（可重复）')
+    parser.add_argument('--worker', default=None, help='实例类型: bot / dummy / 模块:函数')
+    parser.add_argument('--dummy', type=int, default=0, help='启动N个模拟实例')
+    parser.add_argument('--runs', type=int, default=0, help='模拟实例运行局数，0表示不限')
+    parser.add_argument('--dummy-run-time', type=float, default=0.5, help='模拟实例平均单局时间')
+    parser.add_argument('--dummy-failure-rate', type=float, default=0.05, help='模拟实例失败率')
+    parser.add_argument('--dummy-crash-rate', type=float, default=0.0, help='模拟实例每局崩溃概率')
+    parser.add_argument('--backoff', type=float, default=2.0, help='首次重启等待时间（秒）')
+    parser.add_argument('--max-restarts', type=int, default=0, help='单实例最大重启次数，0表示不限')
+    parser.add_argument('--report-interval', type=float, default=300.0, help='汇总报告间隔（秒）')
+    parser.add_argument('--metrics-port', type=int, default=0, help='汇总指标HTTP端口（Prometheus格式）')
+    args = parser.parse_args(argv)
+
+    LoggerConfig.setup_logger("Supervisor", level=logging.INFO,
+                              log_file=f"logs/supervisor_{datetime.now():%Y%m%d_%H%M%S}.log")
+
+    specs = build_specs(args)
+    if not specs:
+        parser.error("请至少指定一个 --config、--window 或 --dummy")
+
+    worker_name = args.worker or ('dummy' if args.dummy else 'bot')
+    supervisor = Supervisor(
+        specs,
+        worker=resolve_worker(worker_name),
+        backoff_base=args.backoff,
+        max_restarts=args.max_restarts,
+        report_interval=args.report_interval,
+        metrics_port=args.metrics_port
+    )
+    supervisor.run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+测试基准回退判定
+相同的输入不报告回退；只有变慢超过容差且两组进程的结果不重叠时才判为回退
+
+    python -m pytest test_benchmark.py
+"""
+import unicodedata
+
+import pytest
+
+from benchmark import compare, format_table, summarize_processes
+
+
+def _results(**runs):
+    return {name: summarize_processes(values) for name, values in runs.items()}
+
+
+def test_identical_inputs_are_unchanged():
+    results = _results(detect=[0.0101, 0.0098, 0.0120, 0.0105, 0.0099],
+                       probe=[2.1e-6, 2.0e-6, 2.4e-6])
+    rows = compare(results, results, threshold=0.05)
+
+    assert [row['name'] for row in rows] == ['detect', 'probe']
+    for row in rows:
+        assert row['status'] == '持平'
+        assert row['delta'] == 0.0
+        assert row['base'] == row['current']
+
+
+def test_tolerance_uses_spread_between_processes():
+    summary = summarize_processes([0.9, 1.0, 1.2])
+    assert summary['median'] == 1.0
+    assert (summary['min'], summary['max']) == (0.9, 1.2)
+    assert summary['spread'] == pytest.approx(0.3)
+
+    # 中位数慢了20%，但在进程间波动范围内
+    baseline = _results(detect=[0.9, 1.0, 1.2])
+    current = _results(detect=[1.1, 1.2, 1.3])
+    row = compare(baseline, current, threshold=0.05)[0]
+    assert row['tolerance'] == pytest.approx(0.3)
+    assert row['status'] == '持平'
+
+
+def test_separated_slowdown_is_regression():
+    baseline = _results(detect=[1.00, 1.01, 1.02, 0.99, 1.00])
+    current = _results(detect=[1.50, 1.52, 1.49, 1.51, 1.50])
+    row = compare(baseline, current, threshold=0.05)[0]
+    assert row['status'] == '回退'
+    assert row['delta'] == pytest.approx(0.5)
+
+    # 反过来比较即为变快
+    assert compare(current, baseline, threshold=0.05)[0]['status'] == '变快'
+
+
+def test_overlapping_runs_are_not_regression():
+    # 中位数超过容差，但本次最快的进程不慢于基线最慢的进程
+    baseline = _results(detect=[1.00, 1.00, 1.00, 1.00, 1.04])
+    current = _results(detect=[1.03, 1.10, 1.10, 1.10, 1.10])
+    row = compare(baseline, current, threshold=0.05)[0]
+    assert row['delta'] > row['tolerance']
+    assert row['status'] == '持平'
+
+
+def test_added_and_missing_benchmarks():
+    baseline = _results(old=[1.0, 1.0])
+    current = _results(new=[1.0, 1.0])
+    rows = {row['name']: row for row in compare(baseline, current, threshold=0.05)}
+    assert rows['new']['status'] == '新增'
+    assert rows['old']['status'] == '未运行'
+    assert rows['new']['delta'] is None
+
+
+def test_table_columns_align():
+    baseline = _results(detect_scan_area=[0.01, 0.011], probe=[2e-6, 2.1e-6])
+    current = _results(detect_scan_area=[0.02, 0.021], probe=[2e-6, 2.1e-6], new_bench=[1.0, 1.0])
+    lines = format_table(compare(baseline, current, threshold=0.05)).splitlines()
+
+    def display_width(text: str) -> int:
+        return sum(2 if unicodedata.east_asian_width(char) in 'WF' else 1 for char in text)
+
+    # 状态列之前的部分显示宽度相同
+    prefix_widths = {display_width(line.rsplit('  ', 1)[0]) for line in lines if not line.startswith('-')}
+    assert len(prefix_widths) == 1
@@ -0,0 +1,122 @@
+"""
+测试运行历史存储
+后台线程的批量写入（攒够 batch_size 条、等待 flush_interval 秒、关闭时写入剩余记录）和各查询函数
+
+    python -m pytest test_run_store.py
+"""
+import time
+
+import pytest
+
+import run_store
+from run_store import RunStore
+
+
+def _record(ended_at: float, duration: float = 30.0, success: bool = True, **extra):
+    record = {'timestamp': ended_at, 'duration': duration, 'success': success,
+              'phases': {'create_game': 5.0, 'kill_pindle': 3.0}}
+    record.update(extra)
+    return record
+
+
+def _wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def _count_runs(path: str) -> int:
+    conn = run_store.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_writes_full_batches_and_rest_on_close(tmp_path):
+    path = str(tmp_path / 'history.db')
+    store = RunStore(path, session_name='test', batch_size=5, flush_interval=60.0)
+    now = time.time()
+    for index in range(12):
+        store.add(_record(now + index))
+
+    # 两批满5条的记录立即写入，剩下2条等待攒批
+    assert _wait_for(lambda: store.written == 10)
+    time.sleep(0.1)
+    assert store.written == 10
+    assert _count_runs(path) == 10
+
+    store.close()
+    assert store.written == 12
+    assert store.dropped == 0
+    assert _count_runs(path) == 12
+
+
+def test_flushes_partial_batch_after_interval(tmp_path):
+    path = str(tmp_path / 'history.db')
+    store = RunStore(path, batch_size=100, flush_interval=0.1)
+    now = time.time()
+    for index in range(3):
+        store.add(_record(now + index))
+
+    assert _wait_for(lambda: store.written == 3)
+    assert _count_runs(path) == 3
+    store.close()
+
+
+def test_drops_queue_overflow_without_blocking(tmp_path):
+    store = RunStore(str(tmp_path / 'history.db'), batch_size=1000, flush_interval=60.0, max_queue=5)
+    # 不启动写线程，队列只进不出
+    store._ensure_started = lambda: None
+    now = time.time()
+    for index in range(8):
+        store.add(_record(now + index))
+    assert store.dropped == 3
+
+
+def test_queries(tmp_path):
+    path = str(tmp_path / 'history.db')
+    store = RunStore(path, session_name='test', batch_size=10, flush_interval=60.0)
+    now = time.time()
+    store.add(_record(now - 3 * 86400, duration=40.0, items={'rune': 1}))
+    store.add(_record(now - 60, duration=20.0, items={'unique': 2, 'rune': 0}))
+    store.add(_record(now - 30, duration=20.0, success=False, timeout_phase='kill_pindle'))
+    store.add(_record(now, duration=20.0, drops=[{'type': 'unique', 'name': 'Harlequin Crest'},
+                                                 {'type': 'rune', 'name': 'Ber'}]))
+    store.close()
+
+    conn = run_store.connect(path)
+    try:
+        summary = run_store.run_summary(conn)
+        assert summary['runs'] == 4
+        assert summary['success_rate'] == pytest.approx(75.0)
+        assert summary['hours'] == pytest.approx(100.0 / 3600)
+        assert summary['runs_per_hour'] == pytest.approx(4 / (100.0 / 3600))
+
+        # 只统计最近一天
+        since = now - 86400
+        recent = run_store.run_summary(conn, since=since)
+        assert recent['runs'] == 3
+        drops = run_store.drops_per_hour(conn, since=since)
+        assert {item_type: stats['count'] for item_type, stats in drops.items()} == {'unique': 3, 'rune': 1}
+        assert drops['unique']['per_hour'] == pytest.approx(3 / (60.0 / 3600))
+
+        # 数量为0的类型不写入
+        assert run_store.drops_per_hour(conn)['rune']['count'] == 2
+
+        assert sorted(run_store.drops_by_name(conn)) == [('rune', 'Ber', 1), ('unique', 'Harlequin Crest', 1)]
+        assert run_store.drops_by_name(conn, item_type='unique') == [('unique', 'Harlequin Crest', 1)]
+
+        assert run_store.phase_averages(conn) == {'create_game': 5.0, 'kill_pindle': 3.0}
+
+        daily = run_store.daily_summary(conn, days=7, item_type='unique')
+        assert sum(row['runs'] for row in daily) == 4
+        assert sum(row['drops'] for row in daily) == 3
+
+        timeouts = conn.execute("SELECT COUNT(*) FROM runs WHERE timeout_phase = 'kill_pindle'").fetchone()[0]
+        assert timeouts == 1
+    finally:
+        conn.close()
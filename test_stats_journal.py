@@ -0,0 +1,106 @@
+"""
+测试统计日志的崩溃恢复
+模拟进程崩溃（不调用 close）、写了一半的最后一行、压缩后的重放和压缩中途崩溃
+
+    python -m pytest test_stats_journal.py
+"""
+import json
+
+from statistics import Statistics
+from stats_journal import StatsJournal
+
+
+def _record(index: int, success: bool = True):
+    return {'duration': 20.0 + index, 'success': success, 'timestamp': 1000.0 + index * 25,
+            'items': {'rune': 1} if index % 2 else {}}
+
+
+def _start(directory, **kwargs):
+    statistics = Statistics()
+    journal = StatsJournal(str(directory), fsync_interval=0.0, **kwargs)
+    restored = journal.recover(statistics)
+    return statistics, journal, restored
+
+
+def _crash(journal: StatsJournal) -> None:
+    """进程崩溃：文件句柄被系统关闭，没有写入 closed 快照"""
+    if journal._file is not None:
+        journal._file.close()
+        journal._file = None
+
+
+def test_recover_after_crash(tmp_path):
+    statistics, journal, restored = _start(tmp_path)
+    assert restored == 0
+    for index in range(5):
+        statistics.add_record(_record(index, success=index != 3))
+    _crash(journal)
+
+    recovered, journal, restored = _start(tmp_path)
+    assert restored == 5
+    assert recovered.total_runs == 5
+    assert recovered.failed_runs == 1
+    assert recovered.items_picked['rune'] == 2
+    assert recovered.get_average_run_time() == statistics.get_average_run_time()
+
+
+def test_recover_skips_truncated_last_line(tmp_path):
+    statistics, journal, _ = _start(tmp_path)
+    for index in range(3):
+        statistics.add_record(_record(index))
+    _crash(journal)
+
+    # 崩溃时第4局的记录只写了一半
+    with open(journal.journal_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'seq': 4, 'record': _record(3)})[:25])
+
+    recovered, _, restored = _start(tmp_path)
+    assert restored == 3
+    assert recovered.total_runs == 3
+
+
+def test_replay_after_compaction(tmp_path):
+    statistics, journal, _ = _start(tmp_path, compact_every=3)
+    for index in range(7):
+        statistics.add_record(_record(index))
+    # 第6局后压缩过一次，日志中只剩最后一局
+    with open(journal.journal_path, 'r', encoding='utf-8') as f:
+        assert len(f.readlines()) == 1
+    _crash(journal)
+
+    recovered, _, restored = _start(tmp_path, compact_every=3)
+    assert restored == 7
+    assert recovered.items_picked['rune'] == 3
+    assert [record['duration'] for record in recovered.run_records] == \
+        [record['duration'] for record in statistics.run_records]
+
+
+def test_crash_between_snapshot_and_truncate(tmp_path):
+    statistics, journal, _ = _start(tmp_path, compact_every=0)
+    for index in range(4):
+        statistics.add_record(_record(index))
+    with open(journal.journal_path, 'r', encoding='utf-8') as f:
+        lines = f.readlines()
+
+    # 快照已替换但日志还没截断：日志中的局都已包含在快照里，不能重复计入
+    journal.compact()
+    with open(journal.journal_path, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+    statistics.add_record(_record(4))
+    _crash(journal)
+
+    recovered, _, restored = _start(tmp_path, compact_every=0)
+    assert restored == 5
+    assert recovered.total_runs == 5
+    assert recovered.items_picked['rune'] == 2
+
+
+def test_clean_close_starts_from_zero(tmp_path):
+    statistics, journal, _ = _start(tmp_path)
+    for index in range(3):
+        statistics.add_record(_record(index))
+    journal.close()
+
+    recovered, _, restored = _start(tmp_path)
+    assert restored == 0
+    assert recovered.total_runs == 0
@@ -0,0 +1,154 @@
+"""
+测试流式统计
+环形缓冲区写满后的顺序，P²分位数估计和延迟直方图与numpy精确值的偏差
+
+    python -m pytest test_stream_stats.py
+"""
+import json
+
+import numpy as np
+import pytest
+
+from stream_stats import LatencyHistogram, P2Quantile, RingBuffer, StreamingSummary
+
+
+def test_ring_buffer_keeps_latest_values_in_order():
+    buffer = RingBuffer(5)
+    for value in range(3):
+        buffer.append(value)
+    assert len(buffer) == 3
+    assert buffer.to_array().tolist() == [0, 1, 2]
+
+    # 写满后覆盖最旧的数据，多绕几圈
+    for value in range(3, 13):
+        buffer.append(value)
+    assert len(buffer) == 5
+    assert buffer.to_array().tolist() == [8, 9, 10, 11, 12]
+    assert list(buffer) == [8, 9, 10, 11, 12]
+
+
+def test_ring_buffer_last_across_wraparound():
+    buffer = RingBuffer(4)
+    for value in range(7):
+        buffer.append(value)
+    # 内部起点在数组中间，last 需要跨过数组末尾
+    assert buffer.last(3).tolist() == [4, 5, 6]
+    assert buffer.last(10).tolist() == [3, 4, 5, 6]
+    assert buffer.last(0).tolist() == []
+
+
+def test_ring_buffer_rejects_empty_capacity():
+    with pytest.raises(ValueError):
+        RingBuffer(0)
+
+
+def test_p2_quantile_exact_for_few_samples():
+    estimator = P2Quantile(0.5)
+    for value in [5.0, 1.0, 3.0]:
+        estimator.add(value)
+    assert estimator.value() == 3.0
+    assert P2Quantile(0.9).value() == 0.0
+
+
+@pytest.mark.parametrize('q', [0.5, 0.9, 0.99])
+def test_p2_quantile_close_to_numpy(q):
+    rng = np.random.default_rng(7)
+    values = rng.lognormal(mean=3.0, sigma=0.4, size=20000)
+    estimator = P2Quantile(q)
+    for value in values:
+        estimator.add(value)
+
+    exact = np.percentile(values, q * 100)
+    assert estimator.value() == pytest.approx(exact, rel=0.03)
+
+
+def test_p2_quantile_state_round_trip():
+    rng = np.random.default_rng(3)
+    values = rng.normal(20.0, 2.0, size=2000)
+    original = P2Quantile(0.9)
+    for value in values[:1000]:
+        original.add(value)
+
+    # 经过JSON序列化恢复后继续累加，结果与不中断时相同
+    restored = P2Quantile.from_state(json.loads(json.dumps(original.to_state())))
+    for value in values[1000:]:
+        original.add(value)
+        restored.add(value)
+    assert restored.count == original.count
+    assert restored.value() == original.value()
+
+
+def test_streaming_summary_matches_numpy():
+    rng = np.random.default_rng(11)
+    values = rng.uniform(10.0, 30.0, size=5000)
+    summary = StreamingSummary()
+    for value in values:
+        summary.add(value)
+
+    result = summary.to_dict()
+    assert result['count'] == len(values)
+    assert result['mean'] == pytest.approx(values.mean())
+    assert result['stdev'] == pytest.approx(values.std(ddof=1))
+    assert result['min'] == values.min()
+    assert result['max'] == values.max()
+    assert result['p50'] == pytest.approx(np.percentile(values, 50), rel=0.02)
+
+
+def _histogram(values, **kwargs):
+    histogram = LatencyHistogram(**kwargs)
+    for value in values:
+        histogram.record(value)
+    return histogram
+
+
+def test_latency_histogram_percentiles_close_to_numpy():
+    rng = np.random.default_rng(5)
+    values = rng.lognormal(mean=-4.0, sigma=1.0, size=20000)  # 约18ms，长尾
+    histogram = _histogram(values)
+
+    percentiles = histogram.percentiles((50, 90, 99, 99.9))
+    for p in (50, 90, 99, 99.9):
+        # 分桶相对误差约0.8%，再加上分位数定义不同带来的误差
+        assert percentiles[f"p{p:g}"] == pytest.approx(np.percentile(values, p), rel=0.02)
+    assert histogram.value_at_percentile(99) == percentiles['p99']
+    assert histogram.count == len(values)
+    assert histogram.mean == pytest.approx(values.mean())
+    assert histogram.min == values.min()
+    assert histogram.max == values.max()
+
+
+def test_latency_histogram_merge_equals_combined():
+    rng = np.random.default_rng(9)
+    first = rng.exponential(0.01, size=5000)
+    second = rng.exponential(0.05, size=3000)
+
+    merged = _histogram(first).merge(_histogram(second))
+    combined = _histogram(np.concatenate((first, second)))
+    assert merged.counts == combined.counts
+    assert merged.count == combined.count
+    assert merged.total == pytest.approx(combined.total)
+    assert (merged.min, merged.max) == (combined.min, combined.max)
+    assert merged.percentiles() == combined.percentiles()
+
+
+def test_latency_histogram_merge_rejects_different_buckets():
+    with pytest.raises(ValueError):
+        LatencyHistogram().merge(LatencyHistogram(sub_bucket_bits=6))
+
+
+def test_latency_histogram_state_round_trip():
+    rng = np.random.default_rng(13)
+    values = rng.gamma(2.0, 0.02, size=4000)
+    original = _histogram(values)
+
+    # 监控进程收到的是JSON序列化后的状态
+    restored = LatencyHistogram.from_state(json.loads(json.dumps(original.to_state())))
+    assert restored.counts == original.counts
+    assert restored.count == original.count
+    assert restored.percentiles() == original.percentiles()
+    for p in (50, 90, 99):
+        assert restored.value_at_percentile(p) == pytest.approx(np.percentile(values, p), rel=0.02)
+
+    empty = LatencyHistogram.from_state(LatencyHistogram().to_state())
+    assert empty.count == 0
+    assert empty.percentiles() == {'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'p99.9': 0.0}
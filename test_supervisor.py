@@ -0,0 +1,111 @@
+"""
+测试多实例监控程序
+用模拟实例（run_dummy_worker）在子进程中运行，检查统计汇总、崩溃重启和退避时间
+
+    python -m pytest test_supervisor.py
+"""
+import pytest
+
+from rolling_stats import RollingAnalytics
+from supervisor import Supervisor, WorkerSpec, run_dummy_worker
+
+
+class _DeadProcess:
+    """已退出的子进程"""
+
+    def __init__(self, exitcode: int):
+        self.exitcode = exitcode
+        self.pid = 0
+
+    def is_alive(self) -> bool:
+        return False
+
+    def join(self, timeout=None) -> None:
+        pass
+
+
+def _dummy(name: str, **options) -> WorkerSpec:
+    return WorkerSpec(name=name, options=dict({'run_time': 0.02, 'failure_rate': 0.0}, **options))
+
+
+def test_dummy_workers_aggregate_statistics(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    supervisor = Supervisor([_dummy('a', runs=3), _dummy('b', runs=4)], worker=run_dummy_worker,
+                            report_interval=3600)
+    supervisor.run()
+
+    assert all(handle.finished for handle in supervisor.workers.values())
+    assert supervisor.workers['a'].statistics.total_runs == 3
+    assert supervisor.workers['b'].statistics.total_runs == 4
+    assert supervisor.workers['a'].restarts == 0
+    assert supervisor.combined.total_runs == 7
+    assert supervisor.combined.successful_runs == 7
+    assert (tmp_path / 'supervisor_statistics.txt').exists()
+
+
+def test_crashing_worker_restarts_until_limit(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # 每局之后都崩溃：启动1次 + 重启2次，共3局
+    supervisor = Supervisor([_dummy('crash', runs=5, crash_rate=1.0)], worker=run_dummy_worker,
+                            backoff_base=0.05, backoff_max=0.2, max_restarts=2, report_interval=3600)
+    supervisor.run()
+
+    handle = supervisor.workers['crash']
+    assert handle.finished
+    assert handle.restarts == 2
+    assert handle.consecutive_crashes == 2
+    assert handle.statistics.total_runs == 3
+
+
+def test_backoff_doubles_and_resets_after_stable_run():
+    supervisor = Supervisor([_dummy('a')], worker=run_dummy_worker,
+                            backoff_base=2.0, backoff_max=10.0, stable_after=300.0)
+    handle = supervisor.workers['a']
+
+    delays = []
+    now = 1000.0
+    for _ in range(5):
+        # 启动后很快崩溃
+        handle.started_at = now - 1.0
+        handle.process = _DeadProcess(exitcode=1)
+        supervisor._check_worker(handle, now)
+        delays.append(handle.next_start_at - now)
+    assert delays == [2.0, 4.0, 8.0, 10.0, 10.0]
+    assert handle.restarts == 5
+
+    # 稳定运行超过 stable_after 后崩溃，退避时间从头计算
+    handle.started_at = now - 600.0
+    handle.process = _DeadProcess(exitcode=1)
+    supervisor._check_worker(handle, now)
+    assert handle.next_start_at - now == 2.0
+    assert handle.consecutive_crashes == 1
+
+    # 正常退出不再重启
+    handle.process = _DeadProcess(exitcode=0)
+    supervisor._check_worker(handle, now)
+    assert handle.finished
+    assert handle.restarts == 6
+
+
+def test_combined_ewma_sums_worker_rates():
+    analytics = RollingAnalytics()
+    # 实例a每10秒一局，实例b每30秒一局，交错汇总
+    records = [{'timestamp': 10.0 * i, 'duration': 10.0, 'success': True, 'worker': 'a'} for i in range(1, 200)]
+    records += [{'timestamp': 30.0 * i + 1, 'duration': 30.0, 'success': True, 'worker': 'b'} for i in range(1, 67)]
+    for record in sorted(records, key=lambda record: record['timestamp']):
+        analytics.add(record)
+
+    assert analytics.get_ewma()['runs_per_hour'] == pytest.approx(360 + 120)
+
+
+def test_combined_ewma_drops_stopped_worker():
+    analytics = RollingAnalytics()
+    for i in range(1, 50):
+        analytics.add({'timestamp': 10.0 * i, 'duration': 10.0, 'success': True, 'worker': 'a'})
+        analytics.add({'timestamp': 10.0 * i + 5, 'duration': 10.0, 'success': True, 'worker': 'b'})
+    assert analytics.get_ewma()['runs_per_hour'] == pytest.approx(720)
+
+    # 实例b停止后只剩a的速度
+    for i in range(50, 60):
+        analytics.add({'timestamp': 10.0 * i, 'duration': 10.0, 'success': True, 'worker': 'a'})
+    assert analytics.get_ewma()['runs_per_hour'] == pytest.approx(360)
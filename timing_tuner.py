@@ -0,0 +1,313 @@
+"""
+时间参数自适应调优
+在安全范围内逐步缩短法师的各项延迟，失败时回退，学习结果跨会话保存
+"""
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# 参数名 -> 配置路径
+PARAMETER_PATHS: Dict[str, Tuple[str, ...]] = {
+    'teleport_delay': ('sorceress', 'teleport_delay'),
+    'cast_delay': ('sorceress', 'cast_delay'),
+    'blizzard_delay': ('sorceress', 'blizzard_delay'),
+    'wait_before_pickup': ('sorceress', 'safety', 'wait_before_pickup'),
+    'delay_between_runs': ('bot', 'delay_between_runs'),
+}
+
+# 默认安全范围（秒）
+DEFAULT_BOUNDS: Dict[str, Tuple[float, float]] = {
+    'teleport_delay': (0.08, 0.40),
+    'cast_delay': (0.15, 0.60),
+    'blizzard_delay': (0.20, 1.50),
+    'wait_before_pickup': (0.50, 3.00),
+    'delay_between_runs': (0.30, 3.00),
+}
+
+
+class TunedParameter:
+    """单个调优参数及其统计"""
+
+    def __init__(self, name: str, value: float, lower: float, upper: float, step: float):
+        self.name = name
+        self.lower = lower
+        self.upper = upper
+        self.value = min(max(value, lower), upper)
+        self.step = step
+        self.floor = lower  # 已知不安全的值以下不再尝试
+
+        # 统计
+        self.trials = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.runs = 0
+        self.failures = 0
+
+    def propose(self, min_step: float) -> Optional[float]:
+        """提出一个更短的候选值，已无法再缩短时返回None"""
+        candidate = round(max(self.value * (1 - self.step), self.floor), 3)
+        if self.value - candidate < max(self.value * min_step, 0.005):
+            return None
+        return candidate
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'value': self.value,
+            'step': self.step,
+            'floor': self.floor,
+            'trials': self.trials,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'runs': self.runs,
+            'failures': self.failures,
+        }
+
+    def load_dict(self, data: Dict[str, Any]) -> None:
+        self.value = min(max(data.get('value', self.value), self.lower), self.upper)
+        self.step = data.get('step', self.step)
+        self.floor = min(max(data.get('floor', self.floor), self.lower), self.value)
+        self.trials = data.get('trials', 0)
+        self.accepted = data.get('accepted', 0)
+        self.rejected = data.get('rejected', 0)
+        self.runs = data.get('runs', 0)
+        self.failures = data.get('failures', 0)
+
+
+class TimingTuner:
+    """基于爬山法的在线延迟调优器
+
+    轮流对每个参数做试验：把参数缩短一步，运行 trial_runs 局。
+    试验期间失败率不高于基线失败率，且每小时成功局数不低于基线（允许 throughput_tolerance 的波动）
+    则接受新值并加大步长；否则回退，记录该值为下限并减小步长。
+    只看失败次数会接受“失败不多但每次失败代价很高”的值，因此同时比较单位时间的成功局数。
+    """
+
+    def __init__(self,
+                 config: Dict[str, Any],
+                 tuner_config: Optional[Dict[str, Any]] = None):
+        tuner_config = tuner_config or {}
+        self.logger = logging.getLogger(__name__)
+        self.state_file: str = tuner_config.get('state_file', 'timing_tuner.json')
+        self.trial_runs: int = tuner_config.get('trial_runs', 10)
+        self.failure_tolerance: float = tuner_config.get('failure_tolerance', 0.0)
+        self.throughput_tolerance: float = tuner_config.get('throughput_tolerance', 0.02)
+        self.min_step: float = tuner_config.get('min_step', 0.02)
+        initial_step: float = tuner_config.get('step', 0.1)
+
+        bounds = dict(DEFAULT_BOUNDS)
+        for name, value in tuner_config.get('bounds', {}).items():
+            if name in PARAMETER_PATHS and len(value) == 2:
+                bounds[name] = (float(value[0]), float(value[1]))
+
+        names = tuner_config.get('parameters', list(PARAMETER_PATHS))
+        self.parameters: Dict[str, TunedParameter] = {}
+        for name in names:
+            if name not in PARAMETER_PATHS:
+                self.logger.warning(f"未知的调优参数: {name}")
+                continue
+            current = _get_path(config, PARAMETER_PATHS[name])
+            if current is None:
+                continue
+            lower, upper = bounds[name]
+            self.parameters[name] = TunedParameter(name, float(current), lower, upper, initial_step)
+
+        # 基线：已接受配置下的运行结果
+        self.baseline_runs = 0
+        self.baseline_failures = 0
+        # 已接受配置下的每小时成功局数（最近一次基线窗口或接受的试验），0表示尚未测得
+        self.baseline_runs_per_hour = 0.0
+        self._baseline_window = [0, 0.0]  # [成功局数, 总耗时]
+        self._baseline_window_runs = 0
+
+        # 当前试验
+        self._order: List[str] = list(self.parameters)
+        self._next_index = 0
+        self._trial_param: Optional[str] = None
+        self._trial_previous: float = 0.0
+        self._trial_runs = 0
+        self._trial_failures = 0
+        self._trial_duration = 0.0
+        self._trial_timed_successes = 0
+
+        self.load()
+
+    def get_values(self) -> Dict[str, float]:
+        """当前生效的参数值（包含正在试验的候选值）"""
+        return {name: param.value for name, param in self.parameters.items()}
+
+    def apply(self, config: Dict[str, Any]) -> None:
+        """把当前参数值写回配置"""
+        for name, param in self.parameters.items():
+            _set_path(config, PARAMETER_PATHS[name], param.value)
+
+    def get_baseline_failure_rate(self) -> float:
+        """基线失败率（带先验，避免少量样本时过于乐观）"""
+        return (self.baseline_failures + 0.5) / (self.baseline_runs + 25)
+
+    def record_run(self, success: bool, duration: Optional[float] = None) -> None:
+        """记录一局结果并推进调优"""
+        if not self.parameters:
+            return
+
+        # 没有耗时的局（统计记录失败）不计入每小时局数
+        timed = bool(duration)
+
+        if self._trial_param is None:
+            self.baseline_runs += 1
+            self.baseline_failures += not success
+            if timed:
+                self._baseline_window[0] += success
+                self._baseline_window[1] += duration
+            self._baseline_window_runs += 1
+            if not self.baseline_runs_per_hour and self._baseline_window_runs >= self.trial_runs:
+                self.baseline_runs_per_hour = _runs_per_hour(*self._baseline_window)
+            if self.baseline_runs >= self.trial_runs and self.baseline_runs_per_hour:
+                self._start_trial()
+            return
+
+        param = self.parameters[self._trial_param]
+        param.runs += 1
+        param.failures += not success
+        self._trial_runs += 1
+        self._trial_failures += not success
+        if timed:
+            self._trial_duration += duration
+            self._trial_timed_successes += success
+
+        allowed = self.get_baseline_failure_rate() * self.trial_runs + self.failure_tolerance
+        if self._trial_failures > allowed:
+            self._reject_trial()
+        elif self._trial_runs >= self.trial_runs:
+            runs_per_hour = _runs_per_hour(self._trial_timed_successes, self._trial_duration)
+            if runs_per_hour < self.baseline_runs_per_hour * (1 - self.throughput_tolerance):
+                self._reject_trial()
+            else:
+                self._accept_trial()
+
+    def _start_trial(self) -> None:
+        for _ in range(len(self._order)):
+            name = self._order[self._next_index]
+            self._next_index = (self._next_index + 1) % len(self._order)
+
+            param = self.parameters[name]
+            candidate = param.propose(self.min_step)
+            if candidate is None:
+                continue
+
+            self._trial_param = name
+            self._trial_previous = param.value
+            self._trial_runs = 0
+            self._trial_failures = 0
+            self._trial_duration = 0.0
+            self._trial_timed_successes = 0
+            param.trials += 1
+            param.value = candidate
+            self.logger.info(f"调优试验: {name} {self._trial_previous:.3f} -> {candidate:.3f}")
+            return
+
+    def _accept_trial(self) -> None:
+        param = self.parameters[self._trial_param]
+        param.accepted += 1
+        param.step = min(param.step * 1.5, 0.3)
+        runs_per_hour = _runs_per_hour(self._trial_timed_successes, self._trial_duration)
+        self.logger.info(f"调优接受: {param.name}={param.value:.3f} "
+                         f"(失败 {self._trial_failures}/{self._trial_runs}, "
+                         f"{runs_per_hour:.1f} 次/小时, 基线 {self.baseline_runs_per_hour:.1f})")
+
+        # 试验期间的结果并入基线，之后的试验与新配置的速度比较
+        self.baseline_runs += self._trial_runs
+        self.baseline_failures += self._trial_failures
+        if runs_per_hour:
+            self.baseline_runs_per_hour = runs_per_hour
+        self._finish_trial()
+
+    def _reject_trial(self) -> None:
+        param = self.parameters[self._trial_param]
+        param.rejected += 1
+        failed_value = param.value
+        param.floor = min(round(failed_value * (1 + self.min_step), 3), self._trial_previous)
+        param.value = self._trial_previous
+        param.step = param.step * 0.5
+        runs_per_hour = _runs_per_hour(self._trial_timed_successes, self._trial_duration)
+        self.logger.warning(f"调优回退: {param.name} {failed_value:.3f} -> {param.value:.3f} "
+                            f"(失败 {self._trial_failures}/{self._trial_runs}, "
+                            f"{runs_per_hour:.1f} 次/小时, 基线 {self.baseline_runs_per_hour:.1f})")
+        self._finish_trial()
+
+    def _finish_trial(self) -> None:
+        self._trial_param = None
+        self.save()
+        self._start_trial()
+
+    def load(self) -> None:
+        """加载上次会话学到的参数"""
+        if not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for name, values in data.get('parameters', {}).items():
+                if name in self.parameters:
+                    self.parameters[name].load_dict(values)
+            baseline = data.get('baseline', {})
+            self.baseline_runs = baseline.get('runs', 0)
+            self.baseline_failures = baseline.get('failures', 0)
+            self.baseline_runs_per_hour = baseline.get('runs_per_hour', 0.0)
+            self.logger.info(f"已加载调优参数: {self.state_file}")
+        except Exception as e:
+            self.logger.error(f"加载调优参数失败: {e}")
+
+    def save(self) -> None:
+        """保存已接受的参数值（正在试验的候选值不保存）"""
+        parameters = {}
+        for name, param in self.parameters.items():
+            data = param.to_dict()
+            if name == self._trial_param:
+                data['value'] = self._trial_previous
+            parameters[name] = data
+
+        try:
+            tmp_file = self.state_file + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'parameters': parameters,
+                    'baseline': {'runs': self.baseline_runs, 'failures': self.baseline_failures,
+                                 'runs_per_hour': self.baseline_runs_per_hour}
+                }, f, indent=2)
+            os.replace(tmp_file, self.state_file)
+        except Exception as e:
+            self.logger.error(f"保存调优参数失败: {e}")
+
+    def get_summary(self) -> str:
+        """调优状态摘要"""
+        lines = [f"延迟调优 (基线失败率 {self.get_baseline_failure_rate() * 100:.1f}%, "
+                 f"{self.baseline_runs_per_hour:.1f} 次/小时):"]
+        for name, param in self.parameters.items():
+            marker = " [试验中]" if name == self._trial_param else ""
+            lines.append(f"- {name}: {param.value:.3f}s "
+                         f"(范围 {param.lower:.2f}-{param.upper:.2f}, "
+                         f"接受 {param.accepted}/{param.trials}){marker}")
+        return "\n".join(lines)
+
+
+def _runs_per_hour(successes: int, duration: float) -> float:
+    """每小时成功局数（失败局的耗时计入总时间）"""
+    return successes / duration * 3600 if duration > 0 else 0.0
+
+
+def _get_path(config: Dict[str, Any], path: Tuple[str, ...]) -> Optional[float]:
+    node: Any = config
+    for key in path:
+        if not isinstance(node, dict) or key not in node:
+            return None
+        node = node[key]
+    return node
+
+
+def _set_path(config: Dict[str, Any], path: Tuple[str, ...], value: float) -> None:
+    node = config
+    for key in path[:-1]:
+        node = node.setdefault(key, {})
+    node[path[-1]] = value
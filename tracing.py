@@ -0,0 +1,198 @@
+"""
+分层追踪
+记录嵌套的时间段（单局 → 阶段 → 截图/检测/点击），每个线程有自己的调用栈；
+导出为Chrome trace-event JSON，可在 chrome://tracing 或 https://ui.perfetto.dev 中查看整个会话的时间分布。
+未启用时 span() 直接返回共享的空上下文，开销只有一次属性判断
+"""
+import functools
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from clock import get_clock
+
+
+class _NoopSpan:
+    """未启用追踪时使用的空上下文"""
+    __slots__ = ()
+
+    def __enter__(self) -> '_NoopSpan':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+    def set(self, **args: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """一个时间段，退出时写入追踪器"""
+    __slots__ = ('tracer', 'name', 'category', 'args', 'start_us')
+
+    def __init__(self, tracer: 'Tracer', name: str, category: str, args: Optional[Dict[str, Any]]):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start_us = 0.0
+
+    def __enter__(self) -> 'Span':
+        self.tracer._stack().append(self)
+        self.start_us = self.tracer.now_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        end_us = self.tracer.now_us()
+        stack = self.tracer._stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        if exc_type is not None:
+            self.set(error=exc_type.__name__)
+        self.tracer._record(self.name, self.category, self.start_us, end_us - self.start_us, self.args)
+        return False
+
+    def set(self, **args: Any) -> None:
+        """给当前时间段附加参数（会显示在查看器的详情中）"""
+        if self.args is None:
+            self.args = {}
+        self.args.update(args)
+
+
+class Tracer:
+    """全局追踪器
+
+    事件保存在有上限的队列中（超出后丢弃最旧的），导出时转换为 Chrome trace-event 格式。
+    使用虚拟时钟时按虚拟时间记录，模拟器中的追踪与真实运行的时间轴一致。
+    """
+
+    def __init__(self, max_events: int = 200000):
+        self.enabled = False
+        self.logger = logging.getLogger(__name__)
+        self._events: Deque[Tuple[str, str, float, float, int, Optional[Dict[str, Any]]]] = deque(maxlen=max_events)
+        self._local = threading.local()
+        self._thread_names: Dict[int, str] = {}
+        self._thread_ids = itertools.count(1)
+        self._pid = os.getpid()
+
+    def enable(self, max_events: Optional[int] = None) -> None:
+        if max_events is not None and max_events != self._events.maxlen:
+            self._events = deque(self._events, maxlen=max_events)
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def clear(self) -> None:
+        self._events.clear()
+
+    def now_us(self) -> float:
+        """当前时间（微秒）"""
+        clock = get_clock()
+        if clock.is_virtual:
+            return clock.monotonic() * 1e6
+        return time.perf_counter() * 1e6
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            # 线程结束后系统线程ID会被复用，这里为每个线程分配独立编号
+            stack = self._local.stack = []
+            self._local.tid = next(self._thread_ids)
+            self._thread_names[self._local.tid] = threading.current_thread().name
+        return stack
+
+    def span(self, name: str, category: str = 'bot', **args: Any):
+        """创建时间段上下文
+
+        Example:
+            with get_tracer().span('detect', item_types='unique'):
+                detector.detect_items_by_color(img)
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, category, args or None)
+
+    def current_span(self) -> Optional[Span]:
+        """当前线程最内层的时间段"""
+        stack = getattr(self._local, 'stack', None)
+        return stack[-1] if stack else None
+
+    def instant(self, name: str, category: str = 'bot', **args: Any) -> None:
+        """记录一个瞬时事件（如看门狗超时）"""
+        if self.enabled:
+            self._stack()
+            self._record(name, category, self.now_us(), None, args or None)
+
+    def _record(self, name: str, category: str, start_us: float, duration_us: Optional[float],
+                args: Optional[Dict[str, Any]]) -> None:
+        self._events.append((name, category, start_us, duration_us, self._local.tid, args))
+
+    @property
+    def event_count(self) -> int:
+        return len(self._events)
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """转换为 Chrome trace-event JSON 对象"""
+        trace_events: List[Dict[str, Any]] = []
+        for tid, thread_name in list(self._thread_names.items()):
+            trace_events.append({'name': 'thread_name', 'ph': 'M', 'pid': self._pid, 'tid': tid,
+                                 'args': {'name': thread_name}})
+
+        for name, category, start_us, duration_us, tid, args in list(self._events):
+            event = {'name': name, 'cat': category, 'ts': round(start_us, 3), 'pid': self._pid, 'tid': tid}
+            if duration_us is None:
+                event.update(ph='i', s='t')
+            else:
+                event.update(ph='X', dur=round(duration_us, 3))
+            if args:
+                event['args'] = args
+            trace_events.append(event)
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, path: str) -> str:
+        """写出追踪文件，返回路径"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_chrome_trace(), f, ensure_ascii=False, default=str)
+        self.logger.info(f"追踪已导出: {path} ({len(self._events)} 个事件)")
+        return path
+
+
+# 全局追踪器
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    """获取全局追踪器"""
+    return _tracer
+
+
+def span(name: str, category: str = 'bot', **args: Any):
+    """在全局追踪器上创建时间段"""
+    return _tracer.span(name, category, **args)
+
+
+def traced(name: Optional[str] = None, category: str = 'bot') -> Callable:
+    """把函数调用记录为时间段的装饰器"""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _tracer.enabled:
+                return func(*args, **kwargs)
+            with _tracer.span(span_name, category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -3,7 +3,8 @@
 包含随机延迟等辅助功能
 """
 import random
-import time
+
+from clock import get_clock
 
 
 def random_delay(base_delay: float, variance: float = 0.2) -> float:
@@ -38,7 +39,7 @@ def sleep_random(base_delay: float, variance: float = 0.2):
         variance: 变化范围（默认±20%）
     """
     delay = random_delay(base_delay, variance)
-    time.sleep(delay)
+    get_clock().sleep(delay)
 
 
 def random_offset(base_coord: tuple, max_offset: int = 5) -> tuple:
@@ -1,9 +1,10 @@
 import win32gui
 import win32con
 import win32api
-import time
 from typing import Optional, Tuple
 
+from clock import get_clock
+
 
 class WindowController:
     def __init__(self, window_title: str):
@@ -30,7 +31,7 @@ class WindowController:
             if win32gui.IsIconic(self.hwnd):
                 win32gui.ShowWindow(self.hwnd, win32con.SW_RESTORE)
             win32gui.SetForegroundWindow(self.hwnd)
-            time.sleep(0.2)
+            get_clock().sleep(0.2)
             return True
         except Exception as e:
             print(f"Error activating window: {e}")